@@ -0,0 +1,271 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks converting synthetic Chrome Apps of increasing size.
+
+Generates an app of each size with benchmarks/synthetic_app.py, converts it in
+a fresh process with tracing on, and records how long each stage of the
+conversion took, the peak resident set size, and the bytes read and written.
+Results are printed as a table and can be written as JSON to compare runs.
+
+Dependencies are not installed unless --install is given, since npm and bower
+would dominate the time and need a network. With --scan-cache, conversions use a
+scan cache in the given directory, which is kept between runs so that warm
+conversions can be measured.
+
+Usage:
+  ./benchmarks/conversion_benchmark.py [--sizes 10,100,1000,10000,100000]
+      [-j N] [--scan-cache DIR] [--output results.json] [shape options]
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                '..', 'src'))
+
+import caterpillar
+import scancache
+import synthetic_app
+import tracing
+
+# Configuration of the conversions. The report's assets are inlined so that
+# bower isn't needed.
+CONFIG = {
+  'boilerplate_dir': 'caterpillar',
+  'report_dir': 'caterpillar-report',
+  'report_assets': 'inline',
+  'start_url': 'index.html',
+}
+
+# Stages shown in the table, in conversion order; the JSON has every stage.
+TABLE_STAGES = ['setup_output_dir', 'app_apis', 'edit_code', 'usage',
+                'generate_and_write']
+
+
+def skip_installation(call, output_dir, timeout=None):
+  """Replaces caterpillar.install_dependency when not installing."""
+  raise caterpillar.InstallationError('Skipped by the benchmark.')
+
+
+def read_io():
+  """Reads this process's I/O counters, including reaped child processes.
+
+  Returns:
+    Dictionary mapping counter names (e.g. 'rchar', 'write_bytes') to values,
+    or {} where /proc/self/io doesn't exist.
+  """
+  try:
+    with open('/proc/self/io') as io_file:
+      lines = io_file.read().splitlines()
+  except IOError:
+    return {}
+  return {name: int(value) for name, _, value in
+          (line.partition(': ') for line in lines)}
+
+
+def summarize_events(events):
+  """Sums the durations of trace events by stage.
+
+  Args:
+    events: List of trace event dictionaries.
+
+  Returns:
+    Dictionary mapping span names to {'count': number of spans, 'seconds':
+    total duration}. Spans in worker processes overlap, so their total can be
+    more than the wall time.
+  """
+  stages = collections.defaultdict(lambda: {'count': 0, 'seconds': 0})
+  for event in events:
+    stage = stages[event['name']]
+    stage['count'] += 1
+    stage['seconds'] += event['dur'] / 1e6
+  return dict(stages)
+
+
+def convert(input_dir, output_dir, jobs, install, trace_path, scan_cache_dir,
+            connection):
+  """Converts an app, sending measurements of the conversion back.
+
+  Runs in its own process, so that its peak memory use and I/O are only the
+  conversion's.
+
+  Args:
+    input_dir: Chrome App directory.
+    output_dir: Directory to write the web app to.
+    jobs: Number of processes to edit files in.
+    install: Whether to install dependencies.
+    trace_path: Path to write the trace to, or None.
+    scan_cache_dir: Scan cache directory to use, or None.
+    connection: multiprocessing.Connection to send the result dictionary to.
+  """
+  if not install:
+    caterpillar.install_dependency = skip_installation
+  handler = caterpillar.WarningStoreStreamHandler(StringIO.StringIO())
+  logging.root.handlers = [handler]
+  logging.root.setLevel(logging.INFO)
+  if scan_cache_dir:
+    scancache.enable(scancache.ScanCache(scan_cache_dir))
+
+  io_before = read_io()
+  tracing.start()
+  start_time = time.time()
+  with tracing.span('convert_app'):
+    status = caterpillar.convert_app(input_dir, output_dir, dict(CONFIG),
+                                     handler.captured_warnings, jobs=jobs)
+  seconds = time.time() - start_time
+  tracer = tracing.stop()
+  io_after = read_io()
+  cache = scancache.disable()
+  if trace_path:
+    tracer.write(trace_path)
+
+  connection.send({
+    'status': status,
+    'seconds': seconds,
+    'warnings': len(handler.captured_warnings),
+    'stages': summarize_events(tracer.events),
+    # ru_maxrss is in kilobytes on Linux. Worker processes are measured
+    # separately, and only the largest of them is known.
+    'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'peak_child_rss_kb': resource.getrusage(
+        resource.RUSAGE_CHILDREN).ru_maxrss,
+    'io': {name: io_after[name] - io_before.get(name, 0)
+           for name in io_after},
+    # Only the files scanned in this process are counted.
+    'scan_cache': cache and {'hits': cache.hits, 'misses': cache.misses},
+  })
+  connection.close()
+
+
+def benchmark(size, shape, work_dir, jobs, install, trace_dir,
+              scan_cache_dir=None):
+  """Generates and converts an app of a given size.
+
+  Args:
+    size: Number of files in the app.
+    shape: Shape of the app; see synthetic_app.generate.
+    work_dir: Directory to generate and convert the app in.
+    jobs: Number of processes to edit files in.
+    install: Whether to install dependencies.
+    trace_dir: Directory to write a trace of the conversion to, or None.
+    scan_cache_dir: Scan cache directory to use, or None.
+
+  Returns:
+    Result dictionary of the size, the app statistics and the measurements.
+  """
+  input_dir = os.path.join(work_dir, 'app-{}'.format(size))
+  output_dir = os.path.join(work_dir, 'web-app-{}'.format(size))
+  start_time = time.time()
+  stats = synthetic_app.generate(input_dir, files=size, **shape)
+  generate_seconds = time.time() - start_time
+  trace_path = None
+  if trace_dir:
+    trace_path = os.path.join(trace_dir, 'trace-{}.json'.format(size))
+
+  receiver, sender = multiprocessing.Pipe(duplex=False)
+  process = multiprocessing.Process(
+      target=convert,
+      args=(input_dir, output_dir, jobs, install, trace_path, scan_cache_dir,
+            sender))
+  process.start()
+  sender.close()
+  try:
+    result = receiver.recv()
+  except EOFError:
+    raise RuntimeError('Converting the app of {} files failed.'.format(size))
+  finally:
+    process.join()
+    shutil.rmtree(input_dir)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+  result.update({
+    'size': size,
+    'app': stats,
+    'generate_seconds': generate_seconds,
+  })
+  return result
+
+
+def print_row(result):
+  """Prints a result as a row of the table."""
+  io = result['io']
+  stages = [result['stages'].get(stage, {}).get('seconds', 0)
+            for stage in TABLE_STAGES]
+  print(('{:>8}{:>9.2f}{:>9.1f}{:>11.1f}{:>11.1f}' + '{:>9.2f}' * len(stages))
+        .format(result['size'], result['seconds'],
+                result['peak_rss_kb'] / 1024,
+                io.get('rchar', 0) / 1024 ** 2,
+                io.get('wchar', 0) / 1024 ** 2, *stages))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--sizes', default='10,100,1000',
+                      type=lambda s: [int(size) for size in s.split(',')],
+                      help='Numbers of files in the apps, separated by commas '
+                      '(default: 10,100,1000)')
+  parser.add_argument('-j', '--jobs', type=int, default=1,
+                      help='Number of processes to edit files in (default: 1)')
+  parser.add_argument('--install', action='store_true',
+                      help='Install dependencies with npm and bower')
+  parser.add_argument('--output', help='Path to write the results to as JSON')
+  parser.add_argument('--trace-dir', help='Directory to write a trace of each '
+                      'conversion to')
+  parser.add_argument('--scan-cache', help='Scan cache directory to use and '
+                      'keep between runs (default: no scan cache)')
+  parser.add_argument('--work-dir', help='Directory to generate apps in '
+                      '(default: a temporary directory)')
+  synthetic_app.add_shape_arguments(parser)
+  args = parser.parse_args()
+
+  shape = synthetic_app.shape_from_args(args)
+  work_dir = args.work_dir or tempfile.mkdtemp()
+  work_dir = work_dir.decode(sys.getfilesystemencoding())
+  print('{:>8}{:>9}{:>9}{:>11}{:>11}'.format(
+      'files', 'wall (s)', 'RSS (MB)', 'read (MB)', 'write (MB)') +
+      ''.join('{:>9}'.format(stage[:8]) for stage in TABLE_STAGES))
+  results = []
+  try:
+    for size in args.sizes:
+      results.append(benchmark(size, shape, work_dir, args.jobs, args.install,
+                               args.trace_dir, args.scan_cache))
+      print_row(results[-1])
+  finally:
+    if not args.work_dir:
+      shutil.rmtree(work_dir)
+
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      json.dump({'shape': shape, 'jobs': args.jobs, 'results': results},
+                output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks highlighting Chrome Apps API usages in a conversion report.
+
+Compares report.format_html with the implementation it replaced, which searched
+the polyfill manifest's warnings for every member and parent of every match, on
+as many usage lines as the largest reports have.
+
+Usage:
+  ./benchmarks/format_html_benchmark.py [--usages N] [--warnings N]
+                                        [--repeat N]
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                '..', 'src'))
+
+import chrome_app.apis
+import polyfill_manifest
+from report import report
+
+# Regular expression matching both the API and the member, assuming both exist,
+# which the original format_html used.
+CHROME_API_AND_MEMBER_REGEX = re.compile(r"""
+  (?<![\w.])chrome\. # In the chrome namespace
+  ( # Capture the full API name
+    (?:(?:app|sockets|system)\.)? # API may be part of a super-API namespace
+    \w+ # Actual API name
+  )
+  \.
+  ( # Capture the full member name
+    (?:\w+\.?)+
+  )
+""", re.VERBOSE)
+
+
+def format_html_linear(string, apis):
+  """The original report.format_html, for comparison."""
+  def replacer(match):
+    match_group = match.group(1)[1:]
+    if ('.' not in match_group or
+        (match_group.count('.') == 1 and
+         match_group.split('.', 1)[0] in {'app', 'sockets', 'system'})):
+      api = match_group
+
+      if api not in apis:
+        return match.group(0)
+
+      status = apis[api]['status']
+      return '<span class="ca-feature {}">{}</span>'.format(
+          status, match.group(0))
+
+    api, member = CHROME_API_AND_MEMBER_REGEX.match(
+      match.group(0)).groups()
+
+    if api not in apis:
+      return match.group(0)
+
+    status = None
+    while True:
+      for warning in apis[api].get('warnings', []):
+        if member == warning:
+          status = report.Status.NONE
+          break
+
+        try:
+          warning_member = warning['member']
+        except TypeError:
+          continue
+
+        if warning_member == member:
+          status = warning['status']
+          break
+
+      if status is not None:
+        break
+
+      if '.' not in member:
+        status = apis[api]['status']
+        break
+
+      member = member.rsplit('.', 1)[0]
+
+    return '<span class="ca-feature {}">{}</span>'.format(
+        status, match.group(0))
+
+  return chrome_app.apis.CHROME_NAMESPACE_REGEX.sub(replacer, string)
+
+
+def make_apis(warnings):
+  """Makes the polyfill manifests of a report.
+
+  Args:
+    warnings: Number of warnings in an extra, thoroughly documented manifest.
+
+  Returns:
+    Dictionary mapping Chrome Apps API name to polyfill manifest dictionaries.
+  """
+  apis = polyfill_manifest.load_many(polyfill_manifest.registry().apis())
+  for api in ('app.runtime', 'app.window', 'bluetooth', 'usb'):
+    apis[api] = polyfill_manifest.default(api)
+  apis['fileSystem'] = {
+    'name': 'fileSystem',
+    'status': report.Status.PARTIAL,
+    'warnings': [{'member': 'member{}.method{}'.format(i // 4, i % 4),
+                  'status': report.Status.NONE,
+                  'text': 'Does nothing.'}
+                 for i in range(warnings)] + ['member{}'.format(warnings)],
+  }
+  return apis
+
+
+def make_lines(apis, usages):
+  """Makes usage context lines like those highlighted in a report.
+
+  Args:
+    apis: Dictionary mapping Chrome Apps API name to polyfill manifest
+      dictionaries.
+    usages: Number of lines.
+
+  Returns:
+    List of strings.
+  """
+  references = ['chrome.unknownApi.call']
+  for api, api_info in apis.iteritems():
+    references.append('chrome.{}'.format(api))
+    references.append('chrome.{}.unlistedMember.call'.format(api))
+    for warning in api_info.get('warnings', []):
+      member = warning.get('member') if isinstance(warning, dict) else warning
+      references.append('chrome.{}.{}.addListener'.format(api, member))
+
+  random.seed(0)
+  lines = []
+  for _ in range(usages):
+    reference = random.choice(references)
+    lines.append(
+        '  var result = {}(options, function(value) {{ done(value); }});'
+        .format(reference))
+  return lines
+
+
+def format_lines(format_html, lines, apis):
+  """Highlights every line with the given format_html."""
+  return [format_html(line, apis) for line in lines]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--usages', type=int, default=10000,
+                      help='Number of usage lines to highlight '
+                           '(default: 10000)')
+  parser.add_argument('--warnings', type=int, default=100,
+                      help='Number of warnings in the largest manifest '
+                           '(default: 100)')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='Number of runs to take the best of (default: 3)')
+  args = parser.parse_args()
+
+  apis = make_apis(args.warnings)
+  lines = make_lines(apis, args.usages)
+  if (format_lines(format_html_linear, lines, apis) !=
+      format_lines(report.format_html, lines, apis)):
+    raise AssertionError('format_html gives different results.')
+
+  # Time the new implementation from scratch, including compiling statuses.
+  apis = make_apis(args.warnings)
+  timings = []
+  for name, format_html in (('before', format_html_linear),
+                            ('after', report.format_html)):
+    timings.append(min(timeit.repeat(
+        lambda: format_lines(format_html, lines, apis), number=1,
+        repeat=args.repeat)))
+    print('{:<8}{:>10.4f} s'.format(name, timings[-1]))
+  print('{:<8}{:>10.1f}x'.format('speedup', timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks injecting tags into HTML pages.
+
+Compares caterpillar.inject_tags, which splices tags into the page, with
+parsing the page with BeautifulSoup and writing it out prettified, on the HTML
+pages of the test apps and on a large generated page.
+
+Usage:
+  ./benchmarks/html_inject_benchmark.py [--size KB] [--repeat N]
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import argparse
+import os
+import sys
+import timeit
+
+import bs4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                '..', 'src'))
+
+import caterpillar
+import htmlinject
+import surrogateescape
+
+# Directory of the test apps.
+TESTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                         'tests')
+
+# Scripts injected into every page, as in a conversion using one polyfill.
+REQUIRED_JS_PATHS = [
+  'caterpillar.js',
+  caterpillar.REGISTER_SCRIPT_NAME,
+  '../app.info.js',
+  'polyfills/tts.polyfill.js',
+]
+
+# Chrome App manifest of the injected meta tags.
+CHROME_APP_MANIFEST = {
+  'name': 'Benchmark App',
+  'description': 'A Chrome App with large pages.',
+}
+
+# A section of a large page, repeated to make it.
+SECTION = """\
+    <section class="card">
+      <h2>Séction title</h2>
+      <p>Some text with <a href="#link">a link</a> &amp; an entity.</p>
+      <ul><li>One</li><li>Two</li><li>Three</li></ul>
+      <img src="images/picture.png" alt="A picture">
+    </section>
+"""
+
+
+def inject_with_soup(html):
+  """Injects tags as edit_file did before inject_tags, for comparison."""
+  soup = bs4.BeautifulSoup(surrogateescape.decode(html), 'html.parser')
+  caterpillar.inject_script_tags(soup, REQUIRED_JS_PATHS, '.', 'caterpillar',
+                                 '')
+  caterpillar.inject_misc_tags(soup, CHROME_APP_MANIFEST, '.', '')
+  return surrogateescape.encode(soup.prettify())
+
+
+def inject_with_splicing(html):
+  """Injects tags as edit_file does, falling back to BeautifulSoup."""
+  try:
+    return caterpillar.inject_tags(html, REQUIRED_JS_PATHS,
+                                   CHROME_APP_MANIFEST, '.', 'caterpillar', '')
+  except htmlinject.MalformedHtmlError:
+    return inject_with_soup(html)
+
+
+def test_app_pages():
+  """Gets the HTML pages of the test apps.
+
+  Returns:
+    List of (name, HTML bytes) tuples.
+  """
+  pages = []
+  for dirpath, dirnames, filenames in os.walk(TESTS_DIR):
+    dirnames.sort()
+    for filename in sorted(filenames):
+      if filename.endswith('.html'):
+        path = os.path.join(dirpath, filename)
+        with open(path) as html_file:
+          pages.append((os.path.relpath(path, TESTS_DIR), html_file.read()))
+  return pages
+
+
+def make_page(size):
+  """Makes a page of about the given size by repeating a section.
+
+  Args:
+    size: Approximate size of the page in bytes.
+
+  Returns:
+    HTML bytes.
+  """
+  sections = SECTION * max(1, size // len(SECTION.encode('utf-8')))
+  return ("""\
+<!DOCTYPE html>
+<html>
+  <head>
+    <title>Large page</title>
+    <link href="styles/main.css" rel="stylesheet">
+  </head>
+  <body>
+{}    <script src="scripts/main.js"></script>
+  </body>
+</html>
+""".format(sections)).encode('utf-8')
+
+
+def best_time(function, argument, repeat):
+  """Times a function, returning the best of several runs in seconds."""
+  return min(timeit.repeat(lambda: function(argument), number=1,
+                           repeat=repeat))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--size', type=float, default=1024,
+                      help='Size of the generated page in KB (default: 1024)')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='Number of runs to take the best of (default: 3)')
+  args = parser.parse_args()
+
+  pages = test_app_pages()
+  pages.append(('generated', make_page(int(args.size * 1024))))
+
+  print('{:<48}{:>11}{:>11}{:>9}{:>10}{:>10}'.format(
+      'page', 'soup (s)', 'splice (s)', 'speedup', 'soup +B', 'splice +B'))
+  for name, html in pages:
+    soup_time = best_time(inject_with_soup, html, args.repeat)
+    splice_time = best_time(inject_with_splicing, html, args.repeat)
+    soup_growth = len(inject_with_soup(html)) - len(html)
+    splice_growth = len(inject_with_splicing(html)) - len(html)
+    print('{:<48}{:>11.4f}{:>11.4f}{:>8.1f}x{:>10}{:>10}'.format(
+        name[:47], soup_time, splice_time, soup_time / splice_time,
+        soup_growth, splice_growth))
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks surrogateescape on large minified JavaScript bundles.
+
+Compares surrogateescape.encode and make_printable with the character at a
+time implementations they replaced, on bundles that are pure ASCII, that have
+non-ASCII characters, and that have undecodable bytes.
+
+Usage:
+  ./benchmarks/surrogateescape_benchmark.py [--size MB] [--repeat N]
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                '..', 'src'))
+
+import surrogateescape
+
+# A line of minified JavaScript, roughly as it appears in a bundled library.
+ASCII_CHUNK = ('!function(e,t){"use strict";var n=e.document,r=function(e){'
+               'return chrome.storage.local.get(e,function(t){n.title=t[e]})};'
+               't.exports=r}(window,module);')
+
+# The same, with non-ASCII characters in a string literal.
+UNICODE_CHUNK = ASCII_CHUNK.replace('"use strict"', '"usé strict ✓"')
+
+# The same, with a Latin-1 byte that isn't valid UTF-8, as decoded by
+# surrogateescape.decode.
+ESCAPED_CHUNK = ASCII_CHUNK.replace('"use strict"', '"us\udce9 strict"')
+
+
+def encode_per_character(string, encoding='utf-8'):
+  """The original surrogateescape.encode, for comparison."""
+  result = []
+  for char in string:
+    cp = ord(char)
+    if 0xdc00 <= cp < 0xdd00:
+      result.append(chr(cp - 0xdc00))
+    else:
+      result.append(char.encode(encoding))
+  return b''.join(result)
+
+
+def make_printable_per_character(string):
+  """The original surrogateescape.make_printable, for comparison."""
+  return ''.join('\ufffd' if 0xd800 <= ord(c) < 0xe000 else c for c in string)
+
+
+def make_bundle(chunk, size):
+  """Makes a bundle of about the given size by repeating a chunk.
+
+  Args:
+    chunk: Unicode string.
+    size: Approximate length of the bundle in characters.
+
+  Returns:
+    Unicode string.
+  """
+  return chunk * max(1, size // len(chunk))
+
+
+def best_time(function, argument, repeat):
+  """Times a function, returning the best of several runs in seconds."""
+  return min(timeit.repeat(lambda: function(argument), number=1,
+                           repeat=repeat))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('--size', type=float, default=4,
+                      help='Size of each bundle in MB (default: 4)')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='Number of runs to take the best of (default: 3)')
+  args = parser.parse_args()
+
+  size = int(args.size * 1024 * 1024)
+  bundles = [
+    ('ascii', make_bundle(ASCII_CHUNK, size)),
+    ('unicode', make_bundle(UNICODE_CHUNK, size)),
+    ('escaped', make_bundle(ESCAPED_CHUNK, size)),
+  ]
+  benchmarks = [
+    ('encode', encode_per_character, surrogateescape.encode),
+    ('make_printable', make_printable_per_character,
+     surrogateescape.make_printable),
+  ]
+
+  print('{:<16}{:<10}{:>12}{:>12}{:>10}'.format(
+      'function', 'bundle', 'before (s)', 'after (s)', 'speedup'))
+  for name, before, after in benchmarks:
+    for bundle_name, bundle in bundles:
+      if before(bundle) != after(bundle):
+        raise AssertionError('{} gives different results on the {} bundle.'
+                             .format(name, bundle_name))
+      before_time = best_time(before, bundle, args.repeat)
+      after_time = best_time(after, bundle, args.repeat)
+      print('{:<16}{:<10}{:>12.4f}{:>12.4f}{:>9.1f}x'.format(
+          name, bundle_name, before_time, after_time, before_time / after_time))
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,481 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generates synthetic Chrome Apps of a configurable shape.
+
+The generated apps have a given number of files in a directory tree of a given
+depth, with a mix of JavaScript, HTML and static files, optional large minified
+bundles, calls to Chrome Apps APIs at a given density, files with bytes that
+aren't valid UTF-8, and non-ASCII paths. Apps are generated deterministically
+from a seed, so benchmarks of the same shape convert the same app.
+
+Usage:
+  ./benchmarks/synthetic_app.py [--files N] [--depth N] [--seed N] ... output
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+
+# Members called on each API, as they appear after chrome.<api>.
+API_MEMBERS = {
+  'app.runtime': ['onLaunched.addListener', 'onRestarted.addListener'],
+  'app.window': ['create', 'current', 'getAll'],
+  'fileSystem': ['chooseEntry', 'getDisplayPath'],
+  'notifications': ['create', 'clear', 'onClicked.addListener'],
+  'power': ['requestKeepAwake', 'releaseKeepAwake'],
+  'runtime': ['getManifest', 'sendMessage', 'onMessage.addListener'],
+  'sockets.tcp': ['create', 'connect', 'send'],
+  'storage': ['local.get', 'local.set', 'sync.get', 'onChanged.addListener'],
+  'tts': ['speak', 'stop', 'getVoices'],
+}
+
+# Default number of calls to each API per 100 lines of JavaScript.
+DEFAULT_DENSITIES = {
+  'app.window': 0.2,
+  'notifications': 0.2,
+  'runtime': 0.5,
+  'storage': 1.0,
+  'tts': 0.2,
+}
+
+# Words that non-ASCII file and directory names are made from.
+UNICODE_WORDS = ['módulo', 'fíchier', 'スクリプト', 'скрипт', 'ταμπλό', '📁 dir',
+                 'naïve']
+
+# Words that ASCII file and directory names are made from.
+ASCII_WORDS = ['module', 'views', 'lib', 'util', 'widgets', 'data', 'ui']
+
+# Blocks of ordinary JavaScript that files are made of, in place of real code.
+JS_BLOCKS = [
+  """\
+function {name}(element, options) {{
+  var settings = options || {{}};
+  // Renders the wídget into the element.
+  for (var i = 0; i < settings.count; i++) {{
+    var child = document.createElement('div');
+    child.className = 'item-' + i;
+    child.textContent = 'Ítem ' + i;
+    element.appendChild(child);
+  }}
+  return element;
+}}
+""",
+  """\
+var {name} = (function() {{
+  'use strict';
+  var cache = {{}};
+  return {{
+    get: function(key) {{ return cache[key]; }},
+    set: function(key, value) {{ cache[key] = value; }},
+    clear: function() {{ cache = {{}}; }}
+  }};
+}})();
+""",
+  """\
+function {name}(a, b) {{
+  /* Compares two records by name, then by date. */
+  if (a.name !== b.name) {{
+    return a.name < b.name ? -1 : 1;
+  }}
+  return a.date - b.date;
+}}
+""",
+]
+
+# A statement of minified JavaScript, as bundles are made of.
+BUNDLE_CHUNK = ('!function(e,t){"use strict";var n=e.document,r=function(e){'
+                'return n.querySelector(e)};t.exports={q:r,v:"1.0"}}'
+                '(window,{});')
+
+# A line with bytes that aren't valid UTF-8, added to some files.
+LATIN_1_COMMENT = b'// Latin-1: caf\xe9 na\xefve\n'
+
+# Bytes that static files are made of.
+STATIC_BLOB = bytes(bytearray(random.Random(0).getrandbits(8)
+                              for _ in range(4096)))
+
+# Shape of the apps generated by default.
+DEFAULT_SHAPE = {
+  'files': 100,
+  'depth': 3,
+  'files_per_dir': 20,
+  'js_ratio': 0.6,
+  'static_ratio': 0.2,
+  'lines': 100,
+  'bundles': 0,
+  'bundle_size': 1024 * 1024,
+  'densities': DEFAULT_DENSITIES,
+  'non_utf8': 0.05,
+  'unicode_paths': 0.2,
+  'seed': 0,
+}
+
+
+class _Generator(object):
+  """Writes the files of one synthetic app."""
+
+  def __init__(self, directory, shape):
+    self.directory = directory
+    self.shape = shape
+    self.random = random.Random(shape['seed'])
+    self.stats = {
+      'files': 0,
+      'bytes': 0,
+      'kinds': collections.Counter(),
+      'calls': collections.Counter(),
+    }
+    self._names = collections.Counter()
+
+  def name(self, stem_words, extension):
+    """Makes a new file or directory name, non-ASCII as often as asked."""
+    if self.random.random() < self.shape['unicode_paths']:
+      word = self.random.choice(UNICODE_WORDS)
+    else:
+      word = self.random.choice(stem_words)
+    self._names[word] += 1
+    return '{}_{}{}'.format(word, self._names[word], extension)
+
+  def make_dirs(self, count):
+    """Makes a directory tree of the configured depth.
+
+    Args:
+      count: Number of directories, including the app directory.
+
+    Returns:
+      List of directory paths relative to the app directory.
+    """
+    dirs = ['']
+    parents = ['']
+    depths = {'': 0}
+    for i in range(1, count):
+      if i <= self.shape['depth']:
+        # The first directories form a chain, so the tree is as deep as asked.
+        parent = dirs[-1]
+      elif parents:
+        parent = self.random.choice(parents)
+      else:
+        break
+      path = os.path.join(parent, self.name(ASCII_WORDS, ''))
+      os.mkdir(os.path.join(self.directory, path))
+      dirs.append(path)
+      depths[path] = depths[parent] + 1
+      if depths[path] < self.shape['depth']:
+        parents.append(path)
+    return dirs
+
+  def write(self, relpath, kind, content):
+    """Writes a file of the app.
+
+    Args:
+      relpath: Path relative to the app directory.
+      kind: Kind of file, for the statistics.
+      content: File bytes.
+    """
+    if self.random.random() < self.shape['non_utf8'] and kind != 'static':
+      content += LATIN_1_COMMENT if kind != 'html' else b'<!-- caf\xe9 -->\n'
+    with open(os.path.join(self.directory, relpath), 'wb') as f:
+      f.write(content)
+    self.stats['files'] += 1
+    self.stats['bytes'] += len(content)
+    self.stats['kinds'][kind] += 1
+
+  def calls(self, units):
+    """Makes API calls for some code at the configured densities.
+
+    Args:
+      units: Amount of code, in lines or bundle statements.
+
+    Returns:
+      List of JavaScript call statements, in no particular order.
+    """
+    calls = []
+    for api, density in sorted(self.shape['densities'].iteritems()):
+      # Rounding randomly keeps the density right even for small files.
+      count = int(density * units / 100 + self.random.random())
+      members = API_MEMBERS.get(api, ['call'])
+      for _ in range(count):
+        calls.append('chrome.{}.{}(function() {{}});'.format(
+            api, self.random.choice(members)))
+      self.stats['calls'][api] += count
+    return calls
+
+  def js(self):
+    """Makes a JavaScript file of about the configured number of lines."""
+    lines = []
+    while len(lines) < self.shape['lines']:
+      block = self.random.choice(JS_BLOCKS)
+      lines.extend(block.format(name='f{}'.format(len(lines))).splitlines(True))
+    for call in self.calls(len(lines)):
+      lines.insert(self.random.randrange(len(lines) + 1), call + '\n')
+    return ''.join(lines).encode('utf-8')
+
+  def bundle(self):
+    """Makes a minified bundle of about the configured size, on one line."""
+    count = max(1, self.shape['bundle_size'] // len(BUNDLE_CHUNK))
+    chunks = [BUNDLE_CHUNK] * count
+    for call in self.calls(count):
+      chunks.insert(self.random.randrange(len(chunks) + 1), call)
+    return (''.join(chunks) + '\n').encode('utf-8')
+
+  def html(self, title, scripts):
+    """Makes an HTML page loading some scripts.
+
+    Args:
+      title: Title of the page.
+      scripts: List of script URLs.
+
+    Returns:
+      HTML bytes.
+    """
+    paragraphs = ''.join('  <p>Párrafo {} of {}.</p>\n'.format(i, title)
+                         for i in range(max(1, self.shape['lines'] // 4)))
+    tags = ''.join('  <script src="{}"></script>\n'.format(src)
+                   for src in scripts)
+    return ("""\
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{}</title>
+  <link rel="stylesheet" href="style.css">
+</head>
+<body>
+{}{}</body>
+</html>
+""".format(title, paragraphs, tags)).encode('utf-8')
+
+  def static(self):
+    """Makes a static file's bytes, between 1 and 16 KB."""
+    return STATIC_BLOB * self.random.randint(1, 4)
+
+  def generate(self):
+    """Writes the app.
+
+    Returns:
+      Statistics dictionary; see generate.
+    """
+    shape = self.shape
+    os.makedirs(self.directory)
+    apis = sorted(shape['densities'])
+    manifest = {
+      'app': {'background': {'scripts': ['background.js']}},
+      'manifest_version': 2,
+      'name': 'Synthetic App',
+      'version': '1.0.0',
+      'permissions': [api for api in apis if not api.startswith('app.')],
+    }
+    self.write('manifest.json', 'manifest',
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    self.write('background.js', 'js', """\
+chrome.app.runtime.onLaunched.addListener(function() {
+  chrome.app.window.create('index.html');
+});
+""".encode('utf-8'))
+    self.write('style.css', 'static', b'body { font-family: sans-serif; }\n')
+
+    # The manifest, background script, stylesheet and index page are always
+    # there; the rest of the files are spread over the directory tree.
+    remaining = max(0, shape['files'] - 4)
+    bundles = min(shape['bundles'], remaining)
+    statics = int((remaining - bundles) * shape['static_ratio'])
+    code = remaining - bundles - statics
+    htmls = code - int(round(code * shape['js_ratio']))
+    scripts = code - htmls
+
+    dirs = self.make_dirs(max(1, remaining // shape['files_per_dir']))
+    dir_scripts = collections.defaultdict(list)
+    for _ in range(bundles):
+      relpath = self.name(['bundle'], '.min.js')
+      dir_scripts[''].append(relpath)
+      self.write(relpath, 'bundle', self.bundle())
+    for _ in range(scripts):
+      directory = self.random.choice(dirs)
+      relpath = os.path.join(directory, self.name(ASCII_WORDS, '.js'))
+      dir_scripts[directory].append(relpath)
+      self.write(relpath, 'js', self.js())
+    for _ in range(statics):
+      extension = self.random.choice(['.png', '.woff', '.mp3'])
+      self.write(os.path.join(self.random.choice(dirs),
+                              self.name(ASCII_WORDS, extension)),
+                 'static', self.static())
+
+    # Pages load a few scripts from their own directory.
+    page_dirs = [self.random.choice(dirs) for _ in range(htmls)]
+    for directory in [''] + page_dirs:
+      if directory:
+        relpath = os.path.join(directory, self.name(ASCII_WORDS, '.html'))
+      else:
+        relpath = 'index.html'
+      srcs = self.random.sample(dir_scripts[directory],
+                                min(3, len(dir_scripts[directory])))
+      self.write(relpath, 'html', self.html(
+          relpath, [os.path.basename(src) for src in srcs]))
+    return self.stats
+
+
+def generate(directory, **shape):
+  """Generates a synthetic Chrome App.
+
+  Args:
+    directory: Directory to write the app to. Must not exist.
+    **shape: Shape of the app, overriding DEFAULT_SHAPE:
+      files: Number of files.
+      depth: Depth of the directory tree below the app directory.
+      files_per_dir: Average number of files in each directory.
+      js_ratio: Fraction of the HTML and JavaScript files that are JavaScript.
+      static_ratio: Fraction of the files that are static, e.g. images.
+      lines: Number of lines in each JavaScript file.
+      bundles: Number of minified bundles, in the app directory.
+      bundle_size: Size of each bundle in bytes.
+      densities: Dictionary mapping API names to the number of calls to each
+        per 100 lines of JavaScript (or bundle statements).
+      non_utf8: Fraction of the text files with bytes that aren't valid UTF-8.
+      unicode_paths: Fraction of the file and directory names that aren't ASCII.
+      seed: Seed of the random choices.
+
+  Returns:
+    Dictionary of statistics: {'files': number of files, 'bytes': total size,
+    'kinds': Counter of files by kind, 'calls': Counter of API calls by API}.
+  """
+  unknown = set(shape) - set(DEFAULT_SHAPE)
+  if unknown:
+    raise TypeError('Unknown shape options: {}'.format(
+        ', '.join(sorted(unknown))))
+  full_shape = dict(DEFAULT_SHAPE)
+  full_shape.update(shape)
+  return _Generator(directory, full_shape).generate()
+
+
+def parse_densities(string):
+  """Parses API densities from a command line argument.
+
+  Args:
+    string: Comma-separated api=density pairs, e.g. 'tts=0.5,storage=2'.
+
+  Returns:
+    Dictionary mapping API names to densities.
+
+  Raises:
+    argparse.ArgumentTypeError if the string is malformed.
+  """
+  densities = {}
+  for pair in string.split(','):
+    if not pair:
+      continue
+    api, _, density = pair.partition('=')
+    try:
+      densities[api] = float(density)
+    except ValueError:
+      raise argparse.ArgumentTypeError(
+          'Expected api=density, got `{}`.'.format(pair))
+  return densities
+
+
+def add_shape_arguments(parser):
+  """Adds arguments setting the shape of generated apps to a parser.
+
+  Args:
+    parser: argparse.ArgumentParser.
+  """
+  parser.add_argument('--depth', type=int, default=DEFAULT_SHAPE['depth'],
+                      help='Depth of the directory tree (default: %(default)s)')
+  parser.add_argument('--files-per-dir', type=int,
+                      default=DEFAULT_SHAPE['files_per_dir'],
+                      help='Files in each directory (default: %(default)s)')
+  parser.add_argument('--js-ratio', type=float,
+                      default=DEFAULT_SHAPE['js_ratio'],
+                      help='Fraction of code files that are JavaScript rather '
+                      'than HTML (default: %(default)s)')
+  parser.add_argument('--static-ratio', type=float,
+                      default=DEFAULT_SHAPE['static_ratio'],
+                      help='Fraction of files that are static (default: '
+                      '%(default)s)')
+  parser.add_argument('--lines', type=int, default=DEFAULT_SHAPE['lines'],
+                      help='Lines in each JavaScript file (default: '
+                      '%(default)s)')
+  parser.add_argument('--bundles', type=int, default=DEFAULT_SHAPE['bundles'],
+                      help='Number of minified bundles (default: %(default)s)')
+  parser.add_argument('--bundle-size', type=float, default=1,
+                      help='Size of each bundle in MB (default: %(default)s)')
+  parser.add_argument('--calls', type=parse_densities,
+                      default=DEFAULT_SHAPE['densities'],
+                      help='Calls to each API per 100 lines, as api=density '
+                      'pairs separated by commas (default: {})'.format(
+                          ','.join('{}={}'.format(api, density) for api, density
+                                   in sorted(DEFAULT_DENSITIES.iteritems()))))
+  parser.add_argument('--non-utf8', type=float,
+                      default=DEFAULT_SHAPE['non_utf8'],
+                      help='Fraction of text files with bytes that aren\'t '
+                      'UTF-8 (default: %(default)s)')
+  parser.add_argument('--unicode-paths', type=float,
+                      default=DEFAULT_SHAPE['unicode_paths'],
+                      help='Fraction of names that aren\'t ASCII (default: '
+                      '%(default)s)')
+  parser.add_argument('--seed', type=int, default=DEFAULT_SHAPE['seed'],
+                      help='Seed of the random choices (default: %(default)s)')
+
+
+def shape_from_args(args):
+  """Gets the shape of apps to generate from parsed arguments.
+
+  Args:
+    args: argparse.Namespace from a parser given add_shape_arguments.
+
+  Returns:
+    Shape dictionary without the number of files; see generate.
+  """
+  return {
+    'depth': args.depth,
+    'files_per_dir': args.files_per_dir,
+    'js_ratio': args.js_ratio,
+    'static_ratio': args.static_ratio,
+    'lines': args.lines,
+    'bundles': args.bundles,
+    'bundle_size': int(args.bundle_size * 1024 * 1024),
+    'densities': args.calls,
+    'non_utf8': args.non_utf8,
+    'unicode_paths': args.unicode_paths,
+    'seed': args.seed,
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+  parser.add_argument('output', help='Directory to write the app to',
+                      type=lambda s: s.decode(sys.getfilesystemencoding()))
+  parser.add_argument('--files', type=int, default=DEFAULT_SHAPE['files'],
+                      help='Number of files (default: %(default)s)')
+  add_shape_arguments(parser)
+  args = parser.parse_args()
+
+  stats = generate(args.output, files=args.files, **shape_from_args(args))
+  print('Wrote {} files ({} bytes) to {}.'.format(stats['files'],
+                                                  stats['bytes'], args.output))
+  print('Files: {}'.format(', '.join('{} {}'.format(count, kind) for kind, count
+                                     in sorted(stats['kinds'].iteritems()))))
+  print('Calls: {}'.format(', '.join('{} {}'.format(count, api) for api, count
+                                     in sorted(stats['calls'].iteritems()))))
+
+
+if __name__ == '__main__':
+  sys.exit(main())
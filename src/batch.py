@@ -0,0 +1,289 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Converts many Chrome Apps in one run.
+
+Apps are converted concurrently by a pool of worker processes. Each worker is
+started once and reused for many apps, so the cost of starting Python and
+importing Caterpillar is paid once per worker rather than once per app.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import logging
+import os
+import StringIO
+import time
+import traceback
+
+import caterpillar
+import chrome_app.apis
+import polyfill_manifest
+
+# Default filename of the batch summary, relative to the output directory.
+SUMMARY_FILENAME = 'caterpillar-summary.json'
+
+# Statuses of a conversion job.
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+
+
+def load_jobs(source, output_root):
+  """Loads a list of conversion jobs.
+
+  Args:
+    source: Path to either a directory containing many Chrome App directories,
+      or a JSON job list file. A job list is a list of objects of the form
+      {"input": app path, "output": output path, "config": config overrides};
+      "output" and "config" are optional. Relative paths in a job list are
+      relative to the job list file.
+    output_root: Directory that outputs are put in when they are not given
+      explicitly.
+
+  Returns:
+    List of job dictionaries of the form {'input': app path, 'output': output
+    path, 'config': dictionary of config overrides}.
+
+  Raises:
+    ValueError if the job list can't be read or is invalid, or if more than one
+    job has the same output.
+  """
+  if os.path.isdir(source):
+    jobs = [{'input': path,
+             'output': os.path.join(output_root, os.path.basename(path)),
+             'config': {}}
+            for path, _ in chrome_app.apis.find_apps(source)]
+    check_outputs(jobs)
+    return jobs
+
+  try:
+    with open(source) as job_list_file:
+      job_list = json.load(job_list_file)
+  except IOError as e:
+    raise ValueError('Could not read job list `{}`: {}'.format(
+        source, e.strerror))
+  except ValueError:
+    raise ValueError('Job list `{}` is not valid JSON.'.format(source))
+
+  if not isinstance(job_list, list):
+    raise ValueError('Job list `{}` must be a JSON list.'.format(source))
+
+  job_list_dir = os.path.dirname(os.path.abspath(source))
+  jobs = []
+  for job in job_list:
+    if not isinstance(job, dict) or 'input' not in job:
+      raise ValueError('Job `{}` has no input.'.format(json.dumps(job)))
+    input_dir = os.path.join(job_list_dir, job['input'])
+    if 'output' in job:
+      output_dir = os.path.join(job_list_dir, job['output'])
+    else:
+      output_dir = os.path.join(output_root,
+                                os.path.basename(os.path.normpath(input_dir)))
+    jobs.append({'input': input_dir, 'output': output_dir,
+                 'config': job.get('config', {})})
+
+  check_outputs(jobs)
+  return jobs
+
+
+def check_outputs(jobs):
+  """Checks that no two jobs have the same output.
+
+  Args:
+    jobs: List of job dictionaries; see load_jobs.
+
+  Raises:
+    ValueError if more than one job has the same output.
+  """
+  outputs = set()
+  for job in jobs:
+    output = os.path.realpath(job['output'])
+    if output in outputs:
+      raise ValueError('More than one job has the output `{}`.'.format(
+          job['output']))
+    outputs.add(output)
+
+
+def convert_job(args):
+  """Runs a single conversion job, capturing its warnings and errors.
+
+  This runs in a worker process (or in the main process if there is only one
+  job at a time), and never raises.
+
+  Args:
+    args: Tuple (job dictionary, base configuration dictionary, force).
+
+  Returns:
+    Result dictionary of the form {'input': app path, 'output': output path,
+    'status': STATUS_OK or STATUS_ERROR, 'conversion_status': 'total',
+    'partial' or None, 'seconds': wall time taken, 'warnings': list of
+    warnings, 'errors': list of errors}.
+  """
+  job, base_config, force = args
+  config = dict(base_config)
+  config.update(job['config'])
+
+  # Apps are converted concurrently, so their logs aren't printed. Warnings are
+  # captured for the report as usual, and errors are kept for the summary.
+  warning_handler = caterpillar.WarningStoreStreamHandler(StringIO.StringIO())
+  error_handler = caterpillar.LogRecordListHandler(level=logging.ERROR)
+  original_handlers = logging.root.handlers
+  logging.root.handlers = [warning_handler, error_handler]
+  conversion_status = None
+  start_time = time.time()
+  try:
+    conversion_status = caterpillar.convert_app(
+        job['input'], job['output'], config,
+        warning_handler.captured_warnings, force)
+  except Exception:  # Any failure should only fail this one app.
+    logging.error('Unexpected error:\n%s', traceback.format_exc())
+  finally:
+    seconds = time.time() - start_time
+    logging.root.handlers = original_handlers
+
+  errors = [record.getMessage() for record in error_handler.records]
+  status = STATUS_ERROR if errors or conversion_status is None else STATUS_OK
+  return {
+    'input': job['input'],
+    'output': job['output'],
+    'status': status,
+    'conversion_status': conversion_status,
+    'seconds': seconds,
+    'warnings': warning_handler.captured_warnings,
+    'errors': errors,
+  }
+
+
+def convert_many(jobs, config, processes=None, force=False):
+  """Converts many Chrome Apps concurrently.
+
+  Args:
+    jobs: List of job dictionaries; see load_jobs.
+    config: Base configuration dictionary. Each job's overrides are applied to
+      a copy of this.
+    processes: Number of worker processes. Default is the number of CPUs.
+    force: Whether to force overwrite existing output files. Default is False.
+
+  Returns:
+    List of result dictionaries in the same order as the jobs; see
+    convert_job.
+  """
+  # Only batches use multiprocessing, so it isn't imported with this module.
+  import multiprocessing
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+
+  job_args = [(job, config, force) for job in jobs]
+  results = []
+
+  def log_progress(result):
+    results.append(result)
+    logging.info('[%d/%d] %s: %s (%.2fs)', len(results), len(jobs),
+                 result['input'], result['status'], result['seconds'])
+
+  if processes > 1 and len(jobs) > 1:
+    # Each worker is forked once and then reused for many apps. The polyfill
+    # registry is loaded first so that workers inherit it.
+    polyfill_manifest.registry()
+    pool = multiprocessing.Pool(min(processes, len(jobs)))
+    try:
+      for result in pool.imap_unordered(convert_job, job_args):
+        log_progress(result)
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+  else:
+    for args in job_args:
+      log_progress(convert_job(args))
+
+  # Each job has its own output directory (see check_outputs), so outputs
+  # identify jobs.
+  order = {job['output']: i for i, job in enumerate(jobs)}
+  results.sort(key=lambda result: order[result['output']])
+  return results
+
+
+def summarise(results, processes, seconds):
+  """Summarises the results of a batch conversion.
+
+  Args:
+    results: List of result dictionaries; see convert_job.
+    processes: Number of worker processes used.
+    seconds: Wall time taken by the whole batch.
+
+  Returns:
+    Summary dictionary.
+  """
+  counts = {STATUS_OK: 0, STATUS_ERROR: 0}
+  for result in results:
+    counts[result['status']] += 1
+
+  return {
+    'processes': processes,
+    'seconds': seconds,
+    'counts': counts,
+    'apps': results,
+  }
+
+
+def convert_many_and_summarise(source, output_root, config, processes=None,
+                               force=False, summary_path=None):
+  """Converts many Chrome Apps and writes a JSON summary.
+
+  Args:
+    source: App corpus directory or job list file; see load_jobs.
+    output_root: Directory to put outputs and the summary in.
+    config: Base configuration dictionary.
+    processes: Number of worker processes. Default is the number of CPUs.
+    force: Whether to force overwrite existing output files. Default is False.
+    summary_path: Path to write the summary to. Default is SUMMARY_FILENAME in
+      output_root.
+
+  Returns:
+    Summary dictionary, or None if the jobs couldn't be loaded.
+  """
+  # Only batches use multiprocessing, so it isn't imported with this module.
+  import multiprocessing
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  if summary_path is None:
+    summary_path = os.path.join(output_root, SUMMARY_FILENAME)
+
+  try:
+    jobs = load_jobs(source, output_root)
+  except ValueError as e:
+    logging.error(e.message)
+    return None
+  logging.info('Converting %d apps with %d processes.', len(jobs), processes)
+
+  if not os.path.isdir(output_root):
+    os.makedirs(output_root)
+
+  start_time = time.time()
+  results = convert_many(jobs, config, processes, force)
+  summary = summarise(results, processes, time.time() - start_time)
+
+  with open(summary_path, 'w') as summary_file:
+    json.dump(summary, summary_file, indent=2, sort_keys=True)
+  logging.info('Converted %d apps (%d failed) in %.2fs. Summary written to '
+               '`%s`.', len(results), summary['counts'][STATUS_ERROR],
+               summary['seconds'], summary_path)
+  return summary
@@ -0,0 +1,193 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for batch."""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import logging
+import os
+import shutil
+import unittest
+
+import mock
+
+import batch
+import caterpillar_test
+
+
+class TestCaseWithCorpus(caterpillar_test.TestCaseWithTempDir):
+  """Base test case for tests that require a corpus of Chrome Apps."""
+
+  def setUp(self):
+    """Makes a corpus of two apps and a non-app directory.
+
+    The paths are stored in self.corpus_path and self.output_root.
+    """
+    super(TestCaseWithCorpus, self).setUp()
+    self.corpus_path = os.path.join(self.temp_path, 'córpus')
+    self.output_root = os.path.join(self.temp_path, 'óutput')
+    for name in ('äpp 1', 'äpp 2'):
+      shutil.copytree(caterpillar_test.MINIMAL_PATH,
+                      os.path.join(self.corpus_path, name))
+    os.mkdir(os.path.join(self.corpus_path, 'not an app'))
+
+
+class TestLoadJobs(TestCaseWithCorpus):
+  """Tests load_jobs."""
+
+  def test_corpus_directory(self):
+    """Tests that every app in a corpus directory becomes a job."""
+    jobs = batch.load_jobs(self.corpus_path, self.output_root)
+    self.assertEqual(jobs, [
+      {'input': os.path.join(self.corpus_path, 'äpp 1'),
+       'output': os.path.join(self.output_root, 'äpp 1'),
+       'config': {}},
+      {'input': os.path.join(self.corpus_path, 'äpp 2'),
+       'output': os.path.join(self.output_root, 'äpp 2'),
+       'config': {}},
+    ])
+
+  def test_job_list(self):
+    """Tests that jobs are read from a job list file."""
+    job_list_path = os.path.join(self.temp_path, 'jóbs.json')
+    with open(job_list_path, 'w') as job_list_file:
+      json.dump([
+        {'input': os.path.join('córpus', 'äpp 1'),
+         'config': {'start_url': 'ápp.html'}},
+        {'input': os.path.join(self.corpus_path, 'äpp 2'),
+         'output': 'elsewhere'},
+      ], job_list_file)
+
+    jobs = batch.load_jobs(job_list_path, self.output_root)
+    self.assertEqual(jobs, [
+      {'input': os.path.join(self.corpus_path, 'äpp 1'),
+       'output': os.path.join(self.output_root, 'äpp 1'),
+       'config': {'start_url': 'ápp.html'}},
+      {'input': os.path.join(self.corpus_path, 'äpp 2'),
+       'output': os.path.join(self.temp_path, 'elsewhere'),
+       'config': {}},
+    ])
+
+  def test_job_without_input(self):
+    """Tests that a job without an input is rejected."""
+    job_list_path = os.path.join(self.temp_path, 'jóbs.json')
+    with open(job_list_path, 'w') as job_list_file:
+      json.dump([{'output': 'óutput'}], job_list_file)
+
+    with self.assertRaises(ValueError):
+      batch.load_jobs(job_list_path, self.output_root)
+
+  def test_same_output(self):
+    """Tests that jobs with the same output are rejected."""
+    job_list_path = os.path.join(self.temp_path, 'jóbs.json')
+    with open(job_list_path, 'w') as job_list_file:
+      json.dump([
+        {'input': os.path.join('córpus', 'äpp 1'), 'output': 'óut'},
+        {'input': os.path.join('córpus', 'äpp 2'), 'output': 'óut/'},
+      ], job_list_file)
+
+    with self.assertRaises(ValueError):
+      batch.load_jobs(job_list_path, self.output_root)
+
+  def test_invalid_job_list(self):
+    """Tests that missing and malformed job lists raise ValueError."""
+    job_list_path = os.path.join(self.temp_path, 'jóbs.json')
+    with self.assertRaises(ValueError):
+      batch.load_jobs(job_list_path, self.output_root)
+
+    with open(job_list_path, 'w') as job_list_file:
+      job_list_file.write(b'[{')
+    with self.assertRaises(ValueError):
+      batch.load_jobs(job_list_path, self.output_root)
+
+
+class TestConvertJob(unittest.TestCase):
+  """Tests convert_job."""
+
+  @mock.patch('caterpillar.convert_app')
+  def test_config_overrides(self, mock_convert_app):
+    """Tests that job config overrides are applied to the base config."""
+    mock_convert_app.return_value = 'total'
+    job = {'input': 'ín', 'output': 'óut', 'config': {'report_dir': 'réport'}}
+    base_config = {'report_dir': 'a', 'boilerplate_dir': 'b'}
+    result = batch.convert_job((job, base_config, False))
+    config = mock_convert_app.call_args[0][2]
+    self.assertEqual(config, {'report_dir': 'réport', 'boilerplate_dir': 'b'})
+    self.assertEqual(base_config['report_dir'], 'a')
+    self.assertEqual(result['status'], batch.STATUS_OK)
+    self.assertEqual(result['conversion_status'], 'total')
+
+  @mock.patch('caterpillar.convert_app')
+  def test_warnings_and_errors_captured(self, mock_convert_app):
+    """Tests that warnings and errors logged during conversion are captured."""
+    def convert_app(input_dir, output_dir, config, captured_warnings, force):
+      logging.warning('a wárning')
+      logging.error('an érror')
+      self.assertEqual(captured_warnings, ['a wárning'])
+
+    mock_convert_app.side_effect = convert_app
+    job = {'input': 'ín', 'output': 'óut', 'config': {}}
+    result = batch.convert_job((job, {}, False))
+    self.assertEqual(result['status'], batch.STATUS_ERROR)
+    self.assertEqual(result['warnings'], ['a wárning'])
+    self.assertEqual(result['errors'], ['an érror'])
+
+  @mock.patch('caterpillar.convert_app')
+  def test_exception_captured(self, mock_convert_app):
+    """Tests that an exception fails the job instead of propagating."""
+    mock_convert_app.side_effect = RuntimeError('broken')
+    job = {'input': 'ín', 'output': 'óut', 'config': {}}
+    result = batch.convert_job((job, {}, False))
+    self.assertEqual(result['status'], batch.STATUS_ERROR)
+    self.assertIn('broken', result['errors'][0])
+
+
+class TestConvertManyAndSummarise(TestCaseWithCorpus):
+  """Tests convert_many_and_summarise."""
+
+  @mock.patch('caterpillar.convert_app')
+  def test_summary_written(self, mock_convert_app):
+    """Tests that a summary is written with a result for every app."""
+    mock_convert_app.return_value = 'partial'
+    summary = batch.convert_many_and_summarise(
+        self.corpus_path, self.output_root, {}, processes=1)
+
+    summary_path = os.path.join(self.output_root, batch.SUMMARY_FILENAME)
+    with open(summary_path) as summary_file:
+      self.assertEqual(json.load(summary_file), summary)
+    self.assertEqual(summary['counts'], {'ok': 2, 'error': 0})
+    self.assertEqual([app['input'] for app in summary['apps']],
+                     [os.path.join(self.corpus_path, 'äpp 1'),
+                      os.path.join(self.corpus_path, 'äpp 2')])
+    for app in summary['apps']:
+      self.assertEqual(app['conversion_status'], 'partial')
+      self.assertGreaterEqual(app['seconds'], 0)
+
+  @mock.patch('batch.logging')
+  def test_invalid_job_list(self, mock_logging):
+    """Tests that an invalid job list is logged as an error."""
+    job_list_path = os.path.join(self.temp_path, 'jóbs.json')
+    self.assertIsNone(batch.convert_many_and_summarise(
+        job_list_path, self.output_root, {}, processes=1))
+    self.assertEqual(mock_logging.error.call_count, 1)
+    self.assertFalse(os.path.exists(self.output_root))
+
+
+if __name__ == '__main__':
+  unittest.main()
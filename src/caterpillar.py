@@ -23,6 +23,11 @@ progressive web app.
 
 from __future__ import print_function, division, unicode_literals
 
+import importprofile
+if __name__ == '__main__':
+  # This has to happen before anything else is imported to time the imports.
+  importprofile.start_if_flagged('--startup-profile')
+
 import argparse
 import errno
 import json
@@ -30,27 +35,33 @@ import logging
 import os
 import random
 import shutil
-import subprocess
+import signal
 import sys
+import tempfile
+import threading
 
-import bs4
 import colorama
 
+import batch
 import chrome_app.apis
+import chrome_app.index
 import chrome_app.manifest
+import chrome_app.walk
 import configuration
+import digests
+import filecopy
+import fingerprints
+import htmlinject
+import packagestore
 import polyfill_manifest
 import report
+import scancache
 import surrogateescape
+import tracing
 
-# Chrome APIs with polyfills available.
-POLYFILLS = {
-  'notifications',
-  'power',
-  'runtime',
-  'storage',
-  'tts',
-}
+# Version of Caterpillar. Incremental conversions never reuse the results of a
+# different version.
+VERSION = '0.1.0'
 
 # Manifest filenames.
 CHROME_APP_MANIFEST_FILENAME = chrome_app.manifest.MANIFEST_FILENAME
@@ -80,6 +91,9 @@ DEPENDENCY_MANAGER_INSTALL_FOLDER = {
   'npm': 'node_modules',
 }
 
+# Number of seconds a dependency manager may take to install dependencies.
+INSTALL_TIMEOUT = 300
+
 SW_FORMAT_STRING = """/**
  * Service worker generated by Caterpillar.
  */
@@ -120,11 +134,13 @@ class CaterpillarError(Exception):
 
 
 def setup_output_dir(input_dir, output_dir, boilerplate_dir, report_dir,
-                     force=False):
+                     force=False, copy_strategy=filecopy.COPY,
+                     path_filter=None):
   """Sets up the output web app directory tree.
 
   Copies all files from the input Chrome App to the output web app, and creates
-  a subdirectory for the boilerplate code.
+  a subdirectory for the boilerplate code. The input Chrome App is walked only
+  once, and the resulting index is returned for use by later stages.
 
   Args:
     input_dir: String path to input Chrome App directory.
@@ -134,6 +150,13 @@ def setup_output_dir(input_dir, output_dir, boilerplate_dir, report_dir,
     report_dir: String path where Caterpillar's report should be put relative
       to output_dir.
     force: Whether to force overwrite existing output files. Default is False.
+    copy_strategy: How to copy files which Caterpillar doesn't edit; see
+      filecopy. Default is filecopy.COPY.
+    path_filter: chrome_app.walk.PathFilter of the input files to convert.
+      Optional; all files are converted if not given.
+
+  Returns:
+    AppIndex of the output web app directory.
 
   Raises:
     CaterpillarError: Input Chrome App directory does not exist or is not
@@ -150,8 +173,70 @@ def setup_output_dir(input_dir, output_dir, boilerplate_dir, report_dir,
   # Copy all files across from the Chrome App.
   logging.debug('Copying input tree `%s` to output tree `%s`.', input_dir,
                 output_dir)
+  input_index = index_input_dir(input_dir, path_filter)
+  os.makedirs(output_dir)
+  for reldir in sorted(input_index.dirs):
+    os.mkdir(os.path.join(output_dir, reldir))
+  for entry in input_index.files():
+    copy_input_file(entry, output_dir, copy_strategy)
+  index = input_index.rebase(output_dir)
+
+  # Set up the boilerplate directory.
+  polyfill_dir = os.path.join(boilerplate_dir, 'polyfills')
+  logging.debug('Making Caterpillar directory `%s`.', boilerplate_dir)
+  os.mkdir(os.path.join(output_dir, boilerplate_dir))
+  os.mkdir(os.path.join(output_dir, polyfill_dir))
+  index.dirs.update({boilerplate_dir, polyfill_dir})
+
+  # Set up the report directory.
+  logging.debug('Making report directory `%s`.', report_dir)
+  os.mkdir(os.path.join(output_dir, report_dir))
+  index.dirs.add(report_dir)
+
+  logging.debug('Finished setting up output directory `%s`.', output_dir)
+  return index
+
+
+def copy_input_file(entry, output_dir, copy_strategy=filecopy.COPY):
+  """Copies a file from the input Chrome App to the output web app.
+
+  Args:
+    entry: FileEntry of the input file.
+    output_dir: String path to output web app directory.
+    copy_strategy: How to copy the file if Caterpillar doesn't edit it; see
+      filecopy. Default is filecopy.COPY.
+  """
+  # Every HTML and JavaScript file is rewritten by edit_code, so linking them
+  # would only mean breaking the link again.
+  if entry.kind != chrome_app.index.KIND_OTHER:
+    copy_strategy = filecopy.COPY
+  # Dependencies are installed over the files in their install folders, which
+  # would change the input app through a hard link. Reflinks are copied on
+  # write, so they are safe.
+  elif (copy_strategy == filecopy.HARDLINK and
+        entry.relpath.split(os.sep, 1)[0] in
+        DEPENDENCY_MANAGER_INSTALL_FOLDER.values()):
+    copy_strategy = filecopy.COPY
+  filecopy.copy_file(entry.path, os.path.join(output_dir, entry.relpath),
+                     copy_strategy)
+
+
+def index_input_dir(input_dir, path_filter=None):
+  """Builds an index of the input Chrome App directory.
+
+  Args:
+    input_dir: String path to input Chrome App directory.
+    path_filter: chrome_app.walk.PathFilter of the files to index. Optional.
+
+  Returns:
+    AppIndex of the input Chrome App directory.
+
+  Raises:
+    CaterpillarError: Input Chrome App directory does not exist or is not
+      a directory.
+  """
   try:
-    shutil.copytree(input_dir, output_dir)
+    return chrome_app.index.AppIndex.build(input_dir, path_filter)
   except OSError as e:
     if e.errno == errno.ENOTDIR:
       raise CaterpillarError(
@@ -163,19 +248,77 @@ def setup_output_dir(input_dir, output_dir, boilerplate_dir, report_dir,
 
     raise e
 
-  # Set up the boilerplate directory.
-  boilerplate_dir = os.path.join(output_dir, boilerplate_dir)
-  logging.debug('Making Caterpillar directory `%s`.', boilerplate_dir)
-  os.mkdir(boilerplate_dir)
-  polyfill_dir = os.path.join(boilerplate_dir, 'polyfills')
-  os.mkdir(polyfill_dir)
 
-  # Set up the report directory.
-  report_dir = os.path.join(output_dir, report_dir)
-  logging.debug('Making report directory `%s`.', report_dir)
-  os.mkdir(report_dir)
+def update_output_dir(input_dir, output_dir, boilerplate_dir, report_dir,
+                      current, previous, copy_strategy=filecopy.COPY,
+                      path_filter=None):
+  """Updates a previously converted output web app directory tree.
 
-  logging.debug('Finished setting up output directory `%s`.', output_dir)
+  Copies only the files of the input Chrome App that changed since the previous
+  conversion, deletes the files whose inputs were removed, and empties the
+  boilerplate directory.
+
+  Args:
+    input_dir: String path to input Chrome App directory.
+    output_dir: String path to output web app directory.
+    boilerplate_dir: String path where Caterpillar's scripts should be put
+      relative to output_dir.
+    report_dir: String path where Caterpillar's report should be put relative
+      to output_dir.
+    current: Fingerprints of this conversion. Input files are recorded here.
+    previous: Fingerprints of the previous conversion.
+    copy_strategy: How to copy files which Caterpillar doesn't edit; see
+      filecopy. Default is filecopy.COPY.
+    path_filter: chrome_app.walk.PathFilter of the input files to convert.
+      Optional; all files are converted if not given.
+
+  Returns:
+    Tuple (AppIndex of the output web app directory, set of relative paths of
+    changed input files).
+
+  Raises:
+    CaterpillarError: Input Chrome App directory does not exist or is not
+      a directory.
+  """
+  input_index = index_input_dir(input_dir, path_filter)
+  fingerprints.Fingerprints.remove(output_dir)
+  changed = current.record_inputs(input_index, previous)
+  # The Chrome App manifest is always removed from the output web app.
+  if CHROME_APP_MANIFEST_FILENAME in input_index:
+    changed.add(CHROME_APP_MANIFEST_FILENAME)
+  logging.debug('%d of %d input files changed.', len(changed),
+                len(input_index))
+
+  for relpath in fingerprints.removed_inputs(current, previous):
+    path = os.path.join(output_dir, relpath)
+    if os.path.exists(path):
+      logging.debug('Deleting `%s`.', path)
+      os.remove(path)
+
+  for reldir in sorted(input_index.dirs):
+    if not os.path.isdir(os.path.join(output_dir, reldir)):
+      os.mkdir(os.path.join(output_dir, reldir))
+  for relpath in sorted(changed):
+    copy_input_file(input_index[relpath], output_dir, copy_strategy)
+  index = input_index.rebase(output_dir)
+
+  # Unchanged code files were edited by the previous conversion, so they differ
+  # from their inputs.
+  for entry in index.files():
+    if (entry.kind != chrome_app.index.KIND_OTHER and
+        entry.relpath not in changed):
+      index.add(entry.relpath)
+
+  # Static code is copied in again later, so old polyfills are cleared out.
+  polyfill_dir = os.path.join(boilerplate_dir, 'polyfills')
+  shutil.rmtree(os.path.join(output_dir, boilerplate_dir), ignore_errors=True)
+  os.makedirs(os.path.join(output_dir, polyfill_dir))
+  if not os.path.isdir(os.path.join(output_dir, report_dir)):
+    os.makedirs(os.path.join(output_dir, report_dir))
+  index.dirs.update({boilerplate_dir, polyfill_dir, report_dir})
+
+  logging.debug('Finished updating output directory `%s`.', output_dir)
+  return index, changed
 
 
 def cleanup_output_dir(output_dir):
@@ -338,39 +481,112 @@ def inject_misc_tags(soup, chrome_app_manifest, root_path, html_path):
     head.insert(0, meta_charset)
 
 
-def insert_todos_into_file(js_path):
+def inject_tags(html, required_js_paths, chrome_app_manifest, root_path,
+                boilerplate_dir, html_path):
+  """Injects script, meta and link tags into an HTML document.
+
+  The same tags are injected as by inject_script_tags and inject_misc_tags, but
+  they are spliced into the document, which is otherwise left unchanged.
+
+  Args:
+    html: HTML document bytes.
+    required_js_paths: Paths to required script files, relative to Caterpillar's
+      boilerplate script directory. These will be injected in order.
+    chrome_app_manifest: Manifest dictionary of _Chrome App_.
+    root_path: Path to the root directory of the web app from this HTML file.
+      This can be either absolute or relative.
+    boilerplate_dir: Caterpillar script directory within the web app.
+    html_path: Path to the HTML document being modified.
+
+  Returns:
+    Edited HTML document bytes.
+
+  Raises:
+    htmlinject.MalformedHtmlError if the document is too malformed to inject
+    tags into without parsing it.
+  """
+  injector = htmlinject.Injector(html)
+
+  if required_js_paths:
+    logging.debug('Requiring scripts: %s', ', '.join(required_js_paths))
+    injector.insert_scripts([os.path.join(root_path, boilerplate_dir, path)
+                             for path in required_js_paths])
+    logging.debug('Injected scripts into `%s`.', html_path)
+
+  head_tags = [htmlinject.start_tag('link', [
+      ('href', os.path.join(root_path, WEB_MANIFEST_FILENAME)),
+      ('rel', 'manifest')])]
+  for tag in ('description', 'author', 'name'):
+    if tag in chrome_app_manifest and tag not in injector.meta_names:
+      head_tags.append(htmlinject.start_tag('meta', [
+          ('content', chrome_app_manifest[tag]), ('name', tag)]))
+      logging.debug('Injected `%s` tag into `%s` with content `%s`.', tag,
+                    html_path, chrome_app_manifest[tag])
+  injector.append_to_head(head_tags)
+  if not injector.has_meta_charset:
+    injector.prepend_to_head([htmlinject.start_tag('meta',
+                                                   [('charset', 'utf-8')])])
+
+  return injector.render()
+
+
+def insert_todos_into_file(js_path, digest=None):
   """Inserts TODO comments in a JavaScript file.
 
   The TODO comments inserted should draw attention to places in the converted
   app that the developer will need to edit to finish converting their app.
 
+  The lines needing TODOs are found with chrome_app.apis.file_members_used, so
+  files with the same contents are only scanned once if a scan cache is
+  enabled. The file is left untouched if no TODOs are needed; otherwise it is
+  streamed a line at a time into an edited file alongside it, which is then
+  renamed over it.
+
   Args:
     js_path: Path to JavaScript file.
+    digest: Digest of the file, or a function returning it, for the scan cache;
+      see scancache.cached. Optional.
+
+  Returns:
+    Whether the file was changed.
   """
-  with open(js_path) as in_js_file:
-    # This search is very naïve and will only check line-by-line if there
-    # are easily spotted Chrome Apps API function calls.
-    out_js_lines = []
-    for line_no, line in enumerate(in_js_file):
-      line = surrogateescape.decode(line)
-      api_call = chrome_app.apis.api_member_used(line)
-      if api_call is not None:
-        # Construct a TODO comment.
-        newline = '\r\n' if line.endswith('\r\n') else '\n'
-        todo = '// TODO(Caterpillar): Check usage of {}.{}'.format(api_call,
-                                                                   newline)
-        logging.debug('Inserting TODO in `%s:%d`:\n\t%s', js_path, line_no,
-                      todo)
-        out_js_lines.append(todo)
-      out_js_lines.append(line)
-
-  with open(js_path, 'w') as out_js_file:
-    logging.debug('Writing modified file `%s`.', js_path)
-    out_js = surrogateescape.encode(''.join(out_js_lines))
-    out_js_file.write(out_js)
+  # This search is very naïve and will only check line-by-line if there are
+  # easily spotted Chrome Apps API function calls.
+  todo_members = dict(chrome_app.apis.file_members_used(js_path, digest))
+  if not todo_members:
+    return False
 
+  out_js_file = None
+  try:
+    out_js_file = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(js_path), prefix='.caterpillar-', suffix='.js',
+        delete=False)
+    with open(js_path) as in_js_file:
+      for line_no, raw_line in enumerate(in_js_file):
+        api_call = todo_members.get(line_no)
+        if api_call is not None:
+          # Construct a TODO comment.
+          newline = '\r\n' if raw_line.endswith(b'\r\n') else '\n'
+          todo = '// TODO(Caterpillar): Check usage of {}.{}'.format(api_call,
+                                                                     newline)
+          logging.debug('Inserting TODO in `%s:%d`:\n\t%s', js_path, line_no,
+                        todo)
+          out_js_file.write(surrogateescape.encode(todo))
+        out_js_file.write(raw_line)
 
-def insert_todos_into_directory(output_dir):
+    logging.debug('Writing modified file `%s`.', js_path)
+    out_js_file.close()
+    shutil.copymode(js_path, out_js_file.name)
+    os.rename(out_js_file.name, js_path)
+    return True
+  except:
+    if out_js_file is not None:
+      out_js_file.close()
+      os.remove(out_js_file.name)
+    raise
+
+
+def insert_todos_into_directory(output_dir, index=None):
   """Inserts TODO comments in all JavaScript code in a web app.
 
   The TODO comments inserted should draw attention to places in the converted
@@ -378,17 +594,18 @@ def insert_todos_into_directory(output_dir):
 
   Args:
     output_dir: Directory of the web app to insert TODOs into.
+    index: AppIndex of the web app. Optional; built if not given.
   """
   logging.debug('Inserting TODOs.')
-  dirwalk = os.walk(output_dir)
-  for (dirpath, _, filenames) in dirwalk:
-    for filename in filenames:
-      if filename.endswith('.js'):
-        path = os.path.join(dirpath, filename)
-        insert_todos_into_file(path)
+  if index is None:
+    index = chrome_app.index.AppIndex.build(output_dir)
+
+  for entry in index.files(chrome_app.index.KIND_JS):
+    if insert_todos_into_file(entry.path, entry.digest):
+      index.add(entry.relpath)
 
 def generate_service_worker(output_dir, chrome_app_manifest, required_js_paths,
-                            boilerplate_dir):
+                            boilerplate_dir, index=None):
   """Generates code for a service worker.
 
   Args:
@@ -397,20 +614,16 @@ def generate_service_worker(output_dir, chrome_app_manifest, required_js_paths,
     required_js_paths: List of paths to required scripts, relative to the
       boilerplate directory.
     boilerplate_dir: Caterpillar script directory within output web app.
+    index: AppIndex of the web app. Optional; built if not given.
 
   Returns:
     JavaScript string.
   """
   # Get the paths of files we will cache.
-  all_filepaths = []
   logging.debug('Looking for files to cache.')
-  dirwalk = os.walk(output_dir)
-  for (dirpath, _, filenames) in dirwalk:
-    # Add the relative file paths of each file to the filepaths list.
-    all_filepaths.extend(
-        os.path.relpath(os.path.join(dirpath, filename), output_dir)
-        for filename in filenames)
-  all_filepaths.sort()
+  if index is None:
+    index = chrome_app.index.AppIndex.build(output_dir)
+  all_filepaths = index.relpaths()
   logging.debug('Cached files:\n\t%s', '\n\t'.join(all_filepaths))
   # Format the file paths as JavaScript strings.
   all_filepaths = ["'{}'".format(fp) for fp in all_filepaths]
@@ -450,7 +663,7 @@ def copy_script(script, directory):
   shutil.copyfile(path, new_path)
 
 def add_service_worker(output_dir, chrome_app_manifest, required_js_paths,
-                       boilerplate_dir):
+                       boilerplate_dir, index=None):
   """Adds service worker scripts to a web app.
 
   Args:
@@ -459,21 +672,28 @@ def add_service_worker(output_dir, chrome_app_manifest, required_js_paths,
     required_js_paths: List of paths to required scripts, relative to the
       boilerplate directory.
     boilerplate_dir: Caterpillar script directory within web app.
+    index: AppIndex of the web app. Optional; built if not given. Will be
+      updated with the added scripts.
   """
+  if index is None:
+    index = chrome_app.index.AppIndex.build(output_dir)
+
   # We have to copy the other scripts before we generate the service worker
   # caching script, or else they won't be cached.
   boilerplate_path = os.path.join(output_dir, boilerplate_dir)
-  copy_script(REGISTER_SCRIPT_NAME, boilerplate_path)
-  copy_script(SW_STATIC_SCRIPT_NAME, boilerplate_path)
+  for script in (REGISTER_SCRIPT_NAME, SW_STATIC_SCRIPT_NAME):
+    copy_script(script, boilerplate_path)
+    index.add(os.path.join(boilerplate_dir, script))
 
   sw_js = generate_service_worker(output_dir, chrome_app_manifest,
-                                  required_js_paths, boilerplate_dir)
+                                  required_js_paths, boilerplate_dir, index)
 
   # We can now write the service worker. Note that it must be in the root.
   sw_path = os.path.join(output_dir, SW_SCRIPT_NAME)
   logging.debug('Writing service worker to `%s`.', sw_path)
   with open(sw_path, 'w') as sw_file:
     sw_file.write(surrogateescape.encode(sw_js))
+  index.add(SW_SCRIPT_NAME)
 
 
 def add_app_info(output_dir, chrome_app_manifest):
@@ -490,6 +710,7 @@ def add_app_info(output_dir, chrome_app_manifest):
       manifest=js_manifest)
   app_info_path = os.path.join(output_dir, INFO_SCRIPT_NAME)
   logging.debug('Writing app info script to `%s`.', app_info_path)
+  filecopy.break_link(app_info_path)
   with open(app_info_path, 'w') as app_info_file:
     app_info_file.write(app_info_js.encode('utf-8'))
 
@@ -500,7 +721,7 @@ class InstallationError(Exception):
   pass
 
 
-def install_dependency(call, output_dir):
+def install_dependency(call, output_dir, timeout=INSTALL_TIMEOUT):
   """Installs a dependency into a directory.
 
   Assumes that there is no output on stdout if installation fails.
@@ -509,13 +730,37 @@ def install_dependency(call, output_dir):
     call: List of arguments to call to install the dependency, e.g.
       ['npm', 'install', 'bower'].
     output_dir: Directory to install into.
+    timeout: Number of seconds to wait before killing the call. Default is
+      INSTALL_TIMEOUT.
 
   Raises:
     InstallationError
   """
+  # Only conversions install dependencies, so subprocess is imported here.
+  import subprocess
+  # Other calls may be started at the same time from other threads, so file
+  # descriptors are closed to stop them leaking into this call (which would
+  # keep their pipes open). The call gets its own process group so that a
+  # timeout also kills any processes it starts, which would otherwise hold its
+  # pipes open too.
   popen = subprocess.Popen(call, cwd=output_dir, stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE)
-  stdout, stderr = popen.communicate()
+                           stderr=subprocess.PIPE, close_fds=True,
+                           preexec_fn=os.setsid)
+  killed = threading.Event()
+
+  def kill():
+    killed.set()
+    try:
+      os.killpg(popen.pid, signal.SIGKILL)
+    except OSError:  # The call finished just in time.
+      pass
+
+  timer = threading.Timer(timeout, kill)
+  timer.start()
+  try:
+    stdout, stderr = popen.communicate()
+  finally:
+    timer.cancel()
 
   # Pass info and errors through to the debug log.
   for line in surrogateescape.decode(stdout).split('\n'):
@@ -525,39 +770,235 @@ def install_dependency(call, output_dir):
     if line:
       logging.debug('%s err: %s', call[0], line)
 
+  if killed.is_set():
+    raise InstallationError(
+        'Timed out after {} seconds installing with command: `{}`.'.format(
+            timeout, ' '.join(call)))
+
   # If installation failed, stdout will be empty.
   if not stdout:
     raise InstallationError(
         'Failed to install with command: `{}`.'.format(' '.join(call)))
 
 
-def install_dependencies(dependencies, output_dir):
+class Installation(object):
+  """Dependency installations running in the background.
+
+  Dependencies in the package store are installed from it. Each dependency
+  manager is then called once, with all of the other dependencies it installs,
+  and the calls run at the same time in separate threads.
+
+  Attributes:
+    output_dir: Directory dependencies are being installed into.
+    store: PackageStore dependencies are installed from first.
+  """
+
+  def __init__(self, dependencies, output_dir, timeout=INSTALL_TIMEOUT,
+               store=None):
+    """Starts installing dependencies.
+
+    Args:
+      dependencies: List of dependency dictionaries; see install_dependencies.
+      output_dir: Directory to install dependencies into.
+      timeout: Number of seconds each dependency manager may take. Default is
+        INSTALL_TIMEOUT.
+      store: PackageStore to install dependencies from first. Optional; the
+        default package store if not given.
+
+    Raises:
+      ValueError if a dependency manager is not bower or npm.
+    """
+    self.output_dir = output_dir
+    self.store = store or packagestore.PackageStore.default()
+    # Maps dependency managers to their dependencies, in order.
+    self._dependencies = {}
+    for dependency in dependencies:
+      if dependency['manager'] not in DEPENDENCY_MANAGER_INSTALL_FOLDER:
+        raise ValueError('Invalid dependency: No such manager `{}`.'.format(
+            dependency['manager']))
+      self._dependencies.setdefault(dependency['manager'], []).append(
+          dependency)
+
+    self._errors = {}
+    self._threads = []
+    for manager, manager_dependencies in sorted(
+        self._dependencies.iteritems()):
+      thread = threading.Thread(target=self._install,
+                                args=(manager, manager_dependencies, timeout))
+      thread.daemon = True
+      thread.start()
+      self._threads.append(thread)
+
+  def _install_from_store(self, manager, dependencies):
+    """Installs dependencies from the package store.
+
+    Args:
+      manager: 'bower' or 'npm'.
+      dependencies: List of dependency dictionaries.
+
+    Returns:
+      List of the dependencies that weren't installed.
+    """
+    if not self.store.exists():
+      return dependencies
+
+    install_dir = os.path.join(self.output_dir,
+                               DEPENDENCY_MANAGER_INSTALL_FOLDER[manager])
+    missing = []
+    for dependency in dependencies:
+      try:
+        installed = self.store.install(manager, dependency['name'],
+                                       install_dir, dependency.get('version'))
+      except (packagestore.IntegrityError, IOError, OSError) as e:
+        # The dependency manager can still install it.
+        logging.debug('Could not install `%s` from the package store: %s',
+                      dependency['name'], e)
+        installed = False
+      if not installed:
+        missing.append(dependency)
+    return missing
+
+  def _install(self, manager, dependencies, timeout):
+    """Installs dependencies with a dependency manager.
+
+    Args:
+      manager: 'bower' or 'npm'.
+      dependencies: List of dependency dictionaries.
+      timeout: Number of seconds the dependency manager may take.
+    """
+    with tracing.span('install_from_store', manager=manager):
+      dependencies = self._install_from_store(manager, dependencies)
+    if not dependencies:
+      return
+
+    names = []
+    for dependency in dependencies:
+      if dependency.get('version'):
+        names.append('{}@{}'.format(dependency['name'], dependency['version']))
+      else:
+        names.append(dependency['name'])
+    logging.debug('Installing %s with %s.', ', '.join(names), manager)
+    with tracing.span('install_dependencies', manager=manager, names=names):
+      try:
+        install_dependency([manager, 'install'] + names, self.output_dir,
+                           timeout)
+      except (InstallationError, OSError) as e:
+        # OSError means that the dependency manager couldn't be run at all.
+        logging.debug('Installing with %s failed: %s', manager, e)
+        self._errors[manager] = dependencies
+
+  def wait(self):
+    """Waits for the installations to finish, warning about failures.
+
+    Returns:
+      Whether every installation succeeded.
+    """
+    with tracing.span('wait_for_installation'):
+      for thread in self._threads:
+        thread.join()
+    self._threads = []
+
+    for manager, dependencies in sorted(self._errors.iteritems()):
+      for dependency in dependencies:
+        logging.warning('Failed to install dependency `%s` with %s',
+                        dependency['name'], manager)
+    return not self._errors
+
+
+def install_dependencies(dependencies, output_dir, timeout=INSTALL_TIMEOUT):
   """Installs dependencies into a directory.
 
   Args:
     dependencies: List of dependency dictionaries, which are of the form
       {'name': dependency name, 'path': path to dependency once installed,
-       'manager': 'bower' or 'npm'}.
+       'manager': 'bower' or 'npm'}. They may also have 'version': version to
+      install.
     output_dir: Directory to install dependencies into.
+    timeout: Number of seconds each dependency manager may take. Default is
+      INSTALL_TIMEOUT.
+
+  Returns:
+    Whether every dependency was installed.
 
   Raises:
     ValueError if a dependency manager is not bower or npm.
   """
   logging.debug('Installing dependencies.')
+  return Installation(dependencies, output_dir, timeout).wait()
+
+
+def dependencies_installed(dependencies, output_dir):
+  """Checks whether dependencies are installed in a directory.
+
+  Args:
+    dependencies: List of dependency dictionaries; see install_dependencies.
+    output_dir: Directory dependencies are installed into.
+
+  Returns:
+    Whether every dependency has been installed.
+  """
   for dependency in dependencies:
-    logging.debug('Installing `%s`.', dependency['name'])
-    try:
-      if dependency['manager'] == 'bower':
-        install_dependency(['bower', 'install', dependency['name']], output_dir)
-      elif dependency['manager'] == 'npm':
-        install_dependency(['npm', 'install', dependency['name']], output_dir)
-      else:
-        raise ValueError('Invalid dependency: No such manager `{}`.'.format(
-            dependency['manager']))
-    except InstallationError:
-      logging.warning('Failed to install dependency `%s` with %s',
-                      dependency['name'],
-                      dependency['manager'])
+    install_folder = DEPENDENCY_MANAGER_INSTALL_FOLDER.get(
+        dependency['manager'])
+    if install_folder is None or not os.path.isdir(
+        os.path.join(output_dir, install_folder, dependency['name'])):
+      return False
+  return True
+
+
+def seed_package_store(store, source_dir=None, timeout=INSTALL_TIMEOUT):
+  """Adds the dependencies of all polyfills and of reports to a package store.
+
+  Args:
+    store: PackageStore to add to.
+    source_dir: Directory with node_modules and bower_components directories
+      that the dependencies are already installed in. Optional; if not given,
+      they are installed into a temporary directory by their dependency
+      managers.
+    timeout: Number of seconds each dependency manager may take. Default is
+      INSTALL_TIMEOUT.
+
+  Returns:
+    Whether every dependency was added.
+  """
+  polyfills = polyfill_manifest.registry()
+  dependencies = polyfills.dependencies(polyfills.apis())
+  dependencies.extend({'name': name, 'manager': 'bower'}
+                      for name in report.BOWER_DEPENDENCIES)
+
+  install_dir = source_dir or tempfile.mkdtemp()
+  success = True
+  try:
+    if not source_dir:
+      for manager in sorted(DEPENDENCY_MANAGER_INSTALL_FOLDER):
+        names = [dependency['name'] for dependency in dependencies
+                 if dependency['manager'] == manager]
+        logging.info('Installing %s with %s.', ', '.join(names), manager)
+        try:
+          install_dependency([manager, 'install'] + names, install_dir,
+                             timeout)
+        except (InstallationError, OSError) as e:
+          logging.warning('Failed to install dependencies with %s: %s',
+                          manager, e)
+
+    for dependency in dependencies:
+      package_dir = os.path.join(
+          install_dir, DEPENDENCY_MANAGER_INSTALL_FOLDER[dependency['manager']],
+          dependency['name'])
+      if not os.path.isdir(package_dir):
+        logging.warning('Dependency `%s` is not installed in `%s`.',
+                        dependency['name'], install_dir)
+        success = False
+        continue
+      record = store.add(dependency['manager'], dependency['name'],
+                         package_dir)
+      logging.info('Stored %s package `%s` version %s.', dependency['manager'],
+                   dependency['name'], record['version'])
+  finally:
+    if not source_dir:
+      shutil.rmtree(install_dir)
+
+  return success
 
 
 def polyfill_paths(apis):
@@ -577,7 +1018,94 @@ def polyfill_paths(apis):
           for api in apis]
 
 
-def edit_code(output_dir, required_js_paths, chrome_app_manifest, config):
+def edit_file(path, kind, root_path, required_js_paths, chrome_app_manifest,
+              boilerplate_dir, apis=None, relpath=None, digest=None):
+  """Directly edits a single JavaScript or HTML file of the output web app.
+
+  Args:
+    path: Path to the file.
+    kind: Kind of the file; see chrome_app.index.
+    root_path: Path to the root directory of the web app from this file.
+    required_js_paths: Paths of scripts to be included in the web app, relative
+      to Caterpillar's boilerplate directory in the output web app.
+    chrome_app_manifest: Manifest dictionary of the _Chrome App_.
+    boilerplate_dir: Caterpillar script directory within the web app.
+    apis: List of Chrome API names. Optional. If given, the usage of these APIs
+      in an edited JavaScript file is returned.
+    relpath: Path of the file relative to the web app, to use in usages.
+    digest: Hex SHA-256 digest of the file, if known. Optional; it is only
+      needed, and otherwise computed once, if a scan cache is enabled.
+
+  Returns:
+    Result of chrome_app.apis.file_usage for the edited file if it is
+    JavaScript and apis is given, or else None.
+  """
+  with tracing.span('edit_file', path=relpath or path):
+    return _edit_file(path, kind, root_path, required_js_paths,
+                      chrome_app_manifest, boilerplate_dir, apis, relpath,
+                      digest)
+
+
+def _edit_file(path, kind, root_path, required_js_paths, chrome_app_manifest,
+               boilerplate_dir, apis, relpath, digest):
+  """Edits a single file; see edit_file."""
+  if kind == chrome_app.index.KIND_JS:
+    # Both scans below consult the scan cache, so the file is hashed for it at
+    # most once, and again only if inserting TODOs changed it.
+    if digest is None and scancache.active() is not None:
+      digest = digests.file_digest(path)
+    # Insert TODOs into JS.
+    if insert_todos_into_file(path, digest):
+      digest = None
+    # The file was just read, so finding the usage for the report now is
+    # cheap, and can be done in parallel.
+    if apis is not None:
+      return chrome_app.apis.file_usage(apis, path, relpath, digest=digest)
+  elif kind == chrome_app.index.KIND_HTML:
+    # Inject script and meta tags into HTML.
+    logging.debug('Editing `%s`.', path)
+    with open(path) as in_html_file:
+      html = in_html_file.read()
+    try:
+      html = inject_tags(html, required_js_paths, chrome_app_manifest,
+                         root_path, boilerplate_dir, path)
+    except htmlinject.MalformedHtmlError as e:
+      # BeautifulSoup can repair malformed HTML, but it's slow and rewrites the
+      # whole document, so it's only used (and imported) when needed.
+      logging.debug('Editing `%s` with BeautifulSoup: %s', path, e.message)
+      import bs4
+      soup = bs4.BeautifulSoup(surrogateescape.decode(html), 'html.parser')
+      inject_script_tags(
+          soup, required_js_paths, root_path, boilerplate_dir, path)
+      inject_misc_tags(soup, chrome_app_manifest, root_path, path)
+      html = surrogateescape.encode(soup.prettify())
+    logging.debug('Writing edited `%s`.', path)
+    with open(path, 'w') as out_html_file:
+      out_html_file.write(html)
+
+
+def edit_file_and_capture_logs(args):
+  """Edits a file in a worker process, capturing logs instead of emitting them.
+
+  Args:
+    args: Tuple of arguments to edit_file.
+
+  Returns:
+    Tuple (result of edit_file, list of logging.LogRecord emitted while
+    editing, in order, list of trace events recorded while editing).
+  """
+  handler = LogRecordListHandler()
+  logging.root.handlers = [handler]
+  if tracing.enabled():
+    # This process's trace is never written, so spans are sent back to be
+    # added to the trace of the process that started the worker.
+    tracing.start()
+  result = edit_file(*args)
+  return result, handler.records, tracing.events()
+
+
+def edit_code(output_dir, required_js_paths, chrome_app_manifest, config,
+              index=None, jobs=1, relpaths=None, apis=None):
   """Directly edits the code of the output web app.
 
   All editing of user code should be called from this function.
@@ -588,36 +1116,71 @@ def edit_code(output_dir, required_js_paths, chrome_app_manifest, config):
       to Caterpillar's boilerplate directory in the output web app.
     chrome_app_manifest: Manifest dictionary of the _Chrome App_.
     config: Configuration dictionary.
+    index: AppIndex of the web app. Optional; built if not given. Will be
+      updated with the edited files.
+    jobs: Number of processes to edit files with. Default is 1. The output and
+      logs are the same for any number of processes.
+    relpaths: Set of relative paths of the files to edit. Optional; all HTML and
+      JavaScript files are edited by default.
+    apis: List of Chrome API names. Optional. If given, the usage of these APIs
+      is found in each edited JavaScript file.
+
+  Returns:
+    Dictionary mapping the relative paths of edited JavaScript files to the
+    results of chrome_app.apis.file_usage for them, if apis is given.
   """
   logging.debug('Editing web app code.')
-
-  # Walk the app for JS and HTML.
-  # Insert TODOs into JS.
-  # Inject script and meta tags into HTML.
-  dirwalk = os.walk(output_dir)
-  for (dirpath, _, filenames) in dirwalk:
-    for filename in filenames:
-      path = os.path.join(dirpath, filename)
-      root_path = os.path.relpath(output_dir, dirpath)
-      if filename.endswith('.js'):
-        insert_todos_into_file(path)
-      elif filename.endswith('.html'):
-        logging.debug('Editing `%s`.', path)
-        with open(path) as in_html_file:
-          soup = bs4.BeautifulSoup(
-              surrogateescape.decode(in_html_file.read()), 'html.parser')
-        inject_script_tags(
-            soup, required_js_paths, root_path, config['boilerplate_dir'], path)
-        inject_misc_tags(soup, chrome_app_manifest, root_path, path)
-        logging.debug('Writing edited and prettified `%s`.', path)
-        with open(path, 'w') as out_html_file:
-          out_html_file.write(surrogateescape.encode(soup.prettify()))
+  if index is None:
+    index = chrome_app.index.AppIndex.build(output_dir)
+
+  entries = [entry for entry in index.files()
+             if entry.kind in {chrome_app.index.KIND_JS,
+                               chrome_app.index.KIND_HTML} and
+                (relpaths is None or entry.relpath in relpaths)]
+  edit_args = [(entry.path, entry.kind,
+                os.path.relpath(output_dir, os.path.dirname(entry.path)),
+                required_js_paths, chrome_app_manifest,
+                config['boilerplate_dir'], apis, entry.relpath,
+                entry.known_digest)
+               for entry in entries]
+  results = []
+
+  if jobs > 1 and len(entries) > 1:
+    logging.debug('Editing %d files with %d processes.', len(entries), jobs)
+    # Most conversions edit files serially, so multiprocessing is imported here.
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+      # Logs from the workers are replayed here in file order, so that they
+      # reach our handlers (and captured warnings) as if we ran serially.
+      for result, records, events in pool.imap(edit_file_and_capture_logs,
+                                               edit_args):
+        for record in records:
+          logging.root.handle(record)
+        tracing.extend(events)
+        results.append(result)
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+  else:
+    for args in edit_args:
+      results.append(edit_file(*args))
+
+  for entry in entries:
+    index.add(entry.relpath)
+
+  return {entry.relpath: result for entry, result in zip(entries, results)
+          if result is not None}
 
 
 # Main functions.
 
 
-def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
+def convert_app(input_dir, output_dir, config, captured_warnings, force=False,
+                jobs=1, incremental=False, copy_strategy=filecopy.COPY):
   """Converts a Chrome App into a progressive web app.
 
   Args:
@@ -626,26 +1189,83 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
     config: Configuration dictionary.
     captured_warnings: List of warnings emitted by the logger.
     force: Whether to force overwrite existing output files. Default is False.
+    jobs: Number of processes to edit code with. Default is 1.
+    incremental: Whether to reuse the previous conversion in output_dir, only
+      reprocessing the input files that changed since then. The output is the
+      same as a full conversion. Default is False.
+    copy_strategy: How to copy input files which Caterpillar doesn't edit; see
+      filecopy. Default is filecopy.COPY.
+
+  Returns:
+    Conversion status of the app ('total' or 'partial'), or None if the
+    conversion failed.
   """
   boilerplate_dir = config['boilerplate_dir']
   report_dir = config['report_dir']
+  # Older configuration files don't have this option.
+  report_assets = config.get('report_assets', report.ASSETS_BOWER)
+  if report_assets not in report.ASSETS:
+    logging.error('Invalid report assets `%s`; expected one of: %s',
+                  report_assets, ', '.join(report.ASSETS))
+    return
+  try:
+    path_filter = chrome_app.walk.PathFilter.from_config(config)
+  except ValueError as e:
+    logging.error(e.message)
+    return
 
+  # In incremental mode, the fingerprints of the previous conversion say which
+  # input files changed; results for the other files are reused.
+  current = None
+  previous = None
+  changed = None
+  if incremental:
+    current = fingerprints.Fingerprints(VERSION,
+                                        digests.json_digest(config))
+    if not force:
+      previous = fingerprints.Fingerprints.load(output_dir)
+    if previous and (previous.version, previous.config) != (current.version,
+                                                            current.config):
+      # The output was converted by Caterpillar, so it is safe to replace.
+      logging.info('Caterpillar version or configuration changed since the '
+                   'previous conversion; converting from scratch.')
+      previous = None
+      force = True
+
+  # The index of the output web app is built once here and then kept up to date
+  # by each stage, so that no stage needs to walk the web app again.
   try:
-    setup_output_dir(input_dir, output_dir, boilerplate_dir, report_dir, force)
+    with tracing.span('setup_output_dir'):
+      if previous:
+        logging.info('Updating previous conversion in `%s`.', output_dir)
+        index, changed = update_output_dir(input_dir, output_dir,
+                                           boilerplate_dir, report_dir,
+                                           current, previous, copy_strategy,
+                                           path_filter)
+      else:
+        index = setup_output_dir(input_dir, output_dir, boilerplate_dir,
+                                 report_dir, force, copy_strategy, path_filter)
+        if current:
+          current.record_inputs(index)
   except CaterpillarError as e:
     logging.error(e.message)
     return
 
   # Determine which Chrome Apps APIs are being used in the Chrome App.
-  apis = chrome_app.apis.app_apis(output_dir)
+  with tracing.span('app_apis'):
+    if current:
+      apis = fingerprints.app_apis(index, current)
+    else:
+      apis = chrome_app.apis.app_apis(output_dir, index)
   if apis:
     logging.info('Found Chrome APIs: %s', ', '.join(apis))
 
   # Determine which Chrome Apps APIs can be polyfilled, and which cannot.
+  polyfills = polyfill_manifest.registry()
   polyfillable = []
   not_polyfillable = []
   for api in apis:
-    if api in POLYFILLS:
+    if api in polyfills:
       polyfillable.append(api)
     else:
       not_polyfillable.append(api)
@@ -658,9 +1278,7 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
   # install them yet, though, since that has to be done after editing code or
   # the dependencies will also be edited.
   polyfill_manifests = polyfill_manifest.load_many(polyfillable)
-  dependencies = [dependency
-                  for manifest in polyfill_manifests.values()
-                  for dependency in manifest['dependencies']]
+  dependencies = polyfills.dependencies(polyfillable)
 
   # List of paths of static code to be copied from Caterpillar into the output
   # web app, relative to Caterpillar's JS source directory.
@@ -688,9 +1306,10 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
 
   # Read in and check the manifest file.
   try:
-    chrome_app_manifest = chrome_app.manifest.get(input_dir)
-    chrome_app.manifest.localize(chrome_app_manifest, input_dir)
-    chrome_app.manifest.verify(chrome_app_manifest)
+    with tracing.span('read_manifest'):
+      chrome_app_manifest = chrome_app.manifest.get(input_dir)
+      chrome_app.manifest.localize(chrome_app_manifest, input_dir)
+      chrome_app.manifest.verify(chrome_app_manifest)
   except ValueError as e:
     logging.error(e.message)
     return
@@ -699,21 +1318,27 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
   start_url = config['start_url']
   logging.info('Got start URL from config file: `%s`', start_url)
 
-  # Generate a progressive web app manifest.
-  web_manifest = generate_web_manifest(chrome_app_manifest, start_url)
-  web_manifest_path = os.path.join(output_dir, WEB_MANIFEST_FILENAME)
-  with open(web_manifest_path, 'w') as web_manifest_file:
-    json.dump(web_manifest, web_manifest_file, indent=4, sort_keys=True)
-  logging.debug('Wrote `%s` to `%s`.', WEB_MANIFEST_FILENAME, web_manifest_path)
-
-  # Generate and write an app info file so we can access Chrome App metadata
-  # from polyfills and scripts.
-  add_app_info(output_dir, chrome_app_manifest)
+  with tracing.span('write_manifests'):
+    # Generate a progressive web app manifest.
+    web_manifest = generate_web_manifest(chrome_app_manifest, start_url)
+    web_manifest_path = os.path.join(output_dir, WEB_MANIFEST_FILENAME)
+    filecopy.break_link(web_manifest_path)
+    with open(web_manifest_path, 'w') as web_manifest_file:
+      json.dump(web_manifest, web_manifest_file, indent=4, sort_keys=True)
+    index.add(WEB_MANIFEST_FILENAME)
+    logging.debug('Wrote `%s` to `%s`.', WEB_MANIFEST_FILENAME,
+                  web_manifest_path)
+
+    # Generate and write an app info file so we can access Chrome App metadata
+    # from polyfills and scripts.
+    add_app_info(output_dir, chrome_app_manifest)
+    index.add(INFO_SCRIPT_NAME)
   required_generated_paths.append(os.path.join('..', INFO_SCRIPT_NAME))
 
   # Remove unnecessary files from the output web app. This must be done before
   # the service worker is generated, or these files will be cached.
   cleanup_output_dir(output_dir)
+  index.remove(CHROME_APP_MANIFEST_FILENAME)
 
   # Edit the HTML and JS code of the output web app.
   # This is adding TODOs, injecting tags, etc. - anything that involves editing
@@ -722,7 +1347,50 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
   # Order is significant here - always, then dependencies, then polyfills.
   required_script_paths = (required_always_paths + required_generated_paths +
                            required_dependency_paths + required_polyfill_paths)
-  edit_code(output_dir, required_script_paths, chrome_app_manifest, config)
+  edit_relpaths = None
+  if current:
+    # Editing HTML depends on this context as well as on the file itself.
+    current.context = digests.json_digest(
+        [required_script_paths, chrome_app_manifest, boilerplate_dir])
+  if previous:
+    edit_relpaths = changed
+    if current.context != previous.context:
+      # All HTML must be edited again, starting from a fresh copy of the input.
+      for entry in index.files(chrome_app.index.KIND_HTML):
+        if entry.relpath not in changed:
+          filecopy.copy_file(os.path.join(input_dir, entry.relpath),
+                             entry.path)
+          edit_relpaths.add(entry.relpath)
+  with tracing.span('edit_code', jobs=jobs):
+    edited_usages = edit_code(output_dir, required_script_paths,
+                              chrome_app_manifest, config, index, jobs,
+                              edit_relpaths, apis)
+
+  # Start installing the report's dependencies, unless the report is to be
+  # self-contained. Nothing else uses them, so they can install while the rest
+  # of the app is converted and the report is generated. This must be done
+  # after editing code, since the installer's threads mustn't be running when
+  # edit_code forks its worker processes.
+  abs_report_dir = os.path.join(output_dir, report_dir)
+  report_installation = None
+  if report_assets == report.ASSETS_BOWER:
+    report_installation = report.start_installing_bower_dependencies(
+        report.BOWER_DEPENDENCIES, abs_report_dir)
+
+  # Start installing the polyfill dependencies while static code is copied.
+  installation = None
+  if (previous and previous.dependencies == dependencies and
+      dependencies_installed(dependencies, output_dir)):
+    logging.debug('Dependencies are already installed.')
+  else:
+    logging.debug('Installing dependencies.')
+    try:
+      installation = Installation(dependencies, output_dir)
+    except ValueError as e:
+      logging.error(e.message)
+      if report_installation:
+        report_installation.wait()
+      return
 
   # We want the static SW file to be copied in too, so we add it here.
   # We have to add it after edit_code or it would be included in the HTML, but
@@ -733,20 +1401,31 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
   # This must be done before the service worker is generated, or these files
   # will not be cached.
   required_static_paths = required_always_paths + required_polyfill_paths
-  copy_static_code(required_static_paths, output_dir, boilerplate_dir)
-
-  # Install the polyfill dependencies. This must be done before the service
-  # worker is generated, or the dependencies won't be cached.
-  try:
-    install_dependencies(dependencies, output_dir)
-  except ValueError as e:
-    logging.error(e.message)
-    return
+  with tracing.span('copy_static_code'):
+    copy_static_code(required_static_paths, output_dir, boilerplate_dir)
+  for static_code_path in required_static_paths:
+    index.add(os.path.join(boilerplate_dir, static_code_path))
+
+  # The polyfill dependencies must be installed before the service worker is
+  # generated, or they won't be cached.
+  if installation:
+    installation.wait()
+  if current:
+    current.dependencies = dependencies
+
+  # Dependency managers install whole package trees, which can be huge, so only
+  # the files the web app loads are indexed (and so cached by the service
+  # worker). The rest of the install folders are never walked.
+  for dependency_path in required_dependency_paths:
+    relpath = os.path.normpath(os.path.join(boilerplate_dir, dependency_path))
+    if os.path.isfile(os.path.join(output_dir, relpath)):
+      index.add(relpath)
 
   # Generate and write a service worker.
   required_sw_paths = required_dependency_paths + required_polyfill_paths
-  add_service_worker(output_dir, chrome_app_manifest, required_sw_paths,
-                     boilerplate_dir)
+  with tracing.span('add_service_worker'):
+    add_service_worker(output_dir, chrome_app_manifest, required_sw_paths,
+                       boilerplate_dir, index)
 
   logging.info('Conversion complete.')
   logging.info('Generating conversion report.')
@@ -775,13 +1454,31 @@ def convert_app(input_dir, output_dir, config, captured_warnings, force=False):
       break
   # TODO(alger): Detect fatal errors which would give a none status.
 
+  # Find the usage of APIs for the report. Usage in edited files was found while
+  # editing them, so only generated and installed files need to be read. In
+  # incremental mode, usage in unchanged files is reused from the previous
+  # conversion.
+  ignore_dirs = {os.path.abspath(os.path.join(output_dir, boilerplate_dir))}
+  with tracing.span('usage'):
+    if current:
+      usage = fingerprints.usage(apis, index, ignore_dirs, current, previous,
+                                 edited_usages)
+    else:
+      usage = chrome_app.apis.usage(apis, output_dir, ignore_dirs=ignore_dirs,
+                                    index=index, file_usages=edited_usages)
+
   # Finally, generate and write a conversion report.
-  abs_report_dir = os.path.join(output_dir, report_dir)
-  report.generate_and_write(abs_report_dir, chrome_app_manifest,
-      polyfill_manifests, status, captured_warnings, output_dir,
-      boilerplate_dir)
+  with tracing.span('generate_and_write'):
+    report.generate_and_write(abs_report_dir, chrome_app_manifest,
+        polyfill_manifests, status, captured_warnings, output_dir,
+        boilerplate_dir, index, usage, report_installation, report_assets)
+
+  # Fingerprints are only written once the conversion is complete.
+  if current:
+    current.save(output_dir)
 
   logging.info('Done.')
+  return status
 
 
 class Formatter(logging.Formatter):
@@ -825,6 +1522,29 @@ class WarningStoreStreamHandler(logging.StreamHandler):
     super(WarningStoreStreamHandler, self).emit(record)
 
 
+class LogRecordListHandler(logging.Handler):
+  """Logging handler which stores records in a list instead of emitting them.
+
+  Used in worker processes so that their logs can be sent back to the parent.
+  """
+
+  def __init__(self, *args, **kwargs):
+    self.records = []
+    super(LogRecordListHandler, self).__init__(*args, **kwargs)
+
+  def emit(self, record):
+    """Stores a record.
+
+    Args:
+      record: Logging record
+    """
+    if record.exc_info:
+      # Tracebacks can't be sent between processes, so format them now.
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    self.records.append(record)
+
+
 def unicode_arg(arg):
   """Converts a bytestring command-line argument into a Unicode string."""
   if sys.stdin.encoding:
@@ -833,6 +1553,40 @@ def unicode_arg(arg):
   return arg.decode(sys.getfilesystemencoding())
 
 
+def enable_scan_cache(directory):
+  """Makes this process and processes it forks use a scan cache.
+
+  Args:
+    directory: Path to the cache directory, or '' for the default cache.
+  """
+  if directory:
+    cache = scancache.ScanCache(directory)
+  else:
+    cache = scancache.ScanCache.default()
+  scancache.enable(cache)
+
+
+def disable_scan_cache():
+  """Stops using the scan cache, evicting records until it fits its limit."""
+  cache = scancache.disable()
+  if cache is None:
+    return
+
+  logging.debug('Scan cache `%s` had %d hits and %d misses.', cache.root,
+                cache.hits, cache.misses)
+  cache.evict()
+
+
+def add_scan_cache_argument(parser):
+  """Adds the --scan-cache option to a command's argument parser."""
+  parser.add_argument(
+      '--scan-cache', help='Cache the results of scanning JavaScript files in '
+      'a directory (default: ${} or {}), so files shared by many apps are '
+      'only scanned once'.format(scancache.CACHE_ENVIRONMENT_VARIABLE,
+                                 scancache.DEFAULT_CACHE_DIR),
+      nargs='?', const='', metavar='directory', type=unicode_arg)
+
+
 def main():
   """Executes the script and handles command line arguments."""
   # Set up parsers, then parse the command line arguments.
@@ -840,6 +1594,8 @@ def main():
   parser = argparse.ArgumentParser(description=desc)
   parser.add_argument('-v', '--verbose', help='Verbose logging',
                       action='store_true')
+  parser.add_argument('--startup-profile', help='Print how long each import '
+                      'took to stderr', action='store_true')
   subparsers = parser.add_subparsers(dest='mode')
 
   parser_convert = subparsers.add_parser(
@@ -852,6 +1608,81 @@ def main():
                               required=True, metavar='config', type=unicode_arg)
   parser_convert.add_argument('-f', '--force', help='Force output overwrite',
                               action='store_true')
+  parser_convert.add_argument('-j', '--jobs', help='Number of processes to '
+                              'edit code with', type=int, default=1)
+  parser_convert.add_argument('--incremental', help='Only reprocess input '
+                              'files changed since the previous conversion',
+                              action='store_true')
+  parser_convert.add_argument('--copy', help='How to copy input files that '
+                              'are not edited (default: copy)',
+                              choices=filecopy.STRATEGIES,
+                              default=filecopy.COPY)
+  parser_convert.add_argument('--trace', help='Path to write the time taken '
+                              'by each stage to, as Chrome trace events',
+                              metavar='trace', type=unicode_arg)
+  add_scan_cache_argument(parser_convert)
+
+  parser_convert_many = subparsers.add_parser(
+      'convert-many',
+      help='Convert many Chrome Apps into progressive web apps.')
+  parser_convert_many.add_argument(
+      'input',
+      help='Directory of Chrome App directories, or JSON job list file',
+      type=unicode_arg)
+  parser_convert_many.add_argument(
+      'output', help='Directory to put progressive web apps in',
+      type=unicode_arg)
+  parser_convert_many.add_argument(
+      '-c', '--config', help='Base configuration file; defaults are used if '
+      'omitted', metavar='config', type=unicode_arg)
+  parser_convert_many.add_argument('-f', '--force',
+                                   help='Force output overwrite',
+                                   action='store_true')
+  parser_convert_many.add_argument(
+      '-j', '--jobs', help='Number of apps to convert at once (default: '
+      'number of CPUs)', type=int)
+  parser_convert_many.add_argument(
+      '-s', '--summary', help='Path to write JSON summary to (default: {} in '
+      'the output directory)'.format(batch.SUMMARY_FILENAME), type=unicode_arg)
+  add_scan_cache_argument(parser_convert_many)
+
+  parser_serve = subparsers.add_parser(
+      'serve', help='Serve conversions over HTTP from a long-running process '
+      'with a pool of warm workers.')
+  parser_serve.add_argument('--host', help='Host to listen on (default: '
+                            '127.0.0.1)', default='127.0.0.1')
+  parser_serve.add_argument('-p', '--port', help='Port to listen on '
+                            '(default: 8080)', type=int, default=8080)
+  parser_serve.add_argument(
+      '-c', '--config', help='Base configuration file; defaults are used if '
+      'omitted', metavar='config', type=unicode_arg)
+  parser_serve.add_argument(
+      '-j', '--jobs', help='Number of apps to convert at once (default: '
+      'number of CPUs)', type=int)
+  parser_serve.add_argument(
+      '--work-dir', help='Directory to extract and convert uploaded apps in '
+      '(default: a temporary directory)', metavar='directory',
+      type=unicode_arg)
+  parser_serve.add_argument(
+      '--job-ttl', help='Seconds to keep finished jobs, and their files in the '
+      'work directory, for (default: 3600)', metavar='seconds', type=int)
+  add_scan_cache_argument(parser_serve)
+
+  parser_seed = subparsers.add_parser(
+      'seed', help='Store the dependencies of polyfills and reports, so that '
+      'conversions can install them without a network.')
+  parser_seed.add_argument(
+      '-s', '--store', help='Package store directory (default: ${} or {})'
+      .format(packagestore.STORE_ENVIRONMENT_VARIABLE,
+              packagestore.DEFAULT_STORE_DIR), type=unicode_arg)
+  parser_seed.add_argument(
+      '--from', help='Directory with node_modules and bower_components to '
+      'store dependencies from, instead of installing them', dest='source',
+      metavar='directory', type=unicode_arg)
+
+  subparsers.add_parser(
+      'index-polyfills', help='Check the polyfill manifests and write them to '
+      'an index, so that conversions load one file instead of every manifest.')
 
   parser_config = subparsers.add_parser(
     'config', help='Print a default configuration file to stdout.')
@@ -874,13 +1705,64 @@ def main():
   logging.root.addHandler(handler)
 
   # Main program.
+  exit_status = 0
+  if getattr(args, 'scan_cache', None) is not None:
+    enable_scan_cache(args.scan_cache)
+
   if args.mode == 'config':
     configuration.generate_and_save(args.output, args.interactive)
 
   elif args.mode == 'convert':
     config = configuration.load(args.config)
-    convert_app(args.input, args.output, config, handler.captured_warnings,
-                args.force)
+    if args.trace:
+      tracing.start()
+    try:
+      with tracing.span('convert_app', input=args.input):
+        convert_app(args.input, args.output, config, handler.captured_warnings,
+                    args.force, args.jobs, args.incremental, args.copy)
+    finally:
+      if args.trace:
+        tracing.stop().write(args.trace)
+        logging.info('Wrote trace to `%s`.', args.trace)
+
+  elif args.mode == 'seed':
+    if args.store:
+      store = packagestore.PackageStore(args.store)
+    else:
+      store = packagestore.PackageStore.default()
+    seed_package_store(store, args.source)
+
+  elif args.mode == 'index-polyfills':
+    try:
+      polyfills = polyfill_manifest.write_index()
+    except polyfill_manifest.ManifestError as e:
+      logging.error(e.message)
+    else:
+      logging.info('Indexed polyfills: %s', ', '.join(polyfills.apis()))
+
+  elif args.mode == 'convert-many':
+    if args.config:
+      config = configuration.load(args.config)
+    else:
+      config = configuration.generate()
+    summary = batch.convert_many_and_summarise(
+        args.input, args.output, config, args.jobs, args.force, args.summary)
+    if summary is None:
+      exit_status = 1
+
+  elif args.mode == 'serve':
+    # Only the server uses HTTP, so it isn't imported with this module.
+    import server
+    if args.config:
+      config = configuration.load(args.config)
+    else:
+      config = configuration.generate()
+    server.serve((args.host, args.port), config, args.jobs, args.work_dir,
+                 args.job_ttl)
+
+  disable_scan_cache()
+  importprofile.stop_and_print(sys.stderr)
+  return exit_status
 
 
 if __name__ == '__main__':
@@ -30,12 +30,16 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import unittest
 
 import bs4
 import mock
 
 import caterpillar
+import chrome_app.apis
+import packagestore
+import tracing
 
 TEST_DIR = os.path.dirname(os.path.realpath(__file__))
 MINIMAL_APP_NAME = 'test_app_minimal'
@@ -129,6 +133,55 @@ class TestSetupOutputDir(TestCaseWithTempDir):
         path = os.path.join(MINIMAL_PATH, relpath)
         self.assertTrue(os.path.exists(path))
 
+  def test_setup_output_dir_returns_output_index(self):
+    """Tests that setup_output_dir returns an index of the output app."""
+    index = caterpillar.setup_output_dir(
+        MINIMAL_PATH, self.output_path, BOILERPLATE_DIR, REPORT_DIR)
+    expected_files = []
+    for root, _, files in os.walk(self.output_path):
+      for name in files:
+        expected_files.append(
+            os.path.relpath(os.path.join(root, name), self.output_path))
+    self.assertEqual(index.relpaths(), sorted(expected_files))
+    self.assertIn(BOILERPLATE_DIR, index.dirs)
+    self.assertIn(REPORT_DIR, index.dirs)
+    for entry in index.files():
+      self.assertTrue(entry.path.startswith(self.output_path))
+
+  def test_setup_output_dir_hardlinks_unedited_files(self):
+    """Tests that only files which are never edited are hard linked."""
+    # The input must be on the same filesystem as the output to be linked.
+    input_path = os.path.join(self.temp_path, 'ínput')
+    shutil.copytree(MINIMAL_PATH, input_path)
+    caterpillar.setup_output_dir(input_path, self.output_path,
+                                 BOILERPLATE_DIR, REPORT_DIR,
+                                 copy_strategy=caterpillar.filecopy.HARDLINK)
+    relpath = os.path.join('my fólder 📂', 'my fíle')
+    self.assertTrue(os.path.samefile(os.path.join(input_path, relpath),
+                                     os.path.join(self.output_path, relpath)))
+    self.assertFalse(os.path.samefile(
+        os.path.join(input_path, 'my scrípt.js'),
+        os.path.join(self.output_path, 'my scrípt.js')))
+
+  def test_setup_output_dir_copies_dependencies(self):
+    """Tests that files where dependencies are installed aren't hard linked."""
+    input_path = os.path.join(self.temp_path, 'ínput')
+    shutil.copytree(MINIMAL_PATH, input_path)
+    relpaths = [os.path.join(folder, 'dép', 'dép.css')
+                for folder in ('node_modules', 'bower_components')]
+    for relpath in relpaths:
+      os.makedirs(os.path.dirname(os.path.join(input_path, relpath)))
+      with open(os.path.join(input_path, relpath), 'w') as css_file:
+        css_file.write(b'p {}\n')
+
+    caterpillar.setup_output_dir(input_path, self.output_path,
+                                 BOILERPLATE_DIR, REPORT_DIR,
+                                 copy_strategy=caterpillar.filecopy.HARDLINK)
+    for relpath in relpaths:
+      self.assertFalse(os.path.samefile(
+          os.path.join(input_path, relpath),
+          os.path.join(self.output_path, relpath)))
+
   def test_setup_output_dir_force_false(self):
     """Tests that force=False disallows overwriting of an existing directory."""
     os.mkdir(self.output_path)
@@ -589,10 +642,13 @@ unrelated.app.call();"""
     with codecs.open(filepath, 'w', encoding='utf-8') as js_file:
       js_file.write(js)
 
-    caterpillar.insert_todos_into_file(filepath)
+    os.utime(filepath, (1000, 1000))
+
+    self.assertFalse(caterpillar.insert_todos_into_file(filepath))
 
     with codecs.open(filepath, encoding='utf-8') as js_file:
       self.assertEqual(js, js_file.read())
+    self.assertEqual(os.stat(filepath).st_mtime, 1000)
 
   def test_top_level_todos(self):
     """Tests TODOs are inserted for top-level API calls like chrome.tts.speak.
@@ -640,6 +696,30 @@ chrome.storage.onChanged.addListener(function() {});
 unrelated.app.call();""")
 
 
+  def test_undecodable_bytes_and_line_endings_kept(self):
+    """Tests that lines are kept byte for byte around inserted TODOs."""
+    js = (b'// caf\xe9\r\n'
+          b'var x = 1;\n'
+          b'chrome.tts.speak(x);\r\n'
+          b'// caf\xc3\xa9')
+    filepath = os.path.join(self.temp_path, 'test.js')
+    with open(filepath, 'w') as js_file:
+      js_file.write(js)
+    os.chmod(filepath, 0o640)
+
+    self.assertTrue(caterpillar.insert_todos_into_file(filepath))
+
+    with open(filepath) as js_file:
+      self.assertEqual(js_file.read(), b'// caf\xe9\r\n'
+                                       b'var x = 1;\n'
+                                       b'// TODO(Caterpillar): Check usage of '
+                                       b'tts.speak.\r\n'
+                                       b'chrome.tts.speak(x);\r\n'
+                                       b'// caf\xc3\xa9')
+    self.assertEqual(os.stat(filepath).st_mode & 0o777, 0o640)
+    self.assertEqual(os.listdir(self.temp_path), ['test.js'])
+
+
 class TestGenerateServiceWorker(TestCaseWithOutputDir):
   """Tests generate_service_worker."""
 
@@ -745,6 +825,113 @@ chrome.app.runtime.onLaunched.addListener(function() {
                      encoding='utf-8') as js_file:
       self.assertIn('<meta content="test233" name="name"', js_file.read())
 
+  def test_parallel_matches_serial(self):
+    """Tests that editing with many processes gives the same output."""
+    chrome_app_manifest = {
+      'app': {'background': {}},
+      'name': 'test233'
+    }
+    parallel_path = os.path.join(self.temp_path, 'parallel')
+    caterpillar.setup_output_dir(MINIMAL_PATH, parallel_path, BOILERPLATE_DIR,
+                                 REPORT_DIR)
+    config = {'boilerplate_dir': BOILERPLATE_DIR}
+    caterpillar.edit_code(self.output_path, ['tést.js'], chrome_app_manifest,
+                          config)
+    logging.root.setLevel(logging.DEBUG)
+    try:
+      with mock.patch('logging.root.handle') as mock_handle:
+        caterpillar.edit_code(parallel_path, ['tést.js'], chrome_app_manifest,
+                              config, jobs=2)
+    finally:
+      logging.root.setLevel(logging.WARNING)
+    # Logs from the worker processes are replayed in this process.
+    self.assertTrue(mock_handle.called)
+    for root, _, files in os.walk(self.output_path):
+      for name in files:
+        relpath = os.path.relpath(os.path.join(root, name), self.output_path)
+        with open(os.path.join(self.output_path, relpath)) as serial_file:
+          with open(os.path.join(parallel_path, relpath)) as parallel_file:
+            self.assertEqual(serial_file.read(), parallel_file.read())
+
+
+  def test_usage_found(self):
+    """Tests that API usage is found in edited JavaScript files."""
+    usages = caterpillar.edit_code(
+        self.output_path, [], {}, {'boilerplate_dir': BOILERPLATE_DIR},
+        apis=['power'])
+    self.assertEqual(sorted(usages), ['app.info.js', 'my scrípt.js',
+                                      'mý other script.js'])
+    usage = chrome_app.apis.usage(['power'], self.output_path)
+    self.assertEqual(
+        chrome_app.apis.usage(['power'], self.output_path, file_usages=usages),
+        usage)
+    self.assertEqual(usage['power'].keys(), ['requestKeepAwake'])
+
+
+class TestEditFile(TestCaseWithTempDir):
+  """Tests edit_file."""
+
+  def edit_html(self, html, chrome_app_manifest=None):
+    """Edits an HTML file with the given contents, returning the result."""
+    path = os.path.join(self.temp_path, 'ín.html')
+    with open(path, 'w') as html_file:
+      html_file.write(html.encode('utf-8'))
+    caterpillar.edit_file(path, 'html', '.', ['réq.js'],
+                          chrome_app_manifest or {'name': 'náme'},
+                          BOILERPLATE_DIR)
+    with open(path) as html_file:
+      return html_file.read().decode('utf-8')
+
+  def test_html_spliced(self):
+    """Tests that tags are injected into HTML without reformatting it."""
+    self.assertEqual(self.edit_html("""<html>
+<head><title>Títle</title></head>
+<body><p>Héllo</p>   <script src="main.js"></script></body>
+</html>"""), """<html>
+<head><meta charset="utf-8"><title>Títle</title><link\
+ href="./manifest.webmanifest" rel="manifest"><meta content="náme"\
+ name="name"></head>
+<body><p>Héllo</p>   <script src="./bóilerplate dir/réq.js"></script>\
+<script src="main.js"></script></body>
+</html>""")
+
+  def test_author_object(self):
+    """Tests that an author given as an object is injected as a string."""
+    html = self.edit_html('<head></head>',
+                          {'author': {'email': 'ann@example.com'}})
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    meta = soup.find('meta', {'name': 'author'})
+    self.assertIn('ann@example.com', meta['content'])
+
+  def test_malformed_html(self):
+    """Tests that malformed HTML is edited with BeautifulSoup."""
+    soup = bs4.BeautifulSoup(
+        self.edit_html('<head><title>Títle</title><body><p>Héllo'),
+        'html.parser')
+    self.assertIsNotNone(soup.find(
+        'script', src=os.path.join('.', BOILERPLATE_DIR, 'réq.js')))
+    self.assertIsNotNone(soup.find('meta', charset='utf-8'))
+    self.assertEqual(soup.find('p').get_text().strip(), 'Héllo')
+
+
+class TestEditFileAndCaptureLogs(TestCaseWithOutputDir):
+  """Tests edit_file_and_capture_logs."""
+
+  def test_logs_captured(self):
+    """Tests that logs are returned rather than emitted."""
+    logging.root.setLevel(logging.DEBUG)
+    original_handlers = logging.root.handlers
+    try:
+      _, records, _ = caterpillar.edit_file_and_capture_logs((
+          os.path.join(self.output_path, 'my índex.html'), 'html', '.', [], {},
+          BOILERPLATE_DIR))
+    finally:
+      logging.root.handlers = original_handlers
+      logging.root.setLevel(logging.WARNING)
+    self.assertTrue(records)
+    self.assertTrue(all(isinstance(record, logging.LogRecord)
+                        for record in records))
+
 
 class TestAddAppInfo(TestCaseWithOutputDir):
   """Tests add_app_info."""
@@ -771,6 +958,106 @@ caterpillar_.manifest = {
 """)
 
 
+class TestInstallDependency(TestCaseWithTempDir):
+  """Tests install_dependency."""
+
+  def test_timeout(self):
+    """Tests that a call that takes too long is killed, with its children."""
+    for call in [['sleep', '10'], ['sh', '-c', 'sleep 10 & wait']]:
+      start = time.time()
+      with self.assertRaises(caterpillar.InstallationError):
+        caterpillar.install_dependency(call, self.temp_path, 0.1)
+      self.assertLess(time.time() - start, 5)
+
+
+class TestInstallation(TestCaseWithTempDir):
+  """Tests Installation."""
+
+  def setUp(self):
+    super(TestInstallation, self).setUp()
+    self.dependencies = [
+      {'name': 'á', 'manager': 'npm'},
+      {'name': 'b', 'manager': 'bower'},
+      {'name': 'ć', 'manager': 'npm'},
+    ]
+    self.store = packagestore.PackageStore(
+        os.path.join(self.temp_path, 'stóre'))
+
+  @mock.patch('caterpillar.install_dependency')
+  def test_one_call_per_manager(self, mock_install_dependency):
+    """Tests that each dependency manager installs all its dependencies."""
+    installation = caterpillar.Installation(self.dependencies, self.temp_path,
+                                            store=self.store)
+    self.assertTrue(installation.wait())
+    mock_install_dependency.assert_has_calls([
+        mock.call(['bower', 'install', 'b'], self.temp_path,
+                  caterpillar.INSTALL_TIMEOUT),
+        mock.call(['npm', 'install', 'á', 'ć'], self.temp_path,
+                  caterpillar.INSTALL_TIMEOUT),
+    ], any_order=True)
+    self.assertEqual(mock_install_dependency.call_count, 2)
+
+  @mock.patch('caterpillar.logging')
+  @mock.patch('caterpillar.install_dependency')
+  def test_failure_warns(self, mock_install_dependency, mock_logging):
+    """Tests that each dependency that failed to install is warned about."""
+    def install_dependency(call, output_dir, timeout):
+      if call[0] == 'npm':
+        raise caterpillar.InstallationError('Nópe')
+    mock_install_dependency.side_effect = install_dependency
+
+    installation = caterpillar.Installation(self.dependencies, self.temp_path,
+                                            store=self.store)
+    self.assertFalse(installation.wait())
+    mock_logging.warning.assert_has_calls([
+        mock.call('Failed to install dependency `%s` with %s', 'á', 'npm'),
+        mock.call('Failed to install dependency `%s` with %s', 'ć', 'npm'),
+    ])
+    self.assertEqual(mock_logging.warning.call_count, 2)
+
+  @mock.patch('caterpillar.install_dependency')
+  def test_store_used(self, mock_install_dependency):
+    """Tests that dependencies in the package store are installed from it."""
+    package_path = os.path.join(self.temp_path, 'á')
+    os.mkdir(package_path)
+    with open(os.path.join(package_path, 'á.js'), 'w') as js_file:
+      js_file.write(b'// Á.\n')
+    self.store.add('npm', 'á', package_path)
+
+    installation = caterpillar.Installation(self.dependencies, self.temp_path,
+                                            store=self.store)
+    self.assertTrue(installation.wait())
+    mock_install_dependency.assert_has_calls([
+        mock.call(['bower', 'install', 'b'], self.temp_path,
+                  caterpillar.INSTALL_TIMEOUT),
+        mock.call(['npm', 'install', 'ć'], self.temp_path,
+                  caterpillar.INSTALL_TIMEOUT),
+    ], any_order=True)
+    self.assertEqual(mock_install_dependency.call_count, 2)
+    self.assertTrue(os.path.exists(
+        os.path.join(self.temp_path, 'node_modules', 'á', 'á.js')))
+
+  def test_invalid_manager(self):
+    """Tests that an invalid dependency manager is rejected."""
+    with self.assertRaises(ValueError):
+      caterpillar.Installation([{'name': 'á', 'manager': 'pip'}],
+                               self.temp_path)
+
+
+class TestSeedPackageStore(TestCaseWithTempDir):
+  """Tests seed_package_store."""
+
+  def test_seed_from_directory(self):
+    """Tests that installed dependencies are stored."""
+    source_path = os.path.join(self.temp_path, 'sóurce')
+    os.makedirs(os.path.join(source_path, 'node_modules', 'localforage'))
+    store = packagestore.PackageStore(os.path.join(self.temp_path, 'stóre'))
+    # The other dependencies aren't installed.
+    self.assertFalse(caterpillar.seed_package_store(store, source_path))
+    self.assertIsNotNone(store.find('npm', 'localforage'))
+    self.assertIsNone(store.find('bower', 'lato'))
+
+
 class TestConvertApp(TestCaseWithTempDir):
   """Tests convert_app."""
 
@@ -788,6 +1075,141 @@ class TestConvertApp(TestCaseWithTempDir):
     caterpillar.convert_app(input_dir, output_path, config, [], force=False)
     mock_logging.error.assert_called_with('Output directory already exists.')
 
+  @mock.patch('caterpillar.install_dependency')
+  def test_excluded(self, mock_install_dependency):
+    """Tests that excluded files are left out of the web app."""
+    config = {
+      'boilerplate_dir': BOILERPLATE_DIR,
+      'exclude': ['my fólder 📂', '*.notmarkdown'],
+      'report_dir': REPORT_DIR,
+      'start_url': 'my índex.html',
+    }
+    output_path = os.path.join(self.temp_path, 'óutput')
+    caterpillar.convert_app(MINIMAL_PATH, output_path, config, [])
+    self.assertTrue(os.path.exists(os.path.join(output_path, 'my scrípt.js')))
+    self.assertFalse(os.path.exists(os.path.join(output_path, 'my fólder 📂')))
+    self.assertFalse(os.path.exists(
+        os.path.join(output_path, 'my RÉADME.notmarkdown')))
+
+  @mock.patch('caterpillar.logging')
+  def test_invalid_exclude(self, mock_logging):
+    """Tests that exclude options that aren't lists of globs are rejected."""
+    config = {
+      'boilerplate_dir': BOILERPLATE_DIR,
+      'exclude': 'my fólder 📂',
+      'report_dir': REPORT_DIR,
+      'start_url': 'my índex.html',
+    }
+    output_path = os.path.join(self.temp_path, 'óutput')
+    self.assertIsNone(caterpillar.convert_app(MINIMAL_PATH, output_path,
+                                              config, []))
+    mock_logging.error.assert_called_with(
+        'Configuration option `exclude` must be a list of globs.')
+    self.assertFalse(os.path.exists(output_path))
+
+  @mock.patch('caterpillar.install_dependency')
+  def test_traced(self, mock_install_dependency):
+    """Tests that each stage of a conversion is traced."""
+    config = {
+      'boilerplate_dir': BOILERPLATE_DIR,
+      'report_dir': REPORT_DIR,
+      'start_url': 'my índex.html',
+    }
+    tracing.start()
+    try:
+      caterpillar.convert_app(MINIMAL_PATH,
+                              os.path.join(self.temp_path, 'óutput'), config,
+                              [])
+    finally:
+      tracer = tracing.stop()
+    names = {event['name'] for event in tracer.events}
+    self.assertTrue({'setup_output_dir', 'app_apis', 'read_manifest',
+                     'write_manifests', 'edit_code', 'edit_file',
+                     'copy_static_code', 'wait_for_installation',
+                     'add_service_worker', 'generate_and_write'} <= names)
+    self.assertIn('my índex.html', {event['args'].get('path')
+                                    for event in tracer.events})
+
+
+@mock.patch('caterpillar.install_dependency')
+class TestConvertAppIncremental(TestCaseWithTempDir):
+  """Tests convert_app in incremental mode."""
+
+  def setUp(self):
+    """Makes a copy of the minimal app and a configuration dictionary.
+
+    The paths are stored in self.input_path and self.output_path, and the
+    configuration in self.config.
+    """
+    super(TestConvertAppIncremental, self).setUp()
+    self.input_path = os.path.join(self.temp_path, 'ínput')
+    self.output_path = os.path.join(self.temp_path, 'óutput')
+    shutil.copytree(MINIMAL_PATH, self.input_path)
+    self.config = {
+      'boilerplate_dir': BOILERPLATE_DIR,
+      'report_dir': REPORT_DIR,
+      'start_url': 'my índex.html',
+    }
+
+  def read_tree(self, directory):
+    """Reads all files in a directory, except for the random service worker.
+
+    Args:
+      directory: Path to directory.
+
+    Returns:
+      Dictionary mapping relative paths to file contents.
+    """
+    contents = {}
+    for dirpath, _, filenames in os.walk(directory):
+      for filename in filenames:
+        path = os.path.join(dirpath, filename)
+        relpath = os.path.relpath(path, directory)
+        if relpath in {caterpillar.SW_SCRIPT_NAME,
+                       caterpillar.fingerprints.FINGERPRINTS_FILENAME}:
+          continue
+        with open(path) as f:
+          contents[relpath] = f.read()
+    return contents
+
+  def test_matches_full_conversion(self, mock_install_dependency):
+    """Tests that an incremental update matches a full conversion."""
+    caterpillar.convert_app(self.input_path, self.output_path, self.config, [],
+                            incremental=True)
+    self.assertTrue(os.path.exists(os.path.join(
+        self.output_path, caterpillar.fingerprints.FINGERPRINTS_FILENAME)))
+
+    with open(os.path.join(self.input_path, 'my scrípt.js'), 'a') as js_file:
+      js_file.write(b'chrome.tts.speak("hello");\n')
+    os.remove(os.path.join(self.input_path, 'mý other script.js'))
+    caterpillar.convert_app(self.input_path, self.output_path, self.config, [],
+                            incremental=True)
+
+    full_path = os.path.join(self.temp_path, 'fúll')
+    caterpillar.convert_app(self.input_path, full_path, self.config, [])
+    self.assertEqual(self.read_tree(self.output_path),
+                     self.read_tree(full_path))
+
+  def test_unchanged_files_not_edited(self, mock_install_dependency):
+    """Tests that nothing is edited again if the input is unchanged."""
+    caterpillar.convert_app(self.input_path, self.output_path, self.config, [],
+                            incremental=True)
+    with mock.patch('caterpillar.edit_file') as mock_edit_file:
+      status = caterpillar.convert_app(self.input_path, self.output_path,
+                                       self.config, [], incremental=True)
+    self.assertFalse(mock_edit_file.called)
+    self.assertIsNotNone(status)
+
+  def test_config_change_converts_from_scratch(self, mock_install_dependency):
+    """Tests that a different configuration discards the previous output."""
+    caterpillar.convert_app(self.input_path, self.output_path, self.config, [],
+                            incremental=True)
+    self.config['boilerplate_dir'] = 'néw boilerplate'
+    caterpillar.convert_app(self.input_path, self.output_path, self.config, [],
+                            incremental=True)
+    self.assertFalse(os.path.exists(
+        os.path.join(self.output_path, BOILERPLATE_DIR)))
+
 
 if __name__ == '__main__':
   unittest.main()
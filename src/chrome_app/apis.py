@@ -22,49 +22,53 @@ APIs used, and a function to walk a directory containing multiple apps and
 return a list of (app name, app dir, API set) tuples. This is a pretty naive
 check; there are no guarantees that all APIs will be found.
 
-Can also be used from the command line.
+Can also be used from the command line. With -m, every app in a directory of
+apps is scanned, in several processes with -j, and each app's APIs are printed
+(or written as a line of JSON with -o) as soon as it has been scanned. An
+interrupted scan can be continued with --resume. From the src directory:
+
+  python -m chrome_app.apis -m -j 8 -o apis.jsonl --resume ~/chrome-apps
 """
 
 from __future__ import print_function, division, unicode_literals
 
 import argparse
+import bisect
 import collections
 import json
 import logging
+import mmap
 import re
 import os
 import sys
 
+import index as app_index
 import manifest as app_manifest
+import scancache
 import surrogateescape
-import walk
 
-# Regular expression matching Chrome API namespaces, e.g. chrome.tts and
-# chrome.app.window.
-CHROME_API_REGEX = re.compile(
-    r'(?<![\w.])chrome\.((?:(?:app|sockets|system)\.)?\w+)')
+# Regular expression matching every reference to the chrome namespace, e.g.
+# chrome.tts and chrome.app.runtime.onLaunched.addListener. The dotted names
+# after "chrome." are captured without being consumed, so references nested in
+# other references are found too.
+CHROME_REFERENCE_REGEX = re.compile(r'chrome\.(?=(\w+(?:\.\w+)*))')
+
+# As CHROME_REFERENCE_REGEX, but only matching references which aren't
+# themselves members of something else, e.g. not mychrome.tts or a.chrome.tts.
+CHROME_TOP_LEVEL_REFERENCE_REGEX = re.compile(
+    r'(?<![\w.])chrome\.(?=(\w+(?:\.\w+)*))')
 
-# Regular expression matching Chrome apps API usage, e.g.
-# chrome.tts.speak and chrome.app.runtime.onLaunched.addListener.
-CHROME_API_USAGE_REGEX = re.compile(r'(?<![\w.])chrome\.((?:\w+\.)+\w+)')
+# Bytes in every reference to the chrome namespace. Files are searched for them
+# before anything is decoded, and files without them are never decoded.
+CHROME_REFERENCE_BYTES = b'chrome.'
+
+# Namespaces which contain APIs, e.g. chrome.app.window.
+SUPER_API_NAMESPACES = {'app', 'sockets', 'system'}
 
 # Regular expression matching anything in the chrome namespace, e.g. chrome.tts
 # or chrome.app.runtime.onLaunched.addListener.
 CHROME_NAMESPACE_REGEX = re.compile(r'chrome((?:\.\w+)+)')
 
-# Regular expression matching both the API and the member, assuming both exist.
-CHROME_API_AND_MEMBER_REGEX = re.compile(r"""
-  (?<![\w.])chrome\. # In the chrome namespace
-  ( # Capture the full API name
-    (?:(?:app|sockets|system)\.)? # API may be part of a super-API namespace
-    \w+ # Actual API name
-  )
-  \.
-  ( # Capture the full member name
-    (?:\w+\.?)+
-  )
-""", re.VERBOSE)
-
 
 def api_member_used(line):
   """
@@ -77,18 +81,37 @@ def api_member_used(line):
   Returns:
     None or string member name.
   """
-  use_match = CHROME_API_USAGE_REGEX.search(line)
-  if not use_match:
+  if 'chrome' not in line:
     return None
 
-  return use_match.group(1)
+  for match in CHROME_TOP_LEVEL_REFERENCE_REGEX.finditer(line):
+    if '.' in match.group(1):
+      return match.group(1)
+
+  return None
+
+
+def api_name(names):
+  """Gets the name of the API that a reference to the chrome namespace is in.
 
+  Args:
+    names: List of the names after "chrome." in the reference, e.g. ['app',
+      'window', 'create'].
+
+  Returns:
+    String API name, e.g. 'app.window'.
+  """
+  if names[0] in SUPER_API_NAMESPACES and len(names) > 1:
+    return '{}.{}'.format(names[0], names[1])
+  return names[0]
 
-def app_apis(directory):
+
+def app_apis(directory, index=None):
   """Returns a set of Chrome APIs used in a given app directory.
 
   Args:
     directory: App directory to search for Chrome APIs.
+    index: AppIndex of the app directory. Optional; built if not given.
 
   Returns:
     A sorted list of Chrome API names.
@@ -98,24 +121,191 @@ def app_apis(directory):
 
   # For each js file in the directory, add all of the Chrome APIs being used to
   # a set of Chrome API names.
+  if index is None:
+    index = app_index.AppIndex.build(directory)
+
   apis = set()
-  for js_path in walk.all_paths(directory, extension='js'):
-    with open(js_path, 'rU') as js_file:
-      js = surrogateescape.decode(js_file.read())
-    for api_match in CHROME_API_REGEX.finditer(js):
-      apis.add(api_match.group(1))
+  for entry in index.files(app_index.KIND_JS):
+    apis.update(file_apis(entry.path, entry.digest))
 
   return sorted(apis)
 
 
-def apps_apis(directory):
-  """Finds Chrome APIs used by each app in a directory of apps.
+def file_apis(js_path, digest=None):
+  """Returns the set of Chrome APIs used in a JavaScript file.
+
+  Only the lines with references to the chrome namespace are decoded. If a scan
+  cache is enabled, files with the same contents are only scanned once.
+
+  Args:
+    js_path: Path to JavaScript file.
+    digest: Digest of the file, or a function returning it, for the scan cache;
+      see scancache.cached. Optional.
+
+  Returns:
+    Set of Chrome API names.
+  """
+  return set(scancache.cached(js_path, 'apis',
+                              lambda: sorted(_scan_apis(js_path)), digest))
+
+
+def _scan_apis(js_path):
+  """Scans a JavaScript file for the set of Chrome APIs it uses."""
+  apis = set()
+  mapped_file = MappedFile(js_path)
+  try:
+    position = mapped_file.find(CHROME_REFERENCE_BYTES)
+    while position >= 0:
+      line_num = mapped_file.line_num(position)
+      apis.update(api_name(match.group(1).split('.'))
+                  for match in CHROME_TOP_LEVEL_REFERENCE_REGEX.finditer(
+                      mapped_file.line(line_num)))
+      position = mapped_file.find(CHROME_REFERENCE_BYTES,
+                                  mapped_file.line_end(line_num))
+  finally:
+    mapped_file.close()
+  return apis
+
+
+def file_members_used(js_path, digest=None):
+  """Finds the lines of a JavaScript file that use Chrome Apps API members.
+
+  Only the lines with references to the chrome namespace are decoded. If a scan
+  cache is enabled, files with the same contents are only scanned once.
+
+  Args:
+    js_path: Path to JavaScript file.
+    digest: Digest of the file, or a function returning it, for the scan cache;
+      see scancache.cached. Optional.
+
+  Returns:
+    List of (line number, member name) tuples in order, with the member
+    api_member_used finds on each line that uses one. Lines are numbered from 0.
+  """
+  return [tuple(line_member) for line_member in scancache.cached(
+      js_path, 'members', lambda: _scan_members_used(js_path), digest)]
+
+
+def _scan_members_used(js_path):
+  """Scans a JavaScript file for the lines using Chrome Apps API members."""
+  members = []
+  mapped_file = MappedFile(js_path)
+  try:
+    position = mapped_file.find(CHROME_REFERENCE_BYTES)
+    while position >= 0:
+      line_num = mapped_file.line_num(position)
+      member = api_member_used(mapped_file.line(line_num))
+      if member is not None:
+        members.append((line_num, member))
+      position = mapped_file.find(CHROME_REFERENCE_BYTES,
+                                  mapped_file.line_end(line_num))
+  finally:
+    mapped_file.close()
+  return members
+
+
+class MappedFile(object):
+  """A file mapped into memory, decoded a line at a time.
+
+  Lines are found from an index of the offsets of newlines, which is only built
+  as far into the file as lines are asked for.
+
+  Attributes:
+    data: mmap of the file, or empty bytes if the file is empty.
+  """
+
+  def __init__(self, path):
+    with open(path, 'rb') as f:
+      if os.fstat(f.fileno()).st_size:
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      else:
+        # Empty files can't be mapped.
+        self.data = b''
+    self._newlines = []
+    # Offset to search for the next newline from, or None if there are no more.
+    self._searched = 0
+
+  def close(self):
+    """Unmaps the file."""
+    if isinstance(self.data, mmap.mmap):
+      self.data.close()
+
+  def find(self, string, start=0):
+    """Finds bytes in the file.
+
+    Args:
+      string: Bytes to find.
+      start: Offset to start searching from.
+
+    Returns:
+      Offset of the bytes, or -1 if they aren't in the file after start.
+    """
+    return self.data.find(string, start)
+
+  def _index_newline(self):
+    """Finds the next newline, returning whether there was one."""
+    if self._searched is None:
+      return False
+    newline = self.data.find(b'\n', self._searched)
+    if newline < 0:
+      self._searched = None
+      return False
+    self._newlines.append(newline)
+    self._searched = newline + 1
+    return True
+
+  def line_num(self, offset):
+    """Gets the number of the line containing an offset, counting from 0."""
+    while (self._searched is not None and self._searched <= offset and
+           self._index_newline()):
+      pass
+    return bisect.bisect_left(self._newlines, offset)
+
+  def _line_start(self, line_num):
+    """Gets the offset of the start of a line, or None if it doesn't exist."""
+    while len(self._newlines) < line_num and self._index_newline():
+      pass
+    if line_num == 0:
+      start = 0
+    elif line_num <= len(self._newlines):
+      start = self._newlines[line_num - 1] + 1
+    else:
+      return None
+    return start if start < len(self.data) else None
+
+  def line_end(self, line_num):
+    """Gets the offset just past the end of a line, including its newline."""
+    while len(self._newlines) <= line_num and self._index_newline():
+      pass
+    if line_num < len(self._newlines):
+      return self._newlines[line_num] + 1
+    return len(self.data)
+
+  def line(self, line_num):
+    """Gets a line of the file.
+
+    Args:
+      line_num: Number of the line, counting from 0.
+
+    Returns:
+      Decoded line, including its newline, or None if the file has fewer lines.
+    """
+    start = self._line_start(line_num)
+    if start is None:
+      return None
+    return surrogateescape.decode(self.data[start:self.line_end(line_num)])
+
+
+def find_apps(directory):
+  """Finds the apps in a directory of apps.
+
+  Subdirectories without a valid manifest are skipped.
 
   Args:
     directory: Directory containing many app directories.
 
   Yields:
-    (app name, app dir, API set)
+    (app dir, manifest dictionary), sorted by app dir.
   """
   apps = os.listdir(directory)
   apps.sort()
@@ -132,12 +322,113 @@ def apps_apis(directory):
         logging.warn('Invalid manifest found in app `%s`; skipping.', path)
         continue
 
-      name = manifest['name']
-      apis = app_apis(path)
-      yield (name, path, apis)
+      yield (path, manifest)
+
+
+def apps_apis(directory, processes=1, skip=()):
+  """Finds Chrome APIs used by each app in a directory of apps.
+
+  Apps are yielded as soon as they have been scanned. With more than one
+  process, they are scanned concurrently and so may be yielded out of order.
+
+  Args:
+    directory: Directory containing many app directories.
+    processes: Number of processes to scan apps in. Default is 1.
+    skip: Collection of app dirs not to scan, e.g. those already scanned by an
+      interrupted run. Optional.
+
+  Yields:
+    (app name, app dir, API list)
+  """
+  paths = [os.path.join(directory, app)
+           for app in sorted(os.listdir(directory))]
+  paths = [path for path in paths if path not in skip and os.path.isdir(path)]
+
+  if processes > 1 and len(paths) > 1:
+    # Only scans of many apps use multiprocessing, so it isn't imported with
+    # this module.
+    import multiprocessing
+    pool = multiprocessing.Pool(min(processes, len(paths)))
+    try:
+      for result in pool.imap_unordered(_scan_app, paths):
+        if result is not None:
+          yield result
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+  else:
+    for path in paths:
+      result = _scan_app(path)
+      if result is not None:
+        yield result
+
+
+def _scan_app(path):
+  """Finds Chrome APIs used by an app, as for one app in apps_apis.
+
+  This runs in a worker process if apps are scanned concurrently.
+
+  Args:
+    path: App directory.
+
+  Returns:
+    (app name, app dir, API list) tuple, or None if the directory has no valid
+    manifest or can't be read.
+  """
+  try:
+    manifest = app_manifest.get(path)
+  except IOError:
+    # No manifest.
+    return None
+  except ValueError:
+    # Invalid manifest.
+    logging.warn('Invalid manifest found in app `%s`; skipping.', path)
+    return None
+
+  try:
+    return (manifest['name'], path, app_apis(path))
+  except (IOError, OSError) as e:
+    logging.warn('Could not scan app `%s`; skipping: %s', path, e)
+    return None
+
+
+def read_scanned_apps(output_path):
+  """Reads the apps scanned by an interrupted run from its JSON Lines output.
 
+  A partly written last line is cut off the file, so that the run's output can
+  be appended to.
 
-def usage(apis, directory, context_size=2, ignore_dirs=None):
+  Args:
+    output_path: Path to the output file. It need not exist.
+
+  Returns:
+    Set of the app dirs in the file.
+  """
+  if not os.path.exists(output_path):
+    return set()
+
+  scanned = set()
+  with open(output_path, 'r+b') as output_file:
+    offset = 0
+    for line in iter(output_file.readline, b''):
+      try:
+        if not line.endswith(b'\n'):
+          raise ValueError('Unterminated line.')
+        scanned.add(json.loads(line)['path'])
+      except (KeyError, TypeError, ValueError):
+        logging.warn('Discarding `%s` from byte %d onwards.', output_path,
+                     offset)
+        output_file.truncate(offset)
+        break
+      offset += len(line)
+  return scanned
+
+
+def usage(apis, directory, context_size=2, ignore_dirs=None, index=None,
+          file_usages=None):
   """Gets information about the usage of Chrome Apps APIs in an app directory.
 
   Args:
@@ -146,6 +437,10 @@ def usage(apis, directory, context_size=2, ignore_dirs=None):
     context_size: Number of lines either side of each API usage to consider part
       of the context for that usage. Default is 2.
     ignore_dirs: Set of absolute directory paths to ignore. Optional.
+    index: AppIndex of the app directory. Optional; built if not given.
+    file_usages: Dictionary mapping relative paths of files to the results of
+      file_usage for them, for files whose usage is already known. These files
+      aren't read again. Optional.
 
   Returns:
     Dictionary mapping API names to dictionaries. These dictionaries then map
@@ -155,32 +450,227 @@ def usage(apis, directory, context_size=2, ignore_dirs=None):
       to the API usage.
     - context_linenum is the line number that the context starts on.
   """
-  if ignore_dirs is None:
-    ignore_dirs = set()
+  if index is None:
+    index = app_index.AppIndex.build(directory)
 
   # Maps API names to dictionaries that map API members to contexts
   usage_data = {api: collections.defaultdict(list) for api in apis}
-  api_regexes = {api: re.compile(r'chrome\.{}((?:\.\w+)+)'.format(api))
-                 for api in apis}
-
-  for js_path in walk.all_paths(
-      directory, extension='js', ignore_dirs=ignore_dirs):
-    with open(js_path, 'rU') as js_file:
-      lines = [surrogateescape.decode(line) for line in js_file]
-    for line_num, line in enumerate(lines):
-      for api, regex in api_regexes.items():
-        match = regex.search(line)
-        if match:
-          context_linenum = max(0, line_num - context_size)
-          member = match.group(1)[1:]  # Slice to remove the leading dot.
-          context = lines[context_linenum:line_num + context_size + 1]
-          rel_path = os.path.relpath(js_path, directory)
-          member_usage = (rel_path, line_num, ''.join(context), context_linenum)
-          usage_data[api][member].append(member_usage)
+  apis = frozenset(apis)
+
+  for entry in index.files(app_index.KIND_JS, ignore_dirs=ignore_dirs):
+    if file_usages and entry.relpath in file_usages:
+      usages = file_usages[entry.relpath]
+    else:
+      usages = iter_file_usage(apis, entry.path, entry.relpath, context_size,
+                               entry.digest)
+    for api, member, member_usage in usages:
+      usage_data[api][member].append(member_usage)
 
   return usage_data
 
 
+def file_usage(apis, js_path, rel_path, context_size=2, digest=None):
+  """Gets information about the usage of Chrome Apps APIs in a JavaScript file.
+
+  Args:
+    apis: List of API names.
+    js_path: Path to JavaScript file.
+    rel_path: Path to report the file as in usages.
+    context_size: Number of lines either side of each API usage to consider part
+      of the context for that usage. Default is 2.
+    digest: Digest of the file, or a function returning it, for the scan cache;
+      see scancache.cached. Optional.
+
+  Returns:
+    List of (API name, member name, (rel_path, linenum, context,
+    context_linenum)) tuples in the order they appear in the file; see usage.
+    Only the first usage of each API on a line is included.
+  """
+  return list(iter_file_usage(apis, js_path, rel_path, context_size, digest))
+
+
+def iter_file_usage(apis, js_path, rel_path, context_size=2, digest=None):
+  """Streams the usage of Chrome Apps APIs in a JavaScript file.
+
+  The file is mapped into memory and its bytes are searched for references to
+  the chrome namespace, so only the lines with references and their contexts
+  are decoded. Files without references are never decoded.
+
+  If a scan cache is enabled, the usage of every API is scanned for and cached,
+  so files with the same contents are only scanned once whatever APIs are
+  asked for.
+
+  Args:
+    apis: List of API names.
+    js_path: Path to JavaScript file.
+    rel_path: Path to report the file as in usages.
+    context_size: Number of lines either side of each API usage to consider part
+      of the context for that usage. Default is 2.
+    digest: Digest of the file, or a function returning it, for the scan cache;
+      see scancache.cached. Optional.
+
+  Yields:
+    (API name, member name, (rel_path, linenum, context, context_linenum))
+    tuples as in file_usage, in the order they appear in the file.
+  """
+  if not isinstance(apis, frozenset):
+    apis = frozenset(apis)
+
+  if scancache.active() is None:
+    for line_num, line_usages, context_lines in _scan_usage(apis, js_path,
+                                                            context_size):
+      for found in _context_usages(rel_path, context_size, line_num,
+                                   line_usages, context_lines):
+        yield found
+    return
+
+  # Every API's usage is cached as [line number, context, [[API name, member
+  # name]]] lists, one for each line with usages.
+  cached_lines = scancache.cached(
+      js_path, 'usage-{}'.format(context_size),
+      lambda: [[line_num, ''.join(context_lines), line_usages]
+               for line_num, line_usages, context_lines
+               in _scan_usage(None, js_path, context_size)], digest)
+  for line_num, context, line_usages in cached_lines:
+    context_linenum = max(0, line_num - context_size)
+    for api, member in line_usages:
+      if api in apis:
+        yield (api, member, (rel_path, line_num, context, context_linenum))
+
+
+def _scan_usage(apis, js_path, context_size):
+  """Scans a JavaScript file for the usage of Chrome Apps APIs.
+
+  Args:
+    apis: Frozenset of API names, or None for all APIs.
+    js_path: Path to JavaScript file.
+    context_size: Number of lines either side of each usage in its context.
+
+  Yields:
+    (line number, [(API name, member name)], context lines) tuples for each
+    line with usages, in order; see _context_usages.
+  """
+  mapped_file = MappedFile(js_path)
+  try:
+    position = mapped_file.find(CHROME_REFERENCE_BYTES)
+    if position >= 0 and mapped_file.find(b'\r') >= 0:
+      # Lines may end with a lone carriage return, which only universal
+      # newlines mode splits lines on.
+      with open(js_path, 'rU') as js_file:
+        for found in _stream_usage(
+            apis, (surrogateescape.decode(line) for line in js_file),
+            context_size):
+          yield found
+      return
+
+    while position >= 0:
+      line_num = mapped_file.line_num(position)
+      line = mapped_file.line(line_num)
+      line_usages = _line_usage(apis, line)
+      if line_usages:
+        context_lines = [mapped_file.line(context_line_num) for context_line_num
+                         in range(max(0, line_num - context_size), line_num)]
+        context_lines.append(line)
+        for context_line_num in range(line_num + 1,
+                                      line_num + context_size + 1):
+          context_line = mapped_file.line(context_line_num)
+          if context_line is None:
+            break
+          context_lines.append(context_line)
+        yield line_num, line_usages, context_lines
+      position = mapped_file.find(CHROME_REFERENCE_BYTES,
+                                  mapped_file.line_end(line_num))
+  finally:
+    mapped_file.close()
+
+
+def _stream_usage(apis, lines, context_size):
+  """Streams the usage of Chrome Apps APIs in lines of JavaScript.
+
+  Only the lines that may still be part of a context are kept: the context_size
+  lines before the current line, and the lines of contexts waiting for the
+  lines after their usage. Memory use is therefore bounded by the context
+  window rather than the number of lines.
+
+  Args:
+    apis: Frozenset of API names, or None for all APIs.
+    lines: Iterable of decoded lines.
+    context_size: Number of lines either side of each usage in its context.
+
+  Yields:
+    (line number, [(API name, member name)], context lines) tuples as in
+    _scan_usage, each as soon as the lines after its usages are read.
+  """
+  # Lines before the current line, and (line number, [(API name, member name)],
+  # context lines) of usages whose contexts aren't complete yet, in order.
+  previous_lines = collections.deque(maxlen=context_size)
+  pending = collections.deque()
+  for line_num, line in enumerate(lines):
+    for _, _, context_lines in pending:
+      context_lines.append(line)
+    line_usages = _line_usage(apis, line)
+    if line_usages:
+      pending.append((line_num, line_usages, list(previous_lines) + [line]))
+    previous_lines.append(line)
+
+    while pending and pending[0][0] + context_size <= line_num:
+      yield pending.popleft()
+
+  # Contexts at the end of the file are cut short.
+  while pending:
+    yield pending.popleft()
+
+
+def _line_usage(apis, line):
+  """Finds the usage of Chrome Apps APIs in a line of JavaScript.
+
+  Args:
+    apis: Frozenset of API names, or None for all APIs.
+    line: String line of code.
+
+  Returns:
+    List of (API name, member name) tuples in the order they appear in the
+    line, with only the first usage of each API.
+  """
+  if 'chrome' not in line:
+    return []
+
+  # Each reference is split into every possible (API, member) pair, e.g.
+  # chrome.app.window.create into ('app', 'window.create') and ('app.window',
+  # 'create'), and the pairs with APIs we're looking for are kept.
+  line_apis = set()
+  usages = []
+  for match in CHROME_REFERENCE_REGEX.finditer(line):
+    names = match.group(1).split('.')
+    for i in range(1, len(names)):
+      api = '.'.join(names[:i])
+      if (apis is None or api in apis) and api not in line_apis:
+        line_apis.add(api)
+        usages.append((api, '.'.join(names[i:])))
+  return usages
+
+
+def _context_usages(rel_path, context_size, line_num, line_usages,
+                    context_lines):
+  """Makes the usage tuples of a line whose context is complete.
+
+  Args:
+    rel_path: Path to report the file as in usages.
+    context_size: Number of lines either side of each usage in its context.
+    line_num: Line number of the usages.
+    line_usages: List of (API name, member name) tuples; see _line_usage.
+    context_lines: List of the lines of the context.
+
+  Returns:
+    List of usage tuples; see iter_file_usage. The usages share one context
+    string.
+  """
+  context = ''.join(context_lines)
+  context_linenum = max(0, line_num - context_size)
+  return [(api, member, (rel_path, line_num, context, context_linenum))
+          for api, member in line_usages]
+
+
 def main():
   """Parses command line arguments and scans APIs based on these arguments.
   """
@@ -189,9 +679,20 @@ def main():
   parser.add_argument('directory')
   parser.add_argument('-m', '--multiple', help='Check multiple apps',
       action='store_true')
+  parser.add_argument('-j', '--jobs', help='Number of processes to check '
+      'multiple apps with', type=int, default=1)
+  parser.add_argument('-o', '--output', help='Path to write the APIs of '
+      'multiple apps to as JSON Lines, one {"name", "path", "apis"} object per '
+      'app')
+  parser.add_argument('--resume', help='Skip the apps already in the output '
+      'file and append the rest to it', action='store_true')
   parser.add_argument('-v', '--verbose', help='Verbose output',
       action='store_true')
   args = parser.parse_args()
+  if (args.output or args.resume) and not args.multiple:
+    parser.error('-o and --resume can only be used with -m.')
+  if args.resume and not args.output:
+    parser.error('--resume needs an output file.')
 
   if args.verbose:
     logging_level = logging.DEBUG
@@ -201,12 +702,30 @@ def main():
   logging_format = ':%(levelname)s:  \t%(message)s'
   logging.basicConfig(level=logging_level, format=logging_format)
 
+  directory = args.directory.decode(sys.getfilesystemencoding())
   if args.multiple:
-    info = apps_apis(args.directory)
-    for name, path, apis in info:
-      print("{} ({}): {}".format(name, path, ", ".join(apis)))
+    skip = set()
+    if args.resume:
+      skip = read_scanned_apps(args.output)
+      logging.info('Skipping %d apps already in `%s`.', len(skip), args.output)
+    output_file = None
+    if args.output:
+      output_file = open(args.output, 'ab' if args.resume else 'wb')
+    try:
+      for name, path, apis in apps_apis(directory, args.jobs, skip):
+        if output_file:
+          output_file.write(json.dumps(
+              {'name': name, 'path': path, 'apis': apis},
+              sort_keys=True).encode('utf-8') + b'\n')
+          output_file.flush()
+        else:
+          print("{} ({}): {}".format(name, path, ", ".join(apis)))
+          sys.stdout.flush()
+    finally:
+      if output_file:
+        output_file.close()
   else:
-    apis = app_apis(args.directory)
+    apis = app_apis(directory)
     print(", ".join(apis))
 
 
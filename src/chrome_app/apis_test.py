@@ -20,6 +20,7 @@
 from __future__ import print_function, division, unicode_literals
 
 import collections
+import json
 import os
 import sys
 import unittest
@@ -28,6 +29,8 @@ import mock
 
 import caterpillar_test
 import chrome_app.apis
+import scancache
+import surrogateescape
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 
@@ -75,6 +78,66 @@ class TestAppApis(caterpillar_test.TestCaseWithOutputDir):
     ])
 
 
+class TestAppsApis(caterpillar_test.TestCaseWithTempDir):
+  """Tests apps_apis."""
+
+  def setUp(self):
+    super(TestAppsApis, self).setUp()
+    self.apps_dir = self.temp_path.decode(sys.getfilesystemencoding())
+    for app, js in [('á', 'chrome.tts.speak();'), ('b', 'chrome.alarms.get();'),
+                    ('c', 'chrome.app.window.create();')]:
+      path = os.path.join(self.apps_dir, app)
+      os.mkdir(path)
+      with open(os.path.join(path, 'manifest.json'), 'w') as manifest_file:
+        json.dump({'name': 'Äpp {}'.format(app)}, manifest_file)
+      with open(os.path.join(path, 'main.js'), 'w') as js_file:
+        js_file.write(js)
+    os.mkdir(os.path.join(self.apps_dir, 'not an app'))
+
+  def expected(self, *apps):
+    """Gets the results expected for apps."""
+    apis = {'á': ['tts'], 'b': ['alarms'], 'c': ['app.window']}
+    return [('Äpp {}'.format(app), os.path.join(self.apps_dir, app), apis[app])
+            for app in apps]
+
+  def test_serial(self):
+    """Tests that apps are scanned in order."""
+    self.assertEqual(list(chrome_app.apis.apps_apis(self.apps_dir)),
+                     self.expected('b', 'c', 'á'))
+
+  def test_parallel(self):
+    """Tests that apps scanned concurrently have the same results."""
+    self.assertEqual(sorted(chrome_app.apis.apps_apis(self.apps_dir, 2)),
+                     sorted(self.expected('b', 'c', 'á')))
+
+  def test_skip(self):
+    """Tests that skipped apps aren't scanned."""
+    skip = {os.path.join(self.apps_dir, 'b')}
+    self.assertEqual(list(chrome_app.apis.apps_apis(self.apps_dir, skip=skip)),
+                     self.expected('c', 'á'))
+
+
+class TestReadScannedApps(caterpillar_test.TestCaseWithTempDir):
+  """Tests read_scanned_apps."""
+
+  def test_missing(self):
+    """Tests that no apps were scanned if there is no output file."""
+    self.assertEqual(chrome_app.apis.read_scanned_apps(
+        os.path.join(self.temp_path, 'apis.jsonl')), set())
+
+  def test_partial_line(self):
+    """Tests that a partly written last line is cut off."""
+    output_path = os.path.join(self.temp_path, 'apis.jsonl')
+    lines = [json.dumps({'name': 'Äpp', 'path': 'apps/á', 'apis': ['tts']}),
+             json.dumps({'name': 'B', 'path': 'apps/b', 'apis': []})]
+    with open(output_path, 'w') as output_file:
+      output_file.write(''.join(line + '\n' for line in lines) + lines[0][:5])
+    self.assertEqual(chrome_app.apis.read_scanned_apps(output_path),
+                     {'apps/á', 'apps/b'})
+    with open(output_path) as output_file:
+      self.assertEqual(output_file.read(),
+                       ''.join(line + '\n' for line in lines))
+
 class TestUsage(caterpillar_test.TestCaseWithOutputDir):
   """Tests usage."""
 
@@ -110,5 +173,108 @@ notAChromeAppCall();
     })
 
 
+class TestFileUsage(caterpillar_test.TestCaseWithTempDir):
+  """Tests file_usage."""
+
+  def test_nested_apis(self):
+    """Tests that one reference is found for every API it is a member of."""
+    js_path = os.path.join(self.temp_path, 'scrípt.js')
+    with open(js_path, 'w') as js_file:
+      js_file.write(b'chrome.app.window.create(); chrome.app.window.get();\n'
+                    b'chrome.app;runtime.onLaunched;\n')
+    usages = chrome_app.apis.file_usage(['app', 'app.window', 'app.runtime'],
+                                        js_path, 'scrípt.js', context_size=0)
+    context = 'chrome.app.window.create(); chrome.app.window.get();\n'
+    self.assertEqual(usages, [
+      ('app', 'window.create', ('scrípt.js', 0, context, 0)),
+      ('app.window', 'create', ('scrípt.js', 0, context, 0)),
+    ])
+
+  def test_contexts(self):
+    """Tests that contexts span the lines either side, cut at the file ends."""
+    js_path = os.path.join(self.temp_path, 'scrípt.js')
+    lines = ['chrome.tts.speak("á");\n', 'a();\n', 'chrome.tts.stop();\n',
+             'b();\n', 'c();\n', 'd();\n', 'chrome.storage.local.get();\n']
+    with open(js_path, 'w') as js_file:
+      js_file.write(''.join(lines).encode('utf-8'))
+    usages = chrome_app.apis.file_usage(['tts', 'storage'], js_path,
+                                        'scrípt.js', context_size=2)
+    self.assertEqual(usages, [
+      ('tts', 'speak', ('scrípt.js', 0, ''.join(lines[:3]), 0)),
+      ('tts', 'stop', ('scrípt.js', 2, ''.join(lines[0:5]), 0)),
+      ('storage', 'local.get', ('scrípt.js', 6, ''.join(lines[4:]), 4)),
+    ])
+
+  def test_only_references_decoded(self):
+    """Tests that only lines with references and their contexts are decoded."""
+    js_path = os.path.join(self.temp_path, 'scrípt.js')
+    with open(js_path, 'w') as js_file:
+      js_file.write(b'a();\n' * 1000 + b'chrome.tts.speak();\nb();\n' +
+                    b'c();\n' * 1000)
+    with mock.patch('surrogateescape.decode',
+                    side_effect=surrogateescape.decode) as mock_decode:
+      usages = chrome_app.apis.file_usage(['tts'], js_path, 'scrípt.js',
+                                          context_size=1)
+      self.assertEqual(chrome_app.apis.file_apis(js_path), {'tts'})
+    self.assertEqual(usages, [('tts', 'speak', (
+        'scrípt.js', 1000, 'a();\nchrome.tts.speak();\nb();\n', 999))])
+    self.assertEqual(mock_decode.call_count, 4)
+
+  def test_carriage_returns(self):
+    """Tests that lines ending with carriage returns are split."""
+    js_path = os.path.join(self.temp_path, 'scrípt.js')
+    with open(js_path, 'w') as js_file:
+      js_file.write(b'a();\rchrome.tts.speak();\r\nb(\xe9);\r')
+    usages = chrome_app.apis.file_usage(['tts'], js_path, 'scrípt.js',
+                                        context_size=1)
+    self.assertEqual(usages, [('tts', 'speak', (
+        'scrípt.js', 1, 'a();\nchrome.tts.speak();\nb(\udce9);\n', 0))])
+
+
+  def test_cached(self):
+    """Tests that cached usages are the same as scanned usages."""
+    js_path = os.path.join(self.temp_path, 'scrípt.js')
+    with open(js_path, 'w') as js_file:
+      js_file.write('// é\nchrome.app.window.create(); chrome.tts.speak();\n'
+                    'a();\nchrome.tts.stop();\n'.encode('utf-8'))
+    scanned = [chrome_app.apis.file_usage(apis, js_path, 'scrípt.js')
+               for apis in (['app.window'], ['tts', 'app'])]
+    cache = scancache.ScanCache(os.path.join(self.temp_path, 'cache'))
+    scancache.enable(cache)
+    self.addCleanup(scancache.disable)
+    for _ in range(2):
+      self.assertEqual([chrome_app.apis.file_usage(apis, js_path, 'scrípt.js')
+                        for apis in (['app.window'], ['tts', 'app'])],
+                       scanned)
+    self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+class TestMappedFile(caterpillar_test.TestCaseWithTempDir):
+  """Tests MappedFile."""
+
+  def map_file(self, data):
+    """Writes bytes to a file and maps it."""
+    path = os.path.join(self.temp_path, 'fíle.js')
+    with open(path, 'w') as f:
+      f.write(data)
+    mapped_file = chrome_app.apis.MappedFile(path)
+    self.addCleanup(mapped_file.close)
+    return mapped_file
+
+  def test_lines(self):
+    """Tests that lines are found from offsets and numbers."""
+    mapped_file = self.map_file('á\n\nb'.encode('utf-8'))
+    self.assertEqual([mapped_file.line_num(offset) for offset in range(5)],
+                     [0, 0, 0, 1, 2])
+    self.assertEqual([mapped_file.line(line_num) for line_num in range(4)],
+                     ['á\n', '\n', 'b', None])
+    self.assertEqual(mapped_file.line_end(2), 5)
+
+  def test_empty(self):
+    """Tests that empty files have no lines."""
+    mapped_file = self.map_file(b'')
+    self.assertEqual(mapped_file.find(b'chrome.'), -1)
+    self.assertIsNone(mapped_file.line(0))
+
+
 if __name__ == '__main__':
   unittest.main()
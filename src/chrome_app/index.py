@@ -0,0 +1,235 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the files in an app directory.
+
+The index is built with a single walk of the app and then shared by every
+conversion stage, so that no stage has to walk or stat the app again. Stages
+that add, edit or remove files keep the index up to date.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+import digests
+import walk as app_walk
+
+# File kinds.
+KIND_JS = 'js'
+KIND_HTML = 'html'
+KIND_OTHER = 'other'
+
+def file_kind(filename):
+  """Gets the kind of a file from its filename.
+
+  Args:
+    filename: Filename or path.
+
+  Returns:
+    KIND_JS, KIND_HTML or KIND_OTHER.
+  """
+  lower_filename = filename.lower()
+  if lower_filename.endswith('.js'):
+    return KIND_JS
+
+  if lower_filename.endswith('.html'):
+    return KIND_HTML
+
+  return KIND_OTHER
+
+
+class FileEntry(object):
+  """Metadata about a single file in an app.
+
+  Attributes:
+    relpath: Path of the file relative to the app root.
+    path: Path of the file, including the app root.
+    size: Size of the file in bytes.
+    mtime: Modification time of the file.
+    kind: KIND_JS, KIND_HTML or KIND_OTHER.
+  """
+
+  def __init__(self, relpath, path, size, mtime, digest=None):
+    self.relpath = relpath
+    self.path = path
+    self.size = size
+    self.mtime = mtime
+    self.kind = file_kind(relpath)
+    self._digest = digest
+
+  def digest(self):
+    """Returns the SHA-256 hex digest of the file, computing it if needed."""
+    if self._digest is None:
+      self._digest = digests.file_digest(self.path)
+    return self._digest
+
+  @property
+  def known_digest(self):
+    """SHA-256 hex digest of the file if it was already computed, or None."""
+    return self._digest
+
+
+class AppIndex(object):
+  """Index of all files and directories in an app directory.
+
+  Attributes:
+    root: Path to the app directory.
+    dirs: Set of relative paths of all subdirectories.
+    path_filter: chrome_app.walk.PathFilter of the paths walked, or None if
+      every path is.
+  """
+
+  def __init__(self, root, path_filter=None):
+    self.root = root
+    self.dirs = set()
+    self.path_filter = path_filter
+    self._entries = {}
+
+  @classmethod
+  def build(cls, root, path_filter=None):
+    """Builds an index by walking an app directory.
+
+    Symbolic links are followed, so the index matches what a copy of the
+    directory would contain.
+
+    Args:
+      root: Path to app directory.
+      path_filter: chrome_app.walk.PathFilter of the paths to index. Excluded
+        directories are never walked. Optional; everything is indexed if not
+        given.
+
+    Returns:
+      AppIndex.
+
+    Raises:
+      OSError if the directory does not exist or is not a directory.
+    """
+    index = cls(root, path_filter)
+    index.add_tree('')
+    return index
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __contains__(self, relpath):
+    return relpath in self._entries
+
+  def __getitem__(self, relpath):
+    return self._entries[relpath]
+
+  def add_tree(self, reldir):
+    """Walks a directory of the app and adds everything in it to the index.
+
+    Paths excluded by the index's filter are left out.
+
+    Args:
+      reldir: Path of directory relative to the app root. '' is the root.
+
+    Raises:
+      OSError if the directory does not exist or is not a directory.
+    """
+    if reldir:
+      self._add_dirs(reldir)
+    for reldirpath, dirnames, files in app_walk.walk(self.root, reldir,
+                                                     self.path_filter):
+      for dirname in dirnames:
+        self.dirs.add(os.path.join(reldirpath, dirname))
+      for filename, stat in files:
+        self.add(os.path.join(reldirpath, filename), stat)
+
+  def add(self, relpath, stat=None):
+    """Adds a file to the index, or refreshes it if it is already indexed.
+
+    This should be called whenever a file in the app is created or edited.
+
+    Args:
+      relpath: Path of file relative to the app root.
+      stat: Result of os.stat for the file, if it was just statted. Optional.
+    """
+    path = os.path.join(self.root, relpath)
+    if stat is None:
+      stat = os.stat(path)
+    self._entries[relpath] = FileEntry(
+        relpath, path, stat.st_size, stat.st_mtime)
+    self._add_dirs(os.path.dirname(relpath))
+
+  def _add_dirs(self, reldir):
+    """Adds a relative directory path and all its parents to the index."""
+    while reldir and reldir not in self.dirs:
+      self.dirs.add(reldir)
+      reldir = os.path.dirname(reldir)
+
+  def remove(self, relpath):
+    """Removes a file from the index.
+
+    Args:
+      relpath: Path of file relative to the app root.
+    """
+    self._entries.pop(relpath, None)
+
+  def files(self, kind=None, ignore_dirs=None):
+    """Gets the indexed files, sorted by relative path.
+
+    Args:
+      kind: Only get files of this kind. Optional.
+      ignore_dirs: Set of absolute directory paths to ignore. Optional.
+
+    Returns:
+      List of FileEntry.
+    """
+    ignore_prefixes = tuple(
+        os.path.relpath(ignore_dir, os.path.abspath(self.root)) + os.sep
+        for ignore_dir in ignore_dirs or ())
+    return [entry for relpath, entry in sorted(self._entries.iteritems())
+            if (kind is None or entry.kind == kind) and
+               not relpath.startswith(ignore_prefixes)]
+
+  def paths(self, kind=None, ignore_dirs=None):
+    """Gets the paths of the indexed files, sorted by relative path.
+
+    Args:
+      kind: Only get files of this kind. Optional.
+      ignore_dirs: Set of absolute directory paths to ignore. Optional.
+
+    Returns:
+      List of file paths, including the app root.
+    """
+    return [entry.path for entry in self.files(kind, ignore_dirs)]
+
+  def relpaths(self):
+    """Returns a sorted list of the relative paths of all indexed files."""
+    return sorted(self._entries)
+
+  def rebase(self, root):
+    """Makes a copy of this index for an identical copy of the app.
+
+    File metadata, including any computed digests, is kept.
+
+    Args:
+      root: Path to the copied app directory.
+
+    Returns:
+      AppIndex.
+    """
+    index = AppIndex(root, self.path_filter)
+    index.dirs = set(self.dirs)
+    for relpath, entry in self._entries.iteritems():
+      index._entries[relpath] = FileEntry(
+          relpath, os.path.join(root, relpath), entry.size, entry.mtime,
+          entry._digest)
+    return index
@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit-test chrome_app.index."""
+
+from __future__ import print_function, division, unicode_literals
+
+import hashlib
+import os
+import unittest
+
+import caterpillar_test
+import chrome_app.index
+import chrome_app.walk
+
+
+class TestFileKind(unittest.TestCase):
+  """Tests file_kind."""
+
+  def test_kinds(self):
+    """Tests that files are classified by extension."""
+    self.assertEqual(chrome_app.index.file_kind('a/scrípt.js'), 'js')
+    self.assertEqual(chrome_app.index.file_kind('SCRIPT.JS'), 'js')
+    self.assertEqual(chrome_app.index.file_kind('índex.html'), 'html')
+    self.assertEqual(chrome_app.index.file_kind('style.css'), 'other')
+    self.assertEqual(chrome_app.index.file_kind('js'), 'other')
+
+
+class TestAppIndex(caterpillar_test.TestCaseWithTempDir):
+  """Tests AppIndex."""
+
+  def setUp(self):
+    """Builds an index of the minimal test app and stores it in self.index."""
+    super(TestAppIndex, self).setUp()
+    self.index = chrome_app.index.AppIndex.build(caterpillar_test.MINIMAL_PATH)
+
+  def test_all_files_indexed(self):
+    """Tests that every file in the app is indexed."""
+    expected = []
+    for root, _, files in os.walk(caterpillar_test.MINIMAL_PATH):
+      for name in files:
+        expected.append(os.path.relpath(os.path.join(root, name),
+                                        caterpillar_test.MINIMAL_PATH))
+    self.assertEqual(self.index.relpaths(), sorted(expected))
+    self.assertEqual(self.index.dirs, {'my fólder 📂'})
+
+  def test_files_by_kind(self):
+    """Tests that files can be filtered by kind."""
+    self.assertEqual([entry.relpath for entry in self.index.files('js')],
+                     ['app.info.js', 'my scrípt.js', 'mý other script.js'])
+    self.assertEqual(self.index.paths('html'),
+                     [os.path.join(caterpillar_test.MINIMAL_PATH,
+                                   'my índex.html')])
+
+  def test_ignore_dirs(self):
+    """Tests that files in ignored directories are skipped."""
+    ignore_dir = os.path.join(caterpillar_test.MINIMAL_PATH, 'my fólder 📂')
+    relpaths = [entry.relpath
+                for entry in self.index.files(ignore_dirs={ignore_dir})]
+    self.assertNotIn(os.path.join('my fólder 📂', 'my fíle'), relpaths)
+    self.assertIn('my scrípt.js', relpaths)
+
+  def test_metadata(self):
+    """Tests that file size and digest are correct."""
+    entry = self.index['my scrípt.js']
+    with open(entry.path, 'rb') as f:
+      content = f.read()
+    self.assertEqual(entry.size, len(content))
+    self.assertEqual(entry.digest(), hashlib.sha256(content).hexdigest())
+
+  def test_add_and_remove(self):
+    """Tests that files can be added to and removed from the index."""
+    index = chrome_app.index.AppIndex(self.temp_path)
+    os.mkdir(os.path.join(self.temp_path, 'dír'))
+    with open(os.path.join(self.temp_path, 'dír', 'néw.html'), 'w') as f:
+      f.write(b'<p>hello</p>')
+    index.add(os.path.join('dír', 'néw.html'))
+    self.assertEqual(index.relpaths(), [os.path.join('dír', 'néw.html')])
+    self.assertEqual(index[os.path.join('dír', 'néw.html')].kind, 'html')
+    self.assertEqual(index.dirs, {'dír'})
+    index.remove(os.path.join('dír', 'néw.html'))
+    self.assertEqual(index.relpaths(), [])
+
+  def test_rebase(self):
+    """Tests that a rebased index keeps metadata but changes paths."""
+    digest = self.index['my scrípt.js'].digest()
+    rebased = self.index.rebase(self.temp_path)
+    self.assertEqual(rebased.relpaths(), self.index.relpaths())
+    self.assertEqual(rebased['my scrípt.js'].path,
+                     os.path.join(self.temp_path, 'my scrípt.js'))
+    self.assertEqual(rebased['my scrípt.js']._digest, digest)
+
+  def test_path_filter(self):
+    """Tests that excluded files and directories aren't indexed."""
+    path_filter = chrome_app.walk.PathFilter(exclude=['my fólder 📂', '*.js'])
+    index = chrome_app.index.AppIndex.build(caterpillar_test.MINIMAL_PATH,
+                                            path_filter)
+    self.assertEqual(
+        index.relpaths(),
+        ['manifest.json', 'my RÉADME.notmarkdown', 'my índex.html'])
+    self.assertEqual(index.dirs, set())
+    self.assertIs(index.rebase(self.temp_path).path_filter, path_filter)
+
+  def test_missing_directory(self):
+    """Tests that building an index of a missing directory raises OSError."""
+    with self.assertRaises(OSError):
+      chrome_app.index.AppIndex.build(os.path.join(self.temp_path, 'nó'))
+
+
+if __name__ == '__main__':
+  unittest.main()
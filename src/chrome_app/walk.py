@@ -15,40 +15,243 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Utilities for walking a Chrome App and yielding information from it.
+"""Walks Chrome Apps, leaving out the files and directories the user excludes.
+
+Which paths are part of an app is decided by a PathFilter, made from the
+include and exclude globs in the configuration. Excluded directories are pruned
+from the walk, so they are never entered, however large they are.
 """
 
+from __future__ import print_function, division, unicode_literals
+
+import fnmatch
+import logging
 import os
+import re
+import stat
+
+try:
+  from os import scandir
+except ImportError:  # Python 2 only has scandir as a separate package.
+  try:
+    from scandir import scandir
+  except ImportError:
+    scandir = None
+
+# Globs of the paths that are left out of apps by default: version control
+# directories, which are never part of an app.
+DEFAULT_EXCLUDE = ['.git', '.hg', '.svn']
+
+# Globs of the files that are included in apps by default. Empty means all.
+DEFAULT_INCLUDE = []
+
+
+def compile_globs(globs):
+  """Compiles globs into a regular expression matching any of them.
+
+  Args:
+    globs: List of globs, e.g. ['*.min.js', 'lib/vendor'].
+
+  Returns:
+    Compiled regular expression, or None if there are no globs.
+  """
+  if not globs:
+    return None
+  return re.compile('|'.join('(?:{})'.format(fnmatch.translate(glob))
+                             for glob in globs))
+
+
+class PathFilter(object):
+  """Decides which files and directories are part of an app.
+
+  Globs are matched against paths relative to the app root, with / as the
+  separator. A glob without a / is matched against the name of every file and
+  directory at any depth, e.g. 'node_modules'; a glob with a / is matched
+  against the whole relative path, e.g. 'lib/*.min.js'. A trailing / is ignored.
+
+  Excluded directories are left out along with everything in them. Include
+  globs only apply to files, so with include globs, only files that match one
+  are part of the app.
+  """
+
+  def __init__(self, include=(), exclude=()):
+    """Compiles a filter.
+
+    Args:
+      include: List of globs of files to include. If empty, all files are.
+      exclude: List of globs of files and directories to exclude.
+    """
+    self.include = list(include)
+    self.exclude = list(exclude)
+    self._include_names, self._include_paths = self._compile(self.include)
+    self._exclude_names, self._exclude_paths = self._compile(self.exclude)
+
+  @staticmethod
+  def _compile(globs):
+    """Compiles globs into (name regex, path regex); see compile_globs."""
+    globs = [glob.rstrip('/') for glob in globs]
+    return (compile_globs([glob for glob in globs if '/' not in glob]),
+            compile_globs([glob for glob in globs if '/' in glob]))
+
+  @classmethod
+  def from_config(cls, config):
+    """Makes the filter of a configuration dictionary.
+
+    Args:
+      config: Configuration dictionary. Older configurations without 'include'
+        or 'exclude' options get the defaults.
+
+    Returns:
+      PathFilter.
+
+    Raises:
+      ValueError if an option isn't a list of globs.
+    """
+    globs = {}
+    for option, default in (('include', DEFAULT_INCLUDE),
+                            ('exclude', DEFAULT_EXCLUDE)):
+      globs[option] = config.get(option, default)
+      if (not isinstance(globs[option], list) or
+          not all(isinstance(glob, basestring) for glob in globs[option])):
+        raise ValueError('Configuration option `{}` must be a list of globs.'
+                         .format(option))
+    return cls(globs['include'], globs['exclude'])
+
+  @staticmethod
+  def _matches(relpath, names, paths):
+    """Checks whether a relative path matches a name or path regex."""
+    relpath = relpath.replace(os.sep, '/')
+    return bool((names and names.match(relpath.rpartition('/')[2])) or
+                (paths and paths.match(relpath)))
+
+  def excludes_dir(self, relpath):
+    """Checks whether a directory is left out of the app.
+
+    Args:
+      relpath: Path of the directory relative to the app root.
+
+    Returns:
+      Whether the directory and everything in it is excluded.
+    """
+    return self._matches(relpath, self._exclude_names, self._exclude_paths)
 
+  def includes_file(self, relpath):
+    """Checks whether a file is part of the app.
 
-def all_paths(directory, extension=None, ignore_dirs=None):
+    The file's directories are assumed not to be excluded.
+
+    Args:
+      relpath: Path of the file relative to the app root.
+
+    Returns:
+      Whether the file is included.
+    """
+    if self._matches(relpath, self._exclude_names, self._exclude_paths):
+      return False
+    return not self.include or self._matches(
+        relpath, self._include_names, self._include_paths)
+
+
+def _list_dir(path):
+  """Lists a directory, with the stat data of its entries.
+
+  Symbolic links are followed.
+
+  Args:
+    path: Path to a directory.
+
+  Yields:
+    (name, whether the entry is a directory, function returning the entry's
+    os.stat result) tuples.
+
+  Raises:
+    OSError if the directory can't be listed.
+  """
+  if scandir:
+    for entry in scandir(path):
+      yield entry.name, entry.is_dir(), entry.stat
+    return
+
+  for name in os.listdir(path):
+    entry_path = os.path.join(path, name)
+    try:
+      entry_stat = os.stat(entry_path)
+    except OSError:
+      # A broken link, which is listed as a file as os.walk would.
+      yield name, False, lambda entry_path=entry_path: os.stat(entry_path)
+      continue
+    yield (name, stat.S_ISDIR(entry_stat.st_mode),
+           lambda entry_stat=entry_stat: entry_stat)
+
+
+def walk(root, reldir='', path_filter=None):
+  """Walks a directory of an app from the top down, following symbolic links.
+
+  Excluded directories are never entered and excluded files are never
+  statted. Broken symbolic links are left out, since they can't be statted or
+  copied. Like os.walk, callers may remove names from the directory names
+  yielded to prune the walk further.
+
+  Args:
+    root: Path to the app directory.
+    reldir: Path of the directory to walk relative to the app root. Default is
+      '', the root.
+    path_filter: PathFilter of the app. Optional; everything is included if not
+      given.
+
+  Yields:
+    (relative directory path, list of subdirectory names, list of (file name,
+    os.stat result) tuples) tuples, with names sorted.
+
+  Raises:
+    OSError if a directory can't be listed, e.g. because it doesn't exist.
+  """
+  # Relative paths have the same type as the root, like os.walk's paths.
+  stack = [reldir or root[:0]]
+  while stack:
+    reldirpath = stack.pop()
+    dirnames = []
+    files = []
+    for name, is_dir, get_stat in _list_dir(
+        os.path.join(root, reldirpath) if reldirpath else root):
+      relpath = os.path.join(reldirpath, name)
+      if is_dir:
+        if not path_filter or not path_filter.excludes_dir(relpath):
+          dirnames.append(name)
+      elif not path_filter or path_filter.includes_file(relpath):
+        try:
+          files.append((name, get_stat()))
+        except OSError as e:
+          logging.debug('Skipping `%s`, which can\'t be statted: %s', relpath,
+                        e.strerror)
+    dirnames.sort()
+    files.sort()
+    yield reldirpath, dirnames, files
+    stack.extend(os.path.join(reldirpath, dirname)
+                 for dirname in reversed(dirnames))
+
+
+def all_paths(directory, extension=None, ignore_dirs=None, path_filter=None):
   """Walks a directory and yields all the file paths, possibly filtering by file
   extension.
 
   Args:
     directory: Path to a directory.
     extension: File extension. Optional.
-    ignore_dirs: Set of absolute directory paths to ignore. Optional.
+    ignore_dirs: Set of absolute directory paths to ignore. These are never
+      entered. Optional.
+    path_filter: PathFilter of the files to yield. Optional.
 
   Yields:
     File paths.
   """
-  if ignore_dirs is None:
-    ignore_dirs = set()
-
   directory = os.path.abspath(directory)
-  dirwalk = os.walk(directory)
-  for (dirpath, _, filenames) in dirwalk:
-    should_ignore = False
-    for ignore_dir in ignore_dirs:
-      if dirpath.startswith(ignore_dir):
-        should_ignore = True
-        break
-
-    if should_ignore:
-      continue
-
-    for filename in filenames:
+  ignore_dirs = {os.path.abspath(ignore_dir)
+                 for ignore_dir in ignore_dirs or ()}
+  for reldirpath, dirnames, files in walk(directory, path_filter=path_filter):
+    dirpath = os.path.join(directory, reldirpath)
+    dirnames[:] = [dirname for dirname in dirnames
+                   if os.path.join(dirpath, dirname) not in ignore_dirs]
+    for filename, _ in files:
       if extension is None or filename.lower().endswith('.' + extension):
-        path = os.path.join(dirpath, filename)
-        yield path
+        yield os.path.join(dirpath, filename)
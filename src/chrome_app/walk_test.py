@@ -0,0 +1,129 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit-test chrome_app.walk."""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import unittest
+
+import mock
+
+import caterpillar_test
+import chrome_app.walk
+
+
+class TestPathFilter(unittest.TestCase):
+  """Tests PathFilter."""
+
+  def test_exclude(self):
+    """Tests that globs match names at any depth, or whole paths."""
+    path_filter = chrome_app.walk.PathFilter(
+        exclude=['node_modules', 'líb/*.min.js', 'build/'])
+    self.assertTrue(path_filter.excludes_dir('node_modules'))
+    self.assertTrue(path_filter.excludes_dir(os.path.join('a', 'node_modules')))
+    self.assertTrue(path_filter.excludes_dir('build'))
+    self.assertFalse(path_filter.excludes_dir('nóde'))
+    self.assertFalse(path_filter.includes_file(os.path.join('líb', 'á.min.js')))
+    self.assertTrue(path_filter.includes_file(os.path.join('líb', 'á.js')))
+    self.assertTrue(path_filter.includes_file(
+        os.path.join('src', 'líb', 'á.min.js')))
+
+  def test_include(self):
+    """Tests that include globs only apply to files."""
+    path_filter = chrome_app.walk.PathFilter(include=['*.js'],
+                                             exclude=['vendór.js'])
+    self.assertTrue(path_filter.includes_file(os.path.join('dír', 'á.js')))
+    self.assertFalse(path_filter.includes_file('vendór.js'))
+    self.assertFalse(path_filter.includes_file('á.css'))
+    self.assertFalse(path_filter.excludes_dir('dír'))
+
+  def test_from_config(self):
+    """Tests that filters are made from configurations."""
+    path_filter = chrome_app.walk.PathFilter.from_config({})
+    self.assertEqual(path_filter.exclude, chrome_app.walk.DEFAULT_EXCLUDE)
+    self.assertEqual(path_filter.include, chrome_app.walk.DEFAULT_INCLUDE)
+    path_filter = chrome_app.walk.PathFilter.from_config(
+        {'include': ['*.js'], 'exclude': []})
+    self.assertEqual(path_filter.include, ['*.js'])
+    self.assertEqual(path_filter.exclude, [])
+    self.assertRaises(ValueError, chrome_app.walk.PathFilter.from_config,
+                      {'exclude': 'node_modules'})
+
+
+class TestWalk(caterpillar_test.TestCaseWithTempDir):
+  """Tests walk and all_paths."""
+
+  def setUp(self):
+    """Makes an app with a dependency tree in self.root."""
+    super(TestWalk, self).setUp()
+    self.root = self.temp_path.decode(sys.getfilesystemencoding())
+    for relpath in ['á.js', os.path.join('dír', 'b.html'),
+                    os.path.join('node_modules', 'ć', 'ć.js')]:
+      path = os.path.join(self.root, relpath)
+      if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+      with open(path, 'w') as f:
+        f.write(b'// D\n')
+
+  def test_walk(self):
+    """Tests that directories are walked top down with stat data."""
+    walked = list(chrome_app.walk.walk(self.root))
+    self.assertEqual([(reldirpath, dirnames, [name for name, _ in files])
+                      for reldirpath, dirnames, files in walked], [
+      ('', ['dír', 'node_modules'], ['á.js']),
+      ('dír', [], ['b.html']),
+      ('node_modules', ['ć'], []),
+      (os.path.join('node_modules', 'ć'), [], ['ć.js']),
+    ])
+    self.assertEqual(walked[0][2][0][1].st_size, 5)
+
+  def test_broken_link(self):
+    """Tests that broken links are left out, with or without scandir."""
+    os.symlink('nó such file', os.path.join(self.root, 'bróken.js'))
+    for scandir in {chrome_app.walk.scandir, None}:
+      with mock.patch('chrome_app.walk.scandir', scandir):
+        walked = list(chrome_app.walk.walk(self.root))
+      self.assertEqual([name for name, _ in walked[0][2]], ['á.js'])
+
+  def test_excluded_dirs_not_entered(self):
+    """Tests that excluded directories are never listed."""
+    path_filter = chrome_app.walk.PathFilter(exclude=['node_modules'])
+    with mock.patch('chrome_app.walk._list_dir',
+                    side_effect=chrome_app.walk._list_dir) as mock_list_dir:
+      walked = list(chrome_app.walk.walk(self.root,
+                                         path_filter=path_filter))
+    self.assertEqual([reldirpath for reldirpath, _, _ in walked], ['', 'dír'])
+    self.assertEqual(mock_list_dir.call_count, 2)
+
+  def test_all_paths(self):
+    """Tests that ignored directories are pruned."""
+    paths = chrome_app.walk.all_paths(
+        self.root, extension='js',
+        ignore_dirs={os.path.join(self.root, 'node_modules')})
+    self.assertEqual(list(paths), [os.path.join(self.root, 'á.js')])
+
+  def test_missing_directory(self):
+    """Tests that walking a missing directory raises OSError."""
+    with self.assertRaises(OSError):
+      list(chrome_app.walk.walk(os.path.join(self.root, 'nó')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -25,6 +25,7 @@ from __future__ import print_function, division, unicode_literals
 import json
 import logging
 
+import chrome_app.walk
 import surrogateescape
 
 # Names of the configuration options mapped to a brief description and a default
@@ -34,8 +35,19 @@ OPTIONS = {
   'boilerplate_dir':
     ('Subdirectory of root where Caterpillar will put scripts', 'caterpillar'),
   'report_dir': ('Directory of generated output report', 'caterpillar-report'),
+  'exclude': ('Comma-separated globs of files and directories to leave out of '
+              'the web app', chrome_app.walk.DEFAULT_EXCLUDE),
+  'include': ('Comma-separated globs of the only files to put in the web app, '
+              'or none for all files', chrome_app.walk.DEFAULT_INCLUDE),
+  'report_assets': ('How the report gets its styles and scripts: bower '
+                    '(installed next to the report) or inline (all in the '
+                    'report file)', 'bower'),
 }
 
+# Options added since the first configuration files were written. They are read
+# with their defaults if missing, so older files are not warned about them.
+DEFAULTED_OPTIONS = frozenset(['exclude', 'include', 'report_assets'])
+
 
 def str_to_bool(string):
   """Converts a case-insensitive string 'true' or 'false' into a bool.
@@ -73,16 +85,26 @@ def generate(interactive=False):
   """
   config = {}
   for opt, (desc, default) in sorted(OPTIONS.items()):
-    config[opt] = default
+    if isinstance(default, list):
+      # Lists are copied so that configurations don't share them.
+      config[opt] = list(default)
+    else:
+      config[opt] = default
 
     if interactive:
-      value = raw_input('{} ({}): '.format(desc, default))
+      if isinstance(default, list):
+        shown_default = ', '.join(default)
+      else:
+        shown_default = default
+      value = raw_input('{} ({}): '.format(desc, shown_default))
 
       if not value:
         continue
 
       if isinstance(default, bool):
         value = str_to_bool(value)
+      elif isinstance(default, list):
+        value = [item.strip() for item in value.split(',') if item.strip()]
 
       config[opt] = value
 
@@ -123,13 +145,16 @@ def load(config_path):
 def missing_options(config):
   """Returns a list of expected options missing from a configuration dictionary.
 
+  Options in DEFAULTED_OPTIONS are never missing, since they have defaults.
+
   Args:
     config: Configuration dictionary
 
   Returns:
     List of missing option names
   """
-  return sorted(opt for opt in OPTIONS if opt not in config)
+  return sorted(opt for opt in OPTIONS
+                if opt not in config and opt not in DEFAULTED_OPTIONS)
 
 
 def unexpected_options(config):
@@ -53,17 +53,24 @@ class TestGenerate(unittest.TestCase):
     """Tests generating a default configuration."""
     self.assertEqual(configuration.generate(), {
         'boilerplate_dir': 'caterpillar',
+        'exclude': ['.git', '.hg', '.svn'],
+        'include': [],
+        'report_assets': 'bower',
         'report_dir': 'caterpillar-report',
         'start_url': 'index.html',
     })
 
   @mock.patch('__builtin__.raw_input', side_effect=(
-      'caterpillar-📂', 'report ✓✓✓', 't✓e✓s✓t✓.html'))
+      'caterpillar-📂', 'node_modules, 📂 vendor/*.js,', '', 'inline',
+      'report ✓✓✓', 't✓e✓s✓t✓.html'))
   def test_interactive(self, mock_raw_input):
     """Tests interactively generating a configuration."""
     config = configuration.generate(True)
     self.assertEqual(config, {
         'boilerplate_dir': 'caterpillar-📂',
+        'exclude': ['node_modules', '📂 vendor/*.js'],
+        'include': [],
+        'report_assets': 'inline',
         'report_dir': 'report ✓✓✓',
         'start_url': 't✓e✓s✓t✓.html',
     })
@@ -85,6 +92,9 @@ class TestLoad(unittest.TestCase):
     """Tests loading a valid config file returns the correct result."""
     config = {
       'boilerplate_dir': '♨ 📂 directory',
+      'exclude': ['📂 node_modules'],
+      'include': ['*.js', '*.html'],
+      'report_assets': 'inline',
       'report_dir': '✒ 📂 directory',
       'start_url': '🚧 my 📄 website 🚧.html',
     }
@@ -115,6 +125,9 @@ class TestLoad(unittest.TestCase):
     """Tests that loading a config file with unknown options causes warnings."""
     config = {
       'boilerplate_dir': '♨ 📂 directory',
+      'exclude': [],
+      'include': [],
+      'report_assets': 'inline',
       'report_dir': '✒ 📂 directory',
       'start_url': '🚧 my 📄 website 🚧.html',
       'year': '2007',
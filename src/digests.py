@@ -0,0 +1,55 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Computes the SHA-256 digests that files and values are identified by."""
+
+from __future__ import print_function, division, unicode_literals
+
+import hashlib
+import json
+
+# Number of bytes to read from a file at a time when hashing it.
+BLOCK_SIZE = 1 << 16
+
+
+def file_digest(path):
+  """Gets the SHA-256 digest of a file's contents.
+
+  Args:
+    path: Path to the file.
+
+  Returns:
+    Hex digest string.
+  """
+  sha = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+      sha.update(block)
+  return sha.hexdigest()
+
+
+def json_digest(value):
+  """Gets a digest of a JSON-serialisable value.
+
+  Args:
+    value: JSON-serialisable value, e.g. a configuration dictionary.
+
+  Returns:
+    Hex digest string.
+  """
+  serialised = json.dumps(value, sort_keys=True, separators=(',', ':'))
+  return hashlib.sha256(serialised.encode('utf-8')).hexdigest()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for digests."""
+
+from __future__ import print_function, division, unicode_literals
+
+import hashlib
+import os
+import unittest
+
+import caterpillar_test
+import digests
+
+
+class TestFileDigest(caterpillar_test.TestCaseWithTempDir):
+  """Tests file_digest."""
+
+  def test_file_digest(self):
+    """Tests that files are hashed in blocks to the digest of their contents."""
+    contents = 'chrome.tts.speak(\'hé\');\n'.encode('utf-8') * 10000
+    path = os.path.join(self.temp_path, 'fïle.js')
+    with open(path, 'wb') as f:
+      f.write(contents)
+    self.assertGreater(len(contents), digests.BLOCK_SIZE)
+    self.assertEqual(digests.file_digest(path),
+                     hashlib.sha256(contents).hexdigest())
+
+
+class TestJsonDigest(unittest.TestCase):
+  """Tests json_digest."""
+
+  def test_key_order(self):
+    """Tests that equal values have equal digests whatever their key order."""
+    self.assertEqual(digests.json_digest({'á': 1, 'b': [2, 'ç']}),
+                     digests.json_digest({'b': [2, 'ç'], 'á': 1}))
+    self.assertNotEqual(digests.json_digest({'á': 1}),
+                        digests.json_digest({'á': 2}))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -57,7 +57,8 @@ class TestEndToEndConvert(caterpillar_test.TestCaseWithTempDir):
     cls.boilerplate_dir = 'caterpillar-📂'
     cls.report_dir = 'report ✓✓✓'
     cls.start_url = 'ttstest.html'
-    config_input = '{}\n{}\n{}\n'.format(
+    # The exclude, include and report assets options are left as the defaults.
+    config_input = '{}\n\n\n\n{}\n{}\n'.format(
         cls.boilerplate_dir, cls.report_dir, cls.start_url).encode(encoding)
 
     # Generate a config file using Caterpillar.
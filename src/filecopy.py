@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Copies files from a Chrome App into a web app.
+
+Files can be copied byte for byte, hard linked, or reflinked (cloned with
+copy-on-write, where the filesystem supports it). Linking avoids copying large
+files that are never edited.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import errno
+import logging
+import os
+import shutil
+
+try:
+  import fcntl
+except ImportError:  # Not available on Windows.
+  fcntl = None
+
+# Copy strategies.
+COPY = 'copy'
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+STRATEGIES = (COPY, HARDLINK, REFLINK)
+
+# Linux ioctl request to clone a file, from linux/fs.h.
+FICLONE = 0x40049409
+
+# Errors which mean a file can't be linked, but can still be copied.
+LINK_ERRNOS = {
+  errno.EPERM,
+  errno.EXDEV,
+  errno.EMLINK,
+  errno.EINVAL,
+  errno.ENOTTY,
+  errno.EOPNOTSUPP,
+  errno.ENOTSUP,
+  errno.ENOSYS,
+}
+
+
+def reflink(source_path, destination_path):
+  """Clones a file with copy-on-write.
+
+  Args:
+    source_path: Path to the file to clone.
+    destination_path: Path to the new file.
+
+  Raises:
+    IOError or OSError if the file could not be cloned.
+  """
+  if fcntl is None:
+    raise OSError(errno.ENOSYS, 'Reflinks are not supported.')
+
+  try:
+    with open(source_path, 'rb') as source_file:
+      with open(destination_path, 'wb') as destination_file:
+        fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+  except (IOError, OSError):
+    if os.path.exists(destination_path):
+      os.remove(destination_path)
+    raise
+  shutil.copystat(source_path, destination_path)
+
+
+def copy_file(source_path, destination_path, strategy=COPY):
+  """Copies a file, keeping its modification time.
+
+  Any existing file at the destination is replaced rather than overwritten, so
+  a file linked to it is never changed. If the file can't be linked, it is
+  copied instead.
+
+  Args:
+    source_path: Path to the file to copy.
+    destination_path: Path to copy the file to.
+    strategy: COPY, HARDLINK or REFLINK. Default is COPY.
+
+  Raises:
+    ValueError if the strategy is invalid.
+  """
+  if strategy not in STRATEGIES:
+    raise ValueError('Invalid copy strategy `{}`.'.format(strategy))
+
+  if os.path.lexists(destination_path):
+    os.remove(destination_path)
+
+  try:
+    if strategy == HARDLINK:
+      # link() doesn't follow symbolic links, and a linked symbolic link could
+      # dangle in its new directory, so the file it points to is linked.
+      os.link(os.path.realpath(source_path), destination_path)
+      return
+    if strategy == REFLINK:
+      reflink(source_path, destination_path)
+      return
+  except (IOError, OSError) as e:
+    if e.errno not in LINK_ERRNOS:
+      raise
+    logging.debug('Could not %s `%s`, copying instead: %s', strategy,
+                  source_path, e.strerror)
+
+  shutil.copy2(source_path, destination_path)
+
+
+def break_link(path):
+  """Makes sure that a file does not share its contents with any other file.
+
+  This must be done before writing to a file which might be hard linked, or the
+  write would change the linked file too.
+
+  Args:
+    path: Path to file. It need not exist.
+  """
+  try:
+    if os.stat(path).st_nlink <= 1:
+      return
+  except OSError as e:
+    if e.errno == errno.ENOENT:
+      return
+    raise
+
+  logging.debug('Breaking hard link `%s`.', path)
+  temp_path = path + '.caterpillar-copy'
+  shutil.copy2(path, temp_path)
+  os.rename(temp_path, path)
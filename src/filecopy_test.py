@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for filecopy."""
+
+from __future__ import print_function, division, unicode_literals
+
+import errno
+import os
+import unittest
+
+import mock
+
+import caterpillar_test
+import filecopy
+
+
+class TestCopyFile(caterpillar_test.TestCaseWithTempDir):
+  """Tests copy_file."""
+
+  def setUp(self):
+    """Makes a source file and stores its path in self.source_path.
+
+    The destination path is stored in self.destination_path.
+    """
+    super(TestCopyFile, self).setUp()
+    self.source_path = os.path.join(self.temp_path, 'sóurce')
+    self.destination_path = os.path.join(self.temp_path, 'déstination')
+    with open(self.source_path, 'w') as source_file:
+      source_file.write(b'cóntents')
+    os.utime(self.source_path, (1000, 1000))
+
+  def assert_copied(self):
+    """Asserts that the destination has the source's contents and mtime."""
+    with open(self.destination_path) as destination_file:
+      self.assertEqual(destination_file.read(), b'cóntents')
+    self.assertEqual(os.stat(self.destination_path).st_mtime, 1000)
+
+  def test_copy(self):
+    """Tests that a copy is a separate file."""
+    filecopy.copy_file(self.source_path, self.destination_path, filecopy.COPY)
+    self.assert_copied()
+    self.assertEqual(os.stat(self.source_path).st_nlink, 1)
+
+  def test_hardlink(self):
+    """Tests that a hard link shares the source file."""
+    filecopy.copy_file(self.source_path, self.destination_path,
+                       filecopy.HARDLINK)
+    self.assert_copied()
+    self.assertTrue(os.path.samefile(self.source_path, self.destination_path))
+
+  def test_hardlink_symlink(self):
+    """Tests that hard linking a symbolic link shares the file it points to."""
+    link_path = os.path.join(self.temp_path, 'línk')
+    os.symlink(os.path.basename(self.source_path), link_path)
+    os.mkdir(os.path.join(self.temp_path, 'óut'))
+    self.destination_path = os.path.join(self.temp_path, 'óut', 'línk')
+    filecopy.copy_file(link_path, self.destination_path, filecopy.HARDLINK)
+    self.assert_copied()
+    self.assertFalse(os.path.islink(self.destination_path))
+    self.assertTrue(os.path.samefile(self.source_path, self.destination_path))
+
+  def test_reflink_falls_back_to_copy(self):
+    """Tests that a file is copied if the filesystem can't reflink."""
+    with mock.patch('filecopy.fcntl') as mock_fcntl:
+      mock_fcntl.ioctl.side_effect = IOError(errno.EOPNOTSUPP, 'Nope')
+      filecopy.copy_file(self.source_path, self.destination_path,
+                         filecopy.REFLINK)
+    self.assert_copied()
+    self.assertFalse(os.path.samefile(self.source_path, self.destination_path))
+
+  def test_linked_destination_replaced(self):
+    """Tests that copying over a linked file doesn't change the linked file."""
+    filecopy.copy_file(self.source_path, self.destination_path,
+                       filecopy.HARDLINK)
+    other_path = os.path.join(self.temp_path, 'óther')
+    with open(other_path, 'w') as other_file:
+      other_file.write(b'óther')
+    filecopy.copy_file(other_path, self.destination_path)
+    with open(self.source_path) as source_file:
+      self.assertEqual(source_file.read(), b'cóntents')
+
+  def test_invalid_strategy(self):
+    """Tests that an invalid copy strategy is rejected."""
+    with self.assertRaises(ValueError):
+      filecopy.copy_file(self.source_path, self.destination_path, 'teleport')
+
+
+class TestBreakLink(caterpillar_test.TestCaseWithTempDir):
+  """Tests break_link."""
+
+  def test_break_link(self):
+    """Tests that writing to a file after breaking its link is safe."""
+    source_path = os.path.join(self.temp_path, 'sóurce')
+    linked_path = os.path.join(self.temp_path, 'línked')
+    with open(source_path, 'w') as source_file:
+      source_file.write(b'cóntents')
+    os.link(source_path, linked_path)
+
+    filecopy.break_link(linked_path)
+    with open(linked_path, 'w') as linked_file:
+      linked_file.write(b'édited')
+    with open(source_path) as source_file:
+      self.assertEqual(source_file.read(), b'cóntents')
+
+  def test_missing_file(self):
+    """Tests that a missing file is ignored."""
+    filecopy.break_link(os.path.join(self.temp_path, 'nó file'))
+
+
+if __name__ == '__main__':
+  unittest.main()
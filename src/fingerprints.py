@@ -0,0 +1,246 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Fingerprints of converted web apps, for incremental re-conversion.
+
+An incremental conversion records a fingerprint of every input file, together
+with the results of analysing the files, in the output web app. When the app is
+converted again, only the input files whose fingerprints changed are copied,
+scanned and edited, and the cached analysis is used for everything else.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import collections
+import json
+import logging
+import os
+
+import chrome_app.apis
+import chrome_app.index
+
+# Name of the fingerprint file, relative to the output web app directory.
+FINGERPRINTS_FILENAME = '.caterpillar-fingerprints.json'
+
+
+class Fingerprints(object):
+  """Fingerprints and cached analysis of the files of a converted web app.
+
+  Attributes:
+    version: Version of Caterpillar that did the conversion.
+    config: Digest of the configuration dictionary.
+    context: Digest of everything other than the file itself that editing an
+      HTML file depends on, or None if unknown.
+    inputs: Dictionary mapping relative paths of input files to dictionaries
+      {'size': size, 'mtime': mtime, 'digest': digest}. JavaScript files also
+      have 'apis': sorted list of Chrome APIs used in the file.
+    usage_apis: Sorted list of the APIs that usage was found for.
+    outputs: Dictionary mapping relative paths of output JavaScript files to
+      dictionaries {'size': size, 'mtime': mtime, 'usage': list of usages}. Each
+      usage is a list [API, member, line number, context, context line number].
+    dependencies: List of installed dependency dictionaries.
+  """
+
+  def __init__(self, version, config):
+    self.version = version
+    self.config = config
+    self.context = None
+    self.inputs = {}
+    self.usage_apis = []
+    self.outputs = {}
+    self.dependencies = []
+
+  @classmethod
+  def load(cls, output_dir):
+    """Loads the fingerprints of a converted web app.
+
+    Args:
+      output_dir: Path to output web app directory.
+
+    Returns:
+      Fingerprints, or None if there are no readable fingerprints.
+    """
+    path = os.path.join(output_dir, FINGERPRINTS_FILENAME)
+    try:
+      with open(path) as fingerprints_file:
+        data = json.load(fingerprints_file)
+    except (IOError, ValueError):
+      return None
+
+    loaded = cls(data.get('version'), data.get('config'))
+    loaded.context = data.get('context')
+    loaded.inputs = data.get('inputs', {})
+    loaded.usage_apis = data.get('usage_apis', [])
+    loaded.outputs = data.get('outputs', {})
+    loaded.dependencies = data.get('dependencies', [])
+    return loaded
+
+  def save(self, output_dir):
+    """Writes these fingerprints into a converted web app.
+
+    Args:
+      output_dir: Path to output web app directory.
+    """
+    path = os.path.join(output_dir, FINGERPRINTS_FILENAME)
+    logging.debug('Writing fingerprints to `%s`.', path)
+    with open(path, 'w') as fingerprints_file:
+      json.dump({
+        'version': self.version,
+        'config': self.config,
+        'context': self.context,
+        'inputs': self.inputs,
+        'usage_apis': self.usage_apis,
+        'outputs': self.outputs,
+        'dependencies': self.dependencies,
+      }, fingerprints_file, sort_keys=True)
+
+  @staticmethod
+  def remove(output_dir):
+    """Removes the fingerprints of a converted web app, if there are any.
+
+    This must be done before a web app is changed, so that a conversion which
+    fails part way is never mistaken for a complete one.
+
+    Args:
+      output_dir: Path to output web app directory.
+    """
+    path = os.path.join(output_dir, FINGERPRINTS_FILENAME)
+    if os.path.exists(path):
+      os.remove(path)
+
+  def record_inputs(self, index, previous=None):
+    """Fingerprints all files of an input Chrome App.
+
+    Args:
+      index: AppIndex of the input Chrome App, or of an unedited copy of it.
+      previous: Fingerprints of the previous conversion. Optional. Files that
+        have the same size and modification time as before are not read again.
+
+    Returns:
+      Set of relative paths of files that changed since the previous
+      conversion, or of all files if there was no previous conversion.
+    """
+    changed = set()
+    for entry in index.files():
+      old = previous.inputs.get(entry.relpath) if previous else None
+      if old and old['size'] == entry.size and old['mtime'] == entry.mtime:
+        digest = old['digest']
+      else:
+        digest = entry.digest()
+      if not old or old['digest'] != digest:
+        changed.add(entry.relpath)
+
+      self.inputs[entry.relpath] = {'size': entry.size, 'mtime': entry.mtime,
+                                    'digest': digest}
+      if old and 'apis' in old and entry.relpath not in changed:
+        self.inputs[entry.relpath]['apis'] = old['apis']
+
+    return changed
+
+
+def removed_inputs(current, previous):
+  """Gets the input files that were removed since the previous conversion.
+
+  Args:
+    current: Fingerprints of the current conversion.
+    previous: Fingerprints of the previous conversion.
+
+  Returns:
+    Sorted list of relative paths.
+  """
+  return sorted(set(previous.inputs) - set(current.inputs))
+
+
+def app_apis(index, current):
+  """Gets all Chrome APIs used by a Chrome App, scanning only changed files.
+
+  Args:
+    index: AppIndex of the output web app, before it is edited.
+    current: Fingerprints of the current conversion, with inputs recorded.
+      Files with cached APIs are not scanned, and the APIs of scanned files are
+      cached.
+
+  Returns:
+    Sorted list of Chrome API names.
+  """
+  apis = set()
+  for entry in index.files(chrome_app.index.KIND_JS):
+    fingerprint = current.inputs[entry.relpath]
+    if 'apis' not in fingerprint:
+      fingerprint['apis'] = sorted(chrome_app.apis.file_apis(entry.path,
+                                                             entry.digest))
+    apis.update(fingerprint['apis'])
+  return sorted(apis)
+
+
+def compact_usage(file_usage):
+  """Converts the usage found in a file to the form cached in fingerprints.
+
+  Args:
+    file_usage: Result of chrome_app.apis.file_usage.
+
+  Returns:
+    List of [API, member, line number, context, context line number] lists.
+  """
+  return [[api, member, line_num, context, context_linenum]
+          for api, member, (_, line_num, context, context_linenum)
+          in file_usage]
+
+
+def usage(apis, index, ignore_dirs, current, previous=None, file_usages=None):
+  """Gets the usage of Chrome APIs in a web app, scanning only changed files.
+
+  Args:
+    apis: List of API names.
+    index: AppIndex of the output web app, after it is edited.
+    ignore_dirs: Absolute directory paths to ignore.
+    current: Fingerprints of the current conversion. The usage found in
+      each file is cached here.
+    previous: Fingerprints of the previous conversion. Optional. Usage is reused
+      for files that are unchanged since then, as long as the same APIs are
+      being searched for.
+    file_usages: Dictionary mapping relative paths of files to the results of
+      chrome_app.apis.file_usage for them, for files whose usage is already
+      known. Optional.
+
+  Returns:
+    Usage dictionary; see chrome_app.apis.usage.
+  """
+  apis = sorted(apis)
+  reuse = previous is not None and previous.usage_apis == apis
+  usage_data = {api: collections.defaultdict(list) for api in apis}
+  current.usage_apis = apis
+  current.outputs = {}
+
+  for entry in index.files(chrome_app.index.KIND_JS, ignore_dirs):
+    old = previous.outputs.get(entry.relpath) if reuse else None
+    if file_usages and entry.relpath in file_usages:
+      file_usage = compact_usage(file_usages[entry.relpath])
+    elif old and old['size'] == entry.size and old['mtime'] == entry.mtime:
+      file_usage = old['usage']
+    else:
+      file_usage = compact_usage(
+          chrome_app.apis.file_usage(apis, entry.path, entry.relpath,
+                                     digest=entry.digest))
+
+    current.outputs[entry.relpath] = {
+      'size': entry.size, 'mtime': entry.mtime, 'usage': file_usage}
+    for api, member, line_num, context, context_linenum in file_usage:
+      usage_data[api][member].append(
+          (entry.relpath, line_num, context, context_linenum))
+
+  return usage_data
@@ -0,0 +1,102 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for fingerprints."""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import shutil
+import unittest
+
+import mock
+
+import caterpillar_test
+import chrome_app.index
+import fingerprints
+
+
+class TestFingerprints(caterpillar_test.TestCaseWithTempDir):
+  """Tests Fingerprints."""
+
+  def setUp(self):
+    """Makes a copy of the minimal app and fingerprints it.
+
+    The copy is stored in self.app_path, and the fingerprints in self.previous.
+    """
+    super(TestFingerprints, self).setUp()
+    self.app_path = os.path.join(self.temp_path, 'äpp')
+    shutil.copytree(caterpillar_test.MINIMAL_PATH, self.app_path)
+    self.previous = fingerprints.Fingerprints('1', 'cónfig')
+    self.previous.record_inputs(chrome_app.index.AppIndex.build(self.app_path))
+
+  def test_save_and_load(self):
+    """Tests that fingerprints can be saved and loaded again."""
+    self.previous.save(self.temp_path)
+    loaded = fingerprints.Fingerprints.load(self.temp_path)
+    self.assertEqual(loaded.version, '1')
+    self.assertEqual(loaded.config, 'cónfig')
+    self.assertEqual(loaded.inputs, self.previous.inputs)
+    fingerprints.Fingerprints.remove(self.temp_path)
+    self.assertIsNone(fingerprints.Fingerprints.load(self.temp_path))
+
+  def test_changed_inputs(self):
+    """Tests that only changed, added and removed inputs are detected."""
+    with open(os.path.join(self.app_path, 'my scrípt.js'), 'a') as js_file:
+      js_file.write(b'// Chánged.\n')
+    with open(os.path.join(self.app_path, 'néw.js'), 'w') as js_file:
+      js_file.write(b'// Néw.\n')
+    os.remove(os.path.join(self.app_path, 'mý other script.js'))
+
+    current = fingerprints.Fingerprints('1', 'cónfig')
+    changed = current.record_inputs(
+        chrome_app.index.AppIndex.build(self.app_path), self.previous)
+    self.assertEqual(changed, {'my scrípt.js', 'néw.js'})
+    self.assertEqual(fingerprints.removed_inputs(current, self.previous),
+                     ['mý other script.js'])
+
+  def test_touched_input_unchanged(self):
+    """Tests that an input with a new mtime but the same content is unchanged.
+    """
+    path = os.path.join(self.app_path, 'my scrípt.js')
+    os.utime(path, (0, 0))
+    current = fingerprints.Fingerprints('1', 'cónfig')
+    changed = current.record_inputs(
+        chrome_app.index.AppIndex.build(self.app_path), self.previous)
+    self.assertEqual(changed, set())
+
+
+class TestUsage(caterpillar_test.TestCaseWithTempDir):
+  """Tests usage."""
+
+  def test_unchanged_files_not_scanned(self):
+    """Tests that usage of unchanged files is reused."""
+    index = chrome_app.index.AppIndex.build(caterpillar_test.MINIMAL_PATH)
+    apis = ['app.runtime', 'app.window']
+    previous = fingerprints.Fingerprints('1', 'cónfig')
+    expected = fingerprints.usage(apis, index, set(), previous)
+
+    current = fingerprints.Fingerprints('1', 'cónfig')
+    with mock.patch('chrome_app.apis.file_usage') as mock_file_usage:
+      usage = fingerprints.usage(apis, index, set(), current, previous)
+    self.assertFalse(mock_file_usage.called)
+    self.assertEqual(usage, expected)
+    self.assertEqual(current.outputs, previous.outputs)
+
+
+if __name__ == '__main__':
+  unittest.main()
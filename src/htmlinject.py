@@ -0,0 +1,345 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Injects tags into HTML documents without parsing them into a tree.
+
+The document is tokenized once to find the first script tag, the html, head and
+body tags and the existing meta tags. Injected tags are then spliced into the
+document's bytes at those offsets, and the rest of the document is left exactly
+as it was.
+
+Documents whose structure can't be found this way, e.g. because a tag is
+unterminated or there are two bodies, raise MalformedHtmlError. These should be
+edited with BeautifulSoup instead, which can repair them.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import cgi
+import re
+
+import surrogateescape
+
+# Regular expression matching the markup token starting at a '<': a comment, a
+# declaration such as a doctype, a processing instruction, an end tag or a start
+# tag.
+TOKEN_REGEX = re.compile(br"""
+    <!--.*?-->
+  | (?P<declaration><![^>]*>)
+  | <\?[^>]*>
+  | </(?P<end>[a-zA-Z][^\s/>]*)[^>]*>
+  | <(?P<start>[a-zA-Z][^\s/>]*)(?P<attributes>(?:[^>"']|"[^"]*"|'[^']*')*)>
+""", re.VERBOSE | re.DOTALL)
+
+# Regular expression matching the start of something that TOKEN_REGEX should
+# have matched. If TOKEN_REGEX doesn't match, the markup is unterminated.
+MARKUP_START_REGEX = re.compile(br'</?[a-zA-Z!?]')
+
+# Regular expression matching an attribute in a start tag.
+ATTRIBUTE_REGEX = re.compile(br"""
+  ([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?
+""", re.VERBOSE)
+
+# Regular expressions matching the end tags of elements whose contents are text
+# rather than markup, as Python's HTML parser treats them.
+RAW_TEXT_END_REGEXES = {
+  b'script': re.compile(br'</script\s*>', re.IGNORECASE),
+  b'style': re.compile(br'</style\s*>', re.IGNORECASE),
+}
+
+# Elements which give a document its structure. Each may appear at most once.
+STRUCTURE_ELEMENTS = (b'html', b'head', b'body')
+
+# Orders of markup inserted at the same offset: a new head comes first, then
+# tags inserted at the start of a head, then everything else.
+_NEW_HEAD = 0
+_HEAD_START = 1
+_OTHER = 2
+
+
+class MalformedHtmlError(Exception):
+  """Exception raised when an HTML document's structure can't be found."""
+
+  pass
+
+
+def start_tag(name, attributes):
+  """Makes an HTML start tag.
+
+  Args:
+    name: Tag name.
+    attributes: List of (name, value) tuples. Values are escaped. Values that
+      aren't strings, e.g. a manifest's author object, are converted to
+      strings first, as BeautifulSoup would.
+
+  Returns:
+    HTML string.
+  """
+  return '<{}{}>'.format(name, ''.join(
+      ' {}="{}"'.format(attribute, cgi.escape(
+          value if isinstance(value, basestring) else unicode(value),
+          quote=True))
+      for attribute, value in attributes))
+
+
+def script_tag(src):
+  """Makes an HTML script element that loads a script.
+
+  Args:
+    src: URL of the script.
+
+  Returns:
+    HTML string.
+  """
+  return start_tag('script', [('src', src)]) + '</script>'
+
+
+class Injector(object):
+  """Splices tags into an HTML document.
+
+  Attributes:
+    html: Original HTML document bytes.
+    first_script: Offset of the first script start tag, or None.
+    meta_names: Set of the name attributes of the document's meta tags.
+    has_meta_charset: Whether the document has a meta tag with a charset.
+  """
+
+  def __init__(self, html):
+    """Finds where tags can be injected into a document.
+
+    Args:
+      html: HTML document bytes.
+
+    Raises:
+      MalformedHtmlError if the document's structure can't be found.
+    """
+    self.html = html
+    self.first_script = None
+    self.meta_names = set()
+    self.has_meta_charset = False
+    # Offsets of the starts and ends of the structure elements' start tags,
+    # and of the starts of their end tags.
+    self._tags = {}
+    self._starts = {}
+    self._ends = {}
+    self._declaration_end = 0
+    # List of (offset, order, sequence number, bytes) tuples to insert.
+    self._insertions = []
+    # Tags to put in a new head, if the document has none: (tags at the start,
+    # tags at the end).
+    self._new_head = None
+    self._newline = b'\r\n' if b'\r\n' in html else b'\n'
+    self._scan()
+
+  def _scan(self):
+    """Tokenizes the document, recording where tags can be injected."""
+    position = 0
+    while True:
+      position = self.html.find(b'<', position)
+      if position < 0:
+        break
+      match = TOKEN_REGEX.match(self.html, position)
+      if not match:
+        if MARKUP_START_REGEX.match(self.html, position):
+          raise MalformedHtmlError('Unterminated markup at byte {}.'.format(
+              position))
+        # A '<' that doesn't start any markup is just text.
+        position += 1
+        continue
+
+      end = match.end()
+      token = match.group(0)
+      if token.startswith(b'<!--') and not token.endswith(b'-->'):
+        raise MalformedHtmlError('Unterminated comment at byte {}.'.format(
+            position))
+      if match.group('declaration') and not self._declaration_end:
+        self._declaration_end = end
+      elif match.group('start'):
+        name = match.group('start').lower()
+        attributes = match.group('attributes')
+        self._start_tag(name, attributes, position, end)
+        if name in RAW_TEXT_END_REGEXES and not attributes.endswith(b'/'):
+          raw_text_end = RAW_TEXT_END_REGEXES[name].search(self.html, end)
+          if not raw_text_end:
+            raise MalformedHtmlError('Unclosed <{}> at byte {}.'.format(
+                name, position))
+          end = raw_text_end.end()
+      elif match.group('end'):
+        self._end_tag(match.group('end').lower(), position)
+      position = end
+
+    # End tags may be left out. The head then ends where the body starts, and
+    # the body and html elements end with the document.
+    if b'head' in self._starts and b'head' not in self._ends:
+      if b'body' not in self._tags:
+        raise MalformedHtmlError('Unclosed <head> without <body>.')
+      self._ends[b'head'] = self._tags[b'body']
+    if b'html' in self._starts and b'html' not in self._ends:
+      self._ends[b'html'] = len(self.html)
+    if b'body' in self._starts and b'body' not in self._ends:
+      self._ends[b'body'] = self._ends.get(b'html', len(self.html))
+    if b'html' in self._starts:
+      for name in (b'head', b'body'):
+        if name in self._starts and not (
+            self._starts[b'html'] <= self._starts[name] and
+            self._ends[name] <= self._ends[b'html']):
+          raise MalformedHtmlError('<{}> is outside <html>.'.format(name))
+    if (b'head' in self._starts and b'body' in self._starts and
+        self._ends[b'head'] > self._starts[b'body']):
+      raise MalformedHtmlError('<head> is not closed before <body>.')
+
+  def _start_tag(self, name, attributes, position, end):
+    """Records a start tag.
+
+    Args:
+      name: Lowercase tag name.
+      attributes: Attributes part of the tag.
+      position: Offset of the start of the tag.
+      end: Offset of the end of the tag.
+
+    Raises:
+      MalformedHtmlError if the document already had a structure element of the
+      same name.
+    """
+    if name == b'script' and self.first_script is None:
+      self.first_script = position
+    elif name in STRUCTURE_ELEMENTS:
+      if name in self._starts:
+        raise MalformedHtmlError('More than one <{}>.'.format(name))
+      self._tags[name] = position
+      self._starts[name] = end
+    elif name == b'meta':
+      for match in ATTRIBUTE_REGEX.finditer(attributes):
+        attribute = match.group(1).lower()
+        if attribute == b'name':
+          value = next((value for value in match.group(2, 3, 4)
+                        if value is not None), b'')
+          self.meta_names.add(surrogateescape.decode(value))
+        elif attribute == b'charset':
+          self.has_meta_charset = True
+
+  def _end_tag(self, name, position):
+    """Records an end tag.
+
+    Args:
+      name: Lowercase tag name.
+      position: Offset of the start of the tag.
+
+    Raises:
+      MalformedHtmlError if the tag ends a structure element that isn't open.
+    """
+    if name in STRUCTURE_ELEMENTS:
+      if name not in self._starts or name in self._ends:
+        raise MalformedHtmlError('Unexpected </{}>.'.format(name))
+      self._ends[name] = position
+
+  def _insert(self, offset, tags, order=_OTHER):
+    """Inserts tags at an offset of the original document.
+
+    If the offset is indented, each tag is put on its own line at the same
+    indentation, so the markup after the offset stays where it was.
+
+    Args:
+      offset: Offset in the original document.
+      tags: List of HTML strings.
+      order: Where these tags go relative to others at the same offset.
+    """
+    line_start = self.html.rfind(b'\n', 0, offset) + 1
+    indentation = self.html[line_start:offset]
+    if indentation.strip():
+      separator = b''
+    else:
+      separator = self._newline + indentation
+    markup = b''.join(surrogateescape.encode(tag) + separator for tag in tags)
+    self._insertions.append((offset, order, len(self._insertions), markup))
+
+  def _head(self):
+    """Gets the new head, creating it if the document has no head.
+
+    Returns:
+      (tags at the start, tags at the end) tuple of lists for the new head, or
+      None if the document has a head.
+    """
+    if b'head' in self._starts:
+      return None
+    if self._new_head is None:
+      self._new_head = ([], [])
+    return self._new_head
+
+  def insert_scripts(self, srcs):
+    """Inserts script tags into the document in order.
+
+    The scripts go before the first script in the document, or if there are
+    none, at the end of the body, the html element, or the document.
+
+    Args:
+      srcs: List of script URLs.
+    """
+    if self.first_script is not None:
+      offset = self.first_script
+    else:
+      offset = next((self._ends[name] for name in (b'body', b'html')
+                     if name in self._ends), len(self.html))
+    self._insert(offset, [script_tag(src) for src in srcs])
+
+  def prepend_to_head(self, tags):
+    """Inserts tags at the start of the head, creating it if needed.
+
+    Args:
+      tags: List of HTML strings.
+    """
+    new_head = self._head()
+    if new_head:
+      new_head[0].extend(tags)
+    else:
+      self._insert(self._starts[b'head'], tags, _HEAD_START)
+
+  def append_to_head(self, tags):
+    """Inserts tags at the end of the head, creating it if needed.
+
+    Args:
+      tags: List of HTML strings.
+    """
+    new_head = self._head()
+    if new_head:
+      new_head[1].extend(tags)
+    else:
+      self._insert(self._ends[b'head'], tags)
+
+  def render(self):
+    """Gets the document with the tags inserted.
+
+    Returns:
+      HTML document bytes.
+    """
+    insertions = list(self._insertions)
+    if self._new_head:
+      # A new head goes at the start of the html element, or after the doctype.
+      offset = self._starts.get(b'html', self._declaration_end)
+      head = surrogateescape.encode(
+          '<head>{}</head>'.format(''.join(self._new_head[0] +
+                                           self._new_head[1])))
+      insertions.append((offset, _NEW_HEAD, 0, head))
+
+    parts = []
+    position = 0
+    for offset, _, _, markup in sorted(insertions):
+      parts.append(self.html[position:offset])
+      parts.append(markup)
+      position = offset
+    parts.append(self.html[position:])
+    return b''.join(parts)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for htmlinject."""
+
+from __future__ import print_function, division, unicode_literals
+
+import unittest
+
+import htmlinject
+
+
+def inject(html, srcs=(), head_start=(), head_end=()):
+  """Injects tags into a UTF-8 document, returning the edited document."""
+  injector = htmlinject.Injector(html.encode('utf-8'))
+  if srcs:
+    injector.insert_scripts(list(srcs))
+  if head_end:
+    injector.append_to_head(list(head_end))
+  if head_start:
+    injector.prepend_to_head(list(head_start))
+  return injector.render().decode('utf-8')
+
+
+class TestInjector(unittest.TestCase):
+  """Tests Injector."""
+
+  def test_unchanged(self):
+    """Tests that a document with nothing injected is unchanged."""
+    html = '<!DOCTYPE html>\n<html><body>\n<p>Héllo <b>wórld</p></body></html>'
+    self.assertEqual(inject(html), html)
+
+  def test_scripts_before_first_script(self):
+    """Tests that scripts go before the first script, on their own lines."""
+    self.assertEqual(inject("""\
+<body>
+  <!-- <script src="commented.js"></script> -->
+  <script>var s = '<script>';</script>
+  <script src="lást.js"></script>
+</body>""", ['á.js', 'b.js']), """\
+<body>
+  <!-- <script src="commented.js"></script> -->
+  <script src="á.js"></script>
+  <script src="b.js"></script>
+  <script>var s = '<script>';</script>
+  <script src="lást.js"></script>
+</body>""")
+
+  def test_scripts_at_end(self):
+    """Tests that scripts go at the end of the body, html, or document."""
+    self.assertEqual(inject('<html><body><p>í</p></body></html>', ['a.js']),
+                     '<html><body><p>í</p><script src="a.js"></script>'
+                     '</body></html>')
+    self.assertEqual(inject('<html><p>í</p></html>', ['a.js']),
+                     '<html><p>í</p><script src="a.js"></script></html>')
+    self.assertEqual(inject('<p>í</p>\n', ['a.js']),
+                     '<p>í</p>\n<script src="a.js"></script>\n')
+
+  def test_head(self):
+    """Tests that tags go at the start and end of an existing head."""
+    self.assertEqual(
+        inject('<html><head><script src="á.js"></script></head></html>',
+               ['b.js'], ['<meta charset="utf-8">'], ['<link rel="x">']),
+        '<html><head><meta charset="utf-8"><script src="b.js"></script>'
+        '<script src="á.js"></script><link rel="x"></head></html>')
+
+  def test_new_head(self):
+    """Tests that a head is made after the html tag or the doctype."""
+    self.assertEqual(
+        inject('<!DOCTYPE html><html lang="é"><body></body></html>',
+               head_start=['<meta>'], head_end=['<link>']),
+        '<!DOCTYPE html><html lang="é"><head><meta><link></head><body></body>'
+        '</html>')
+    self.assertEqual(inject('<!DOCTYPE html><p>í</p>', head_end=['<link>']),
+                     '<!DOCTYPE html><head><link></head><p>í</p>')
+
+  def test_meta_tags(self):
+    """Tests that existing meta tags are found."""
+    injector = htmlinject.Injector("""\
+<head>
+  <META Name=author content="á">
+  <meta content='b' name='description'/>
+  <meta charset="utf-8">
+</head>""".encode('utf-8'))
+    self.assertEqual(injector.meta_names, {'author', 'description'})
+    self.assertTrue(injector.has_meta_charset)
+    self.assertFalse(htmlinject.Injector(b'<meta name="x">').has_meta_charset)
+
+  def test_crlf(self):
+    """Tests that injected lines end like the document's lines."""
+    self.assertEqual(inject('<body>\r\n  <script></script>\r\n</body>',
+                            ['a.js']),
+                     '<body>\r\n  <script src="a.js"></script>\r\n'
+                     '  <script></script>\r\n</body>')
+
+  def test_malformed(self):
+    """Tests that documents with unclear structure raise errors."""
+    for html in ['<html><head><title>í</title></html>',
+                 '<body></body><body></body>',
+                 '</head>',
+                 '<head></head><html></html>',
+                 '<body><p class="í</body>',
+                 '<body><!-- í </body>',
+                 '<body><script>í</body>']:
+      self.assertRaises(htmlinject.MalformedHtmlError, htmlinject.Injector,
+                        html.encode('utf-8'))
+
+  def test_end_tags_left_out(self):
+    """Tests that elements without end tags end where HTML says they do."""
+    self.assertEqual(inject('<html><head><title>í</title>\n<body><p>í',
+                            ['a.js'], head_end=['<link>']),
+                     '<html><head><title>í</title>\n<link>\n<body><p>í'
+                     '<script src="a.js"></script>')
+
+  def test_less_than_in_text(self):
+    """Tests that a '<' that doesn't start markup is text."""
+    self.assertEqual(inject('<body>1 < 2</body>', ['a.js']),
+                     '<body>1 < 2<script src="a.js"></script></body>')
+
+
+class TestStartTag(unittest.TestCase):
+  """Tests start_tag."""
+
+  def test_escaped(self):
+    """Tests that attribute values are escaped."""
+    self.assertEqual(htmlinject.start_tag('meta', [('content', '"á" & <b>'),
+                                                   ('name', 'x')]),
+                     '<meta content="&quot;á&quot; &amp; &lt;b&gt;" name="x">')
+
+  def test_not_string(self):
+    """Tests that attribute values that aren't strings are converted."""
+    self.assertEqual(htmlinject.start_tag('meta', [('content', 1)]),
+                     '<meta content="1">')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Times the modules imported by a process.
+
+Python 2 has no equivalent of Python 3's -X importtime, so this replaces the
+import function with one that times every import that loads a new module. The
+breakdown is printed in the same format as -X importtime.
+
+This module must not import anything that it might be used to time.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import __builtin__
+import sys
+import time
+
+# The profiler timing imports, if any; see start().
+_profiler = None
+
+
+def _package(globals):
+  """Gets the name of the package a module is in from its globals, or ''."""
+  if not globals:
+    return ''
+  package = globals.get('__package__')
+  if package is not None:
+    return package
+  name = globals.get('__name__') or ''
+  if '__path__' in globals:
+    return name
+  return name.rpartition('.')[0]
+
+
+def _candidate_names(name, globals, level):
+  """Gets the names that an import statement's module may resolve to.
+
+  Python 2 tries an import relative to the importing module's package before
+  the absolute one, so there can be two.
+
+  Args:
+    name, globals, level: Arguments to __import__.
+
+  Returns:
+    List of full module names, in the order they are tried.
+  """
+  if level == 0:
+    return [name]
+  package = _package(globals)
+  if level > 0:
+    base = package.rsplit('.', level - 1)[0] if level > 1 else package
+    return ['{}.{}'.format(base, name) if name else base]
+  if package:
+    return ['{}.{}'.format(package, name), name]
+  return [name]
+
+
+def _imported_names(module_name, fromlist):
+  """Gets the names of a module and the submodules imported from it."""
+  return [module_name] + ['{}.{}'.format(module_name, item)
+                          for item in fromlist or () if item != '*']
+
+
+def _loaded(name):
+  """Returns whether a module is loaded.
+
+  Failed relative imports leave None in sys.modules, which isn't a module.
+  """
+  return sys.modules.get(name) is not None
+
+
+class ImportProfiler(object):
+  """Times imports that load new modules.
+
+  Attributes:
+    imports: List of (depth, name, self time, cumulative time) tuples, in the
+      order the imports started. Times are in seconds.
+  """
+
+  def __init__(self):
+    self.imports = []
+    self._children_times = []
+    self._original_import = None
+
+  def start(self):
+    """Starts timing imports."""
+    self._original_import = __builtin__.__import__
+    __builtin__.__import__ = self._import
+
+  def stop(self):
+    """Stops timing imports."""
+    if self._original_import is not None:
+      __builtin__.__import__ = self._original_import
+      self._original_import = None
+
+  def _import(self, name, globals=None, locals=None, fromlist=None,
+              level=-1):
+    """Imports a module like __import__, timing it if it is new.
+
+    An import is new if the module it resolves to, or a submodule it imports
+    with from, wasn't loaded before.
+    """
+    candidates = _candidate_names(name, globals, level)
+    loaded_before = {module_name for candidate in candidates
+                     for module_name in _imported_names(candidate, fromlist)
+                     if _loaded(module_name)}
+    position = len(self.imports)
+    self._children_times.append(0)
+    start = time.time()
+    try:
+      return self._original_import(name, globals, locals, fromlist, level)
+    finally:
+      cumulative = time.time() - start
+      children = self._children_times.pop()
+      resolved = next((candidate for candidate in candidates
+                       if _loaded(candidate)), None)
+      new_names = [module_name
+                   for module_name in _imported_names(resolved, fromlist)
+                   if _loaded(module_name) and module_name not in loaded_before
+                  ] if resolved is not None else []
+      if new_names:
+        # An import of new submodules from a loaded package is labelled with
+        # the submodules.
+        label = resolved if new_names[0] == resolved else ', '.join(new_names)
+        self.imports.insert(position, (len(self._children_times), label,
+                                       cumulative - children, cumulative))
+        if self._children_times:
+          self._children_times[-1] += cumulative
+
+  def print_breakdown(self, stream):
+    """Prints how long each import took.
+
+    Args:
+      stream: File to print to.
+    """
+    print('import time: self [us] | cumulative | imported package',
+          file=stream)
+    total = 0
+    for depth, name, self_time, cumulative in self.imports:
+      print('import time: {:>9} | {:>10} | {}{}'.format(
+          int(self_time * 1e6), int(cumulative * 1e6), '  ' * depth, name),
+          file=stream)
+      if depth == 0:
+        total += cumulative
+    print('import time: {:.1f} ms in {} imports'.format(
+        total * 1e3, len(self.imports)), file=stream)
+
+
+def start_if_flagged(flag):
+  """Starts timing imports if a flag is in the command line arguments.
+
+  This must be called before the imports to be timed, so it can't wait for the
+  arguments to be parsed.
+
+  Args:
+    flag: Command line flag, e.g. '--startup-profile'.
+  """
+  global _profiler
+  if flag in sys.argv[1:] and _profiler is None:
+    _profiler = ImportProfiler()
+    _profiler.start()
+
+
+def stop_and_print(stream):
+  """Stops timing imports and prints how long they took, if they were timed.
+
+  Args:
+    stream: File to print to.
+  """
+  global _profiler
+  if _profiler is not None:
+    _profiler.stop()
+    _profiler.print_breakdown(stream)
+    _profiler = None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for importprofile."""
+
+from __future__ import print_function, division, unicode_literals
+
+import __builtin__
+import StringIO
+import sys
+import unittest
+
+import importprofile
+
+
+class TestImportProfiler(unittest.TestCase):
+  """Tests ImportProfiler."""
+
+  def setUp(self):
+    """Makes sure that colorsys will be imported from scratch."""
+    sys.modules.pop('colorsys', None)
+    self.original_import = __builtin__.__import__
+
+  def tearDown(self):
+    __builtin__.__import__ = self.original_import
+
+  def test_new_imports_timed(self):
+    """Tests that only imports of new modules are timed."""
+    profiler = importprofile.ImportProfiler()
+    profiler.start()
+    try:
+      import colorsys
+      import os
+    finally:
+      profiler.stop()
+    self.assertIs(__builtin__.__import__, self.original_import)
+    self.assertEqual([name for _, name, _, _ in profiler.imports], ['colorsys'])
+    depth, _, self_time, cumulative = profiler.imports[0]
+    self.assertEqual(depth, 0)
+    self.assertLessEqual(self_time, cumulative)
+
+  def test_relative_placeholders_ignored(self):
+    """Tests that loaded modules found by absolute import are not new.
+
+    Python 2 tries package-relative imports first, leaving None placeholders
+    for them in sys.modules.
+    """
+    profiler = importprofile.ImportProfiler()
+    profiler.start()
+    try:
+      package_globals = {'__name__': 'importprofile_test_package.módule'}
+      __import__(str('os'), package_globals, None, None, -1)
+      __import__(str('colorsys'), package_globals, None, None, -1)
+    finally:
+      profiler.stop()
+      sys.modules.pop('importprofile_test_package.os', None)
+      sys.modules.pop('importprofile_test_package.colorsys', None)
+    self.assertEqual([name for _, name, _, _ in profiler.imports], ['colorsys'])
+
+  def test_submodules_from_loaded_package(self):
+    """Tests that importing a new submodule from a loaded package is timed."""
+    import json.decoder
+    sys.modules.pop('json.tool', None)
+    profiler = importprofile.ImportProfiler()
+    profiler.start()
+    try:
+      from json import tool
+      from json import decoder
+    finally:
+      profiler.stop()
+    self.assertEqual([name for _, name, _, _ in profiler.imports],
+                     ['json.tool'])
+
+  def test_print_breakdown(self):
+    """Tests that the breakdown lists each import."""
+    profiler = importprofile.ImportProfiler()
+    profiler.imports = [(0, 'párent', 0.001, 0.003),
+                        (1, 'chíld', 0.002, 0.002)]
+    stream = StringIO.StringIO()
+    profiler.print_breakdown(stream)
+    self.assertEqual(stream.getvalue().split('\n'), [
+        'import time: self [us] | cumulative | imported package',
+        'import time:      1000 |       3000 | párent',
+        'import time:      2000 |       2000 |   chíld',
+        'import time: 3.0 ms in 2 imports',
+        ''])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local store of packages installed by npm and bower.
+
+Dependencies found in the store are installed from it instead of by their
+dependency manager, so conversions don't need the network.
+
+The store is a directory. File contents are stored once each, named by their
+SHA-256 digest, in objects/. Each package version has a record in
+packages/<manager>/<name>/<version>.json listing the digest and mode of each of
+its files, with an integrity digest of that list, and
+packages/<manager>/<name>/current names the version that is installed when no
+version is asked for.
+
+Only the package's own directory is stored, not other packages that the
+dependency manager installed alongside it.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import tempfile
+
+import digests
+
+# Environment variable naming the store directory.
+STORE_ENVIRONMENT_VARIABLE = 'CATERPILLAR_PACKAGE_STORE'
+
+# Store directory used if the environment variable isn't set.
+DEFAULT_STORE_DIR = os.path.join('~', '.caterpillar', 'packages')
+
+# Number of bytes to read from a file at a time.
+BLOCK_SIZE = 1 << 16
+
+# Files that dependency managers write package versions into, by manager.
+VERSION_FILENAMES = {
+  'bower': ['.bower.json', 'bower.json', 'package.json'],
+  'npm': ['package.json'],
+}
+
+# Version recorded for packages that don't say what version they are.
+UNKNOWN_VERSION = 'unknown'
+
+# Versions are used in filenames, so only versions matching this are stored.
+# Others, e.g. with path separators, are recorded as UNKNOWN_VERSION.
+VERSION_REGEX = re.compile(r'^\w[\w.+~-]*$', re.UNICODE)
+
+
+class IntegrityError(Exception):
+  """Exception raised when a stored package doesn't match its record."""
+
+  pass
+
+
+def valid_version(version):
+  """Returns whether a package version can be used in a filename."""
+  return (isinstance(version, basestring) and
+          VERSION_REGEX.match(version) is not None)
+
+
+def package_version(manager, package_dir):
+  """Gets the version of an installed package.
+
+  Args:
+    manager: 'bower' or 'npm'.
+    package_dir: Directory the package is installed in.
+
+  Returns:
+    Version string, or UNKNOWN_VERSION if the package has no valid version.
+  """
+  for filename in VERSION_FILENAMES.get(manager, []):
+    try:
+      with open(os.path.join(package_dir, filename)) as version_file:
+        version = json.load(version_file).get('version')
+    except (IOError, ValueError, AttributeError):
+      continue
+    if valid_version(version):
+      return version
+    if version:
+      logging.debug('Ignoring invalid version in `%s`.',
+                    os.path.join(package_dir, filename))
+  return UNKNOWN_VERSION
+
+
+def copy_and_digest(source_path, destination_path):
+  """Copies a file, finding the digest of its contents.
+
+  Args:
+    source_path: Path to the file to copy.
+    destination_path: Path to copy the file to.
+
+  Returns:
+    Hex SHA-256 digest of the file.
+  """
+  sha = hashlib.sha256()
+  with open(source_path, 'rb') as source_file:
+    with open(destination_path, 'wb') as destination_file:
+      while True:
+        block = source_file.read(BLOCK_SIZE)
+        if not block:
+          break
+        sha.update(block)
+        destination_file.write(block)
+  return sha.hexdigest()
+
+
+class PackageStore(object):
+  """Local store of packages.
+
+  Attributes:
+    root: Path to the store directory. It need not exist.
+  """
+
+  def __init__(self, root):
+    self.root = root
+
+  @classmethod
+  def default(cls):
+    """Gets the package store named by the environment, or the default one.
+
+    Returns:
+      PackageStore.
+    """
+    root = os.environ.get(STORE_ENVIRONMENT_VARIABLE, DEFAULT_STORE_DIR)
+    return cls(os.path.expanduser(root))
+
+  def exists(self):
+    """Returns whether the store directory exists."""
+    return os.path.isdir(self.root)
+
+  def _object_path(self, digest):
+    """Gets the path to the stored contents of a file with a given digest."""
+    return os.path.join(self.root, 'objects', digest[:2], digest)
+
+  def _package_dir(self, manager, name):
+    """Gets the path to the directory of records of a package's versions."""
+    return os.path.join(self.root, 'packages', manager, name)
+
+  def _write_atomically(self, path, contents):
+    """Writes a file so that readers never see it partly written."""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.caterpillar-',
+                                     delete=False) as temp_file:
+      temp_file.write(contents)
+    os.rename(temp_file.name, path)
+
+  def _add_file(self, path):
+    """Adds the contents of a file to the store.
+
+    Args:
+      path: Path to the file.
+
+    Returns:
+      Hex SHA-256 digest of the file.
+    """
+    objects_dir = os.path.join(self.root, 'objects')
+    if not os.path.isdir(objects_dir):
+      os.makedirs(objects_dir)
+    # The digest isn't known until the file is read, so the file is copied to a
+    # temporary name and then renamed to its digest.
+    temp_file = tempfile.NamedTemporaryFile(dir=objects_dir,
+                                            prefix='.caterpillar-',
+                                            delete=False)
+    temp_file.close()
+    try:
+      digest = copy_and_digest(path, temp_file.name)
+      object_path = self._object_path(digest)
+      if os.path.exists(object_path):
+        os.remove(temp_file.name)
+      else:
+        if not os.path.isdir(os.path.dirname(object_path)):
+          os.makedirs(os.path.dirname(object_path))
+        os.rename(temp_file.name, object_path)
+    except:
+      if os.path.exists(temp_file.name):
+        os.remove(temp_file.name)
+      raise
+    return digest
+
+  def add(self, manager, name, package_dir):
+    """Adds an installed package to the store.
+
+    The added version becomes the current version of the package.
+
+    Args:
+      manager: 'bower' or 'npm'.
+      name: Package name.
+      package_dir: Directory the package is installed in.
+
+    Returns:
+      Package record dictionary; see find.
+    """
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+      dirnames.sort()
+      for filename in filenames:
+        path = os.path.join(dirpath, filename)
+        if os.path.islink(path):
+          logging.debug('Not storing symbolic link `%s`.', path)
+          continue
+        relpath = os.path.relpath(path, package_dir).replace(os.sep, '/')
+        files[relpath] = {
+          'digest': self._add_file(path),
+          'mode': stat.S_IMODE(os.stat(path).st_mode),
+        }
+
+    record = {
+      'manager': manager,
+      'name': name,
+      'version': package_version(manager, package_dir),
+      'files': files,
+      'integrity': digests.json_digest(files),
+    }
+    package_dir = self._package_dir(manager, name)
+    self._write_atomically(
+        os.path.join(package_dir, '{}.json'.format(record['version'])),
+        json.dumps(record, sort_keys=True).encode('utf-8'))
+    self._write_atomically(os.path.join(package_dir, 'current'),
+                           record['version'].encode('utf-8'))
+    logging.debug('Stored %s package `%s` version %s.', manager, name,
+                  record['version'])
+    return record
+
+  def find(self, manager, name, version=None):
+    """Finds the record of a stored package.
+
+    Args:
+      manager: 'bower' or 'npm'.
+      name: Package name.
+      version: Package version. Optional; the current version if not given.
+
+    Returns:
+      Package record dictionary of the form {'manager': manager, 'name': name,
+      'version': version, 'files': {relative path: {'digest': digest, 'mode':
+      mode}}, 'integrity': digest of files}, or None if the package isn't
+      stored.
+
+    Raises:
+      ValueError if the version is invalid; see valid_version.
+      IntegrityError if the record doesn't match its integrity digest.
+    """
+    if version is not None and not valid_version(version):
+      raise ValueError('Invalid package version `{}`.'.format(version))
+
+    package_dir = self._package_dir(manager, name)
+    try:
+      if version is None:
+        with open(os.path.join(package_dir, 'current')) as current_file:
+          version = current_file.read().decode('utf-8').strip()
+        if not valid_version(version):
+          raise IntegrityError('Current version of {} package `{}` is '
+                               'invalid.'.format(manager, name))
+      with open(os.path.join(package_dir,
+                             '{}.json'.format(version))) as record_file:
+        record = json.load(record_file)
+    except IOError as e:
+      if e.errno == errno.ENOENT:
+        return None
+      raise
+    except ValueError:
+      raise IntegrityError('Record of {} package `{}` is corrupt.'.format(
+          manager, name))
+
+    if digests.json_digest(record['files']) != record['integrity']:
+      raise IntegrityError('Record of {} package `{}` version {} does not '
+                           'match its integrity digest.'.format(
+                               manager, name, version))
+    return record
+
+  def install(self, manager, name, install_dir, version=None):
+    """Installs a stored package.
+
+    Args:
+      manager: 'bower' or 'npm'.
+      name: Package name.
+      install_dir: Directory the dependency manager would install into, e.g.
+        node_modules. The package is installed into a subdirectory of this.
+      version: Package version. Optional; the current version if not given.
+
+    Returns:
+      Whether the package was stored, and so installed.
+
+    Raises:
+      IntegrityError if the stored package is corrupt. The package is left
+      uninstalled.
+    """
+    record = self.find(manager, name, version)
+    if record is None:
+      return False
+
+    package_path = os.path.join(install_dir, name)
+    if os.path.isdir(package_path):
+      shutil.rmtree(package_path)
+    try:
+      for relpath, info in sorted(record['files'].iteritems()):
+        path = os.path.join(package_path, *relpath.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+          os.makedirs(os.path.dirname(path))
+        try:
+          digest = copy_and_digest(self._object_path(info['digest']), path)
+        except IOError as e:
+          if e.errno != errno.ENOENT:
+            raise
+          digest = None
+        if digest != info['digest']:
+          raise IntegrityError('Stored file `{}` of {} package `{}` version {} '
+                               'is missing or corrupt.'.format(
+                                   relpath, manager, name, record['version']))
+        os.chmod(path, info['mode'])
+    except:
+      shutil.rmtree(package_path, ignore_errors=True)
+      raise
+
+    logging.debug('Installed %s package `%s` version %s from the package '
+                  'store.', manager, name, record['version'])
+    return True
@@ -0,0 +1,139 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for packagestore."""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import os
+import shutil
+import stat
+import unittest
+
+import caterpillar_test
+import packagestore
+
+
+class TestPackageStore(caterpillar_test.TestCaseWithTempDir):
+  """Tests PackageStore."""
+
+  def setUp(self):
+    """Makes an installed package and an empty store.
+
+    The package directory is stored in self.package_path, the store in
+    self.store, and the directory to install into in self.install_path.
+    """
+    super(TestPackageStore, self).setUp()
+    self.store = packagestore.PackageStore(
+        os.path.join(self.temp_path, 'stóre'))
+    self.install_path = os.path.join(self.temp_path, 'node_modules')
+    self.package_path = self.make_package('1.0.0', b'fórage')
+
+  def make_package(self, version, contents):
+    """Makes an installed package.
+
+    Args:
+      version: Version of the package.
+      contents: Contents of the package's script.
+
+    Returns:
+      Path to the package.
+    """
+    package_path = os.path.join(self.temp_path, 'páckage-' + version)
+    os.makedirs(os.path.join(package_path, 'dist'))
+    with open(os.path.join(package_path, 'package.json'), 'w') as json_file:
+      json.dump({'name': 'fórage', 'version': version}, json_file)
+    script_path = os.path.join(package_path, 'dist', 'fórage.js')
+    with open(script_path, 'w') as script_file:
+      script_file.write(contents)
+    os.chmod(script_path, 0o755)
+    return package_path
+
+  def test_add_and_install(self):
+    """Tests that an added package is installed with the same files."""
+    self.assertFalse(self.store.exists())
+    record = self.store.add('npm', 'fórage', self.package_path)
+    self.assertTrue(self.store.exists())
+    self.assertEqual(record['version'], '1.0.0')
+    self.assertEqual(sorted(record['files']),
+                     ['dist/fórage.js', 'package.json'])
+
+    self.assertTrue(self.store.install('npm', 'fórage', self.install_path))
+    script_path = os.path.join(self.install_path, 'fórage', 'dist',
+                               'fórage.js')
+    with open(script_path) as script_file:
+      self.assertEqual(script_file.read(), b'fórage')
+    self.assertEqual(stat.S_IMODE(os.stat(script_path).st_mode), 0o755)
+
+  def test_missing_package(self):
+    """Tests that packages that aren't stored aren't installed."""
+    self.assertIsNone(self.store.find('npm', 'fórage'))
+    self.assertFalse(self.store.install('npm', 'fórage', self.install_path))
+    self.assertFalse(os.path.exists(self.install_path))
+
+  def test_versions(self):
+    """Tests that the last version added is current."""
+    self.store.add('npm', 'fórage', self.package_path)
+    self.store.add('npm', 'fórage', self.make_package('2.0.0', b'néwer'))
+    self.assertEqual(self.store.find('npm', 'fórage')['version'], '2.0.0')
+    self.assertEqual(self.store.find('npm', 'fórage', '1.0.0')['version'],
+                     '1.0.0')
+
+  def test_invalid_version(self):
+    """Tests that versions that aren't safe filenames are stored as unknown."""
+    for version in ('../../../évil', '..', 'a/b', 'a\\b', 12):
+      package_path = self.make_package('x', b'fórage')
+      with open(os.path.join(package_path, 'package.json'), 'w') as json_file:
+        json.dump({'name': 'fórage', 'version': version}, json_file)
+      self.assertEqual(self.store.add('npm', 'fórage', package_path)['version'],
+                       packagestore.UNKNOWN_VERSION)
+      shutil.rmtree(package_path)
+    records_path = os.path.join(self.store.root, 'packages', 'npm', 'fórage')
+    self.assertEqual(sorted(os.listdir(records_path)),
+                     ['current', 'unknown.json'])
+    with self.assertRaises(ValueError):
+      self.store.find('npm', 'fórage', '../fórage/unknown')
+
+  def test_corrupt_file(self):
+    """Tests that a package with a corrupt file isn't installed."""
+    record = self.store.add('npm', 'fórage', self.package_path)
+    digest = record['files']['dist/fórage.js']['digest']
+    with open(self.store._object_path(digest), 'w') as object_file:
+      object_file.write(b'córrupt')
+
+    with self.assertRaises(packagestore.IntegrityError):
+      self.store.install('npm', 'fórage', self.install_path)
+    self.assertFalse(os.path.exists(os.path.join(self.install_path, 'fórage')))
+
+  def test_corrupt_record(self):
+    """Tests that a record that doesn't match its integrity digest is found."""
+    self.store.add('npm', 'fórage', self.package_path)
+    record_path = os.path.join(self.store.root, 'packages', 'npm', 'fórage',
+                               '1.0.0.json')
+    with open(record_path) as record_file:
+      record = json.load(record_file)
+    del record['files']['package.json']
+    with open(record_path, 'w') as record_file:
+      json.dump(record, record_file)
+
+    with self.assertRaises(packagestore.IntegrityError):
+      self.store.find('npm', 'fórage')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -15,16 +15,54 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Utilities for reading polyfill metadata."""
+"""Utilities for reading polyfill metadata.
+
+Polyfills are discovered from the manifests in js/polyfills once per process by
+a PolyfillRegistry, which also validates them and keeps what is derived from
+them. The registry can be saved as a single index file, which later processes
+load instead of reading every manifest, as long as the manifests haven't
+changed since.
+"""
 
 from __future__ import print_function, division, unicode_literals
 
 import json
+import logging
 import os
 
+import digests
+
 # Where this file is located (so we can find resources).
 SCRIPT_DIR = os.path.dirname(__file__)
 
+# Directory of polyfills and their manifests.
+POLYFILLS_DIR = os.path.join(SCRIPT_DIR, 'js', 'polyfills')
+
+# Filename suffixes of polyfill manifests and polyfill scripts.
+MANIFEST_SUFFIX = '.manifest.json'
+POLYFILL_SUFFIX = '.polyfill.js'
+
+# Name of the registry index file, in the polyfills directory.
+INDEX_FILENAME = 'polyfills.index.json'
+
+# Version of the index format. Indices of other versions are ignored.
+INDEX_VERSION = 1
+
+# Statuses a polyfill or one of its members may have.
+STATUSES = ('none', 'partial', 'total')
+
+# Dependency managers that polyfill dependencies may be installed with.
+MANAGERS = ('bower', 'npm')
+
+# The registry of the polyfills directory, once loaded; see registry().
+_registry = None
+
+
+class ManifestError(Exception):
+  """Exception raised when a polyfill manifest is invalid."""
+
+  pass
+
 
 def default(api):
   """Generates a default manifest for a given API.
@@ -41,6 +79,256 @@ def default(api):
   }
 
 
+def validate(api, manifest):
+  """Checks that a polyfill manifest is valid.
+
+  Args:
+    api: API name.
+    manifest: Polyfill manifest dictionary.
+
+  Raises:
+    ManifestError if the manifest is invalid.
+  """
+  def check(condition, message):
+    if not condition:
+      raise ManifestError('Polyfill manifest of `{}` {}.'.format(api, message))
+
+  check(isinstance(manifest, dict), 'is not an object')
+  check(manifest.get('name') == api, 'does not have name `{}`'.format(api))
+  check(manifest.get('status') in STATUSES, 'has an invalid status')
+  check(isinstance(manifest.get('dependencies', []), list),
+        'has invalid dependencies')
+  for dependency in manifest.get('dependencies', []):
+    check(isinstance(dependency, dict) and
+          isinstance(dependency.get('name'), basestring) and
+          dependency.get('manager') in MANAGERS,
+          'has an invalid dependency')
+  check(isinstance(manifest.get('warnings', []), list), 'has invalid warnings')
+  for warning in manifest.get('warnings', []):
+    check(isinstance(warning, basestring) or (
+              isinstance(warning, dict) and
+              isinstance(warning.get('member'), basestring) and
+              isinstance(warning.get('text'), (basestring, list)) and
+              warning.get('status') in STATUSES),
+          'has an invalid warning')
+
+
+def member_statuses(manifest):
+  """Compiles the statuses of the members of an API that have their own status.
+
+  Args:
+    manifest: Polyfill manifest dictionary.
+
+  Returns:
+    Dictionary mapping member names, e.g. onChanged.addListener, to statuses.
+  """
+  statuses = {}
+  for warning in manifest.get('warnings', []):
+    # The first warning for a member decides its status. Members listed as
+    # strings are not implemented at all.
+    if isinstance(warning, basestring):
+      statuses.setdefault(warning, 'none')
+    else:
+      statuses.setdefault(warning['member'], warning['status'])
+  return statuses
+
+
+def source_stats(polyfills_dir):
+  """Gets the size and modification time of each polyfill file.
+
+  Args:
+    polyfills_dir: Directory of polyfills and their manifests.
+
+  Returns:
+    Dictionary mapping filenames of manifests and polyfill scripts to [size,
+    mtime] lists.
+  """
+  stats = {}
+  for filename in os.listdir(polyfills_dir):
+    if filename.endswith((MANIFEST_SUFFIX, POLYFILL_SUFFIX)):
+      stat = os.stat(os.path.join(polyfills_dir, filename))
+      stats[filename] = [stat.st_size, stat.st_mtime]
+  return stats
+
+
+class PolyfillRegistry(object):
+  """Validated polyfill manifests and the data derived from them.
+
+  Attributes:
+    manifests: Dictionary mapping API names to polyfill manifest dictionaries.
+      Each manifest has a 'member_statuses' dictionary; see member_statuses.
+      The manifests are shared, so they must not be changed.
+    scripts: Dictionary mapping API names to {'size': size, 'digest': digest}
+      dictionaries describing their polyfill scripts.
+    sources: Dictionary mapping the filenames the registry was built from to
+      [size, mtime] lists; see source_stats.
+  """
+
+  def __init__(self, manifests, scripts, sources):
+    self.manifests = manifests
+    self.scripts = scripts
+    self.sources = sources
+
+  @classmethod
+  def discover(cls, polyfills_dir):
+    """Builds a registry from all polyfill manifests in a directory.
+
+    Args:
+      polyfills_dir: Directory of polyfills and their manifests.
+
+    Returns:
+      PolyfillRegistry.
+
+    Raises:
+      ManifestError if a manifest is invalid or has no polyfill script.
+    """
+    sources = source_stats(polyfills_dir)
+    manifests = {}
+    scripts = {}
+    for filename in sorted(sources):
+      if not filename.endswith(MANIFEST_SUFFIX):
+        continue
+      api = filename[:-len(MANIFEST_SUFFIX)]
+      try:
+        with open(os.path.join(polyfills_dir, filename)) as manifest_file:
+          manifest = json.load(manifest_file)
+      except ValueError as e:
+        raise ManifestError('Polyfill manifest of `{}` is not valid JSON: {}'
+                            .format(api, e))
+      validate(api, manifest)
+      manifest.setdefault('dependencies', [])
+      manifest.setdefault('warnings', [])
+      manifest['member_statuses'] = member_statuses(manifest)
+      manifests[api] = manifest
+
+      script_filename = api + POLYFILL_SUFFIX
+      if script_filename not in sources:
+        raise ManifestError('Polyfill `{}` has no script `{}`.'.format(
+            api, script_filename))
+      script_path = os.path.join(polyfills_dir, script_filename)
+      scripts[api] = {'size': os.path.getsize(script_path),
+                      'digest': digests.file_digest(script_path)}
+    return cls(manifests, scripts, sources)
+
+  @classmethod
+  def load_index(cls, path):
+    """Loads a registry from an index file.
+
+    Args:
+      path: Path to the index file.
+
+    Returns:
+      PolyfillRegistry, or None if there is no readable index of this version.
+    """
+    try:
+      with open(path) as index_file:
+        data = json.load(index_file)
+    except (IOError, ValueError):
+      return None
+    if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+      return None
+    return cls(data['manifests'], data['scripts'], data['sources'])
+
+  @classmethod
+  def load(cls, polyfills_dir=POLYFILLS_DIR):
+    """Loads the registry of a directory, from its index if it is up to date.
+
+    Args:
+      polyfills_dir: Directory of polyfills and their manifests. Default is
+        POLYFILLS_DIR.
+
+    Returns:
+      PolyfillRegistry.
+
+    Raises:
+      ManifestError if the index is out of date and a manifest is invalid.
+    """
+    registry = cls.load_index(os.path.join(polyfills_dir, INDEX_FILENAME))
+    if registry and registry.sources == source_stats(polyfills_dir):
+      return registry
+    if registry:
+      logging.debug('Polyfill index in `%s` is out of date.', polyfills_dir)
+    return cls.discover(polyfills_dir)
+
+  def save_index(self, path):
+    """Writes this registry to an index file.
+
+    Args:
+      path: Path to the index file.
+    """
+    with open(path, 'w') as index_file:
+      json.dump({
+        'version': INDEX_VERSION,
+        'manifests': self.manifests,
+        'scripts': self.scripts,
+        'sources': self.sources,
+      }, index_file, sort_keys=True)
+
+  def __contains__(self, api):
+    return api in self.manifests
+
+  def apis(self):
+    """Returns a sorted list of the APIs with polyfills."""
+    return sorted(self.manifests)
+
+  def manifest(self, api):
+    """Gets the polyfill manifest of an API.
+
+    Args:
+      api: API name.
+
+    Returns:
+      Polyfill manifest dictionary. It is shared, so it must not be changed.
+
+    Raises:
+      KeyError if the API has no polyfill.
+    """
+    return self.manifests[api]
+
+  def dependencies(self, apis):
+    """Gets the dependencies of the polyfills of some APIs.
+
+    Args:
+      apis: List of API names with polyfills.
+
+    Returns:
+      List of dependency dictionaries, in the order of the APIs.
+    """
+    return [dependency
+            for api in apis
+            for dependency in self.manifests[api]['dependencies']]
+
+
+def registry():
+  """Gets the registry of POLYFILLS_DIR, loading it the first time.
+
+  Returns:
+    PolyfillRegistry.
+  """
+  global _registry
+  if _registry is None:
+    _registry = PolyfillRegistry.load()
+  return _registry
+
+
+def write_index(polyfills_dir=POLYFILLS_DIR):
+  """Validates the polyfill manifests in a directory and writes its index.
+
+  Args:
+    polyfills_dir: Directory of polyfills and their manifests. Default is
+      POLYFILLS_DIR.
+
+  Returns:
+    PolyfillRegistry that was written.
+
+  Raises:
+    ManifestError if a manifest is invalid.
+  """
+  written = PolyfillRegistry.discover(polyfills_dir)
+  written.save_index(os.path.join(polyfills_dir, INDEX_FILENAME))
+  return written
+
+
 def load(api):
   """Loads the polyfill manifests for the given API.
 
@@ -48,13 +336,9 @@ def load(api):
     api: API name.
 
   Returns:
-    Polyfill manifest dictionary.
+    Polyfill manifest dictionary. It is shared, so it must not be changed.
   """
-  manifest_path = os.path.join(
-      SCRIPT_DIR, 'js', 'polyfills', '{}.manifest.json'.format(api))
-  with open(manifest_path) as manifest_file:
-    manifest = json.load(manifest_file)
-    return manifest
+  return registry().manifest(api)
 
 
 def load_many(apis):
@@ -64,10 +348,13 @@ def load_many(apis):
     apis: List of API names.
 
   Returns:
-    Dictionary mapping API names to polyfill manifest dictionaries.
+    Dictionary mapping API names to polyfill manifest dictionaries. Each
+    manifest is a shallow copy of the shared one, so callers may set its keys
+    but must not change the values it shares.
   """
   manifests = {}
   for api in apis:
-    manifests[api] = load(api)
+    manifests[api] = dict(load(api))
 
   return manifests
+
@@ -0,0 +1,120 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for polyfill_manifest."""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import os
+import unittest
+
+import mock
+
+import caterpillar_test
+import polyfill_manifest
+
+
+class TestPolyfillRegistry(caterpillar_test.TestCaseWithTempDir):
+  """Tests PolyfillRegistry."""
+
+  def setUp(self):
+    """Makes a polyfills directory with one polyfill in self.temp_path."""
+    super(TestPolyfillRegistry, self).setUp()
+    self.manifest = {
+      'name': 'test',
+      'status': 'partial',
+      'dependencies': [{'name': 'dép', 'manager': 'npm'}],
+      'warnings': [
+        'missing',
+        {'member': 'parent', 'status': 'total', 'text': 'wárning'},
+        {'member': 'parent', 'status': 'none', 'text': ['later', 'wárning']},
+      ],
+    }
+    self.write_manifest(self.manifest)
+    with open(os.path.join(self.temp_path, 'test.polyfill.js'), 'w') as f:
+      f.write('chrome.test = {}; // Nó\n'.encode('utf-8'))
+
+  def write_manifest(self, manifest):
+    """Writes the manifest of the test polyfill."""
+    path = os.path.join(self.temp_path, 'test.manifest.json')
+    with open(path, 'w') as manifest_file:
+      json.dump(manifest, manifest_file)
+
+  def test_discover(self):
+    """Tests that manifests are discovered with their derived data."""
+    registry = polyfill_manifest.PolyfillRegistry.discover(self.temp_path)
+    self.assertEqual(registry.apis(), ['test'])
+    self.assertIn('test', registry)
+    self.assertNotIn('other', registry)
+    manifest = registry.manifest('test')
+    self.assertEqual(manifest['member_statuses'],
+                     {'missing': 'none', 'parent': 'total'})
+    self.assertEqual(registry.dependencies(['test']),
+                     [{'name': 'dép', 'manager': 'npm'}])
+    self.assertEqual(registry.scripts['test']['size'], 25)
+
+  def test_invalid_manifest(self):
+    """Tests that invalid manifests raise errors."""
+    self.manifest['status'] = 'móstly'
+    self.write_manifest(self.manifest)
+    self.assertRaises(polyfill_manifest.ManifestError,
+                      polyfill_manifest.PolyfillRegistry.discover,
+                      self.temp_path)
+
+  def test_index(self):
+    """Tests that an up to date index is loaded instead of the manifests."""
+    written = polyfill_manifest.write_index(self.temp_path)
+    with mock.patch.object(polyfill_manifest.PolyfillRegistry,
+                           'discover') as mock_discover:
+      loaded = polyfill_manifest.PolyfillRegistry.load(self.temp_path)
+    self.assertFalse(mock_discover.called)
+    self.assertEqual(loaded.manifests, written.manifests)
+    self.assertEqual(loaded.scripts, written.scripts)
+
+  def test_index_out_of_date(self):
+    """Tests that an index is not used once a manifest changes."""
+    polyfill_manifest.write_index(self.temp_path)
+    self.manifest['status'] = 'total'
+    self.write_manifest(self.manifest)
+    self.assertEqual(polyfill_manifest.PolyfillRegistry.load(self.temp_path)
+                     .manifest('test')['status'], 'total')
+
+
+class TestRegistry(unittest.TestCase):
+  """Tests registry."""
+
+  def test_loaded_once(self):
+    """Tests that the polyfills directory is only read once."""
+    with mock.patch.object(polyfill_manifest, '_registry', None):
+      registry = polyfill_manifest.registry()
+      with mock.patch.object(polyfill_manifest.PolyfillRegistry,
+                             'load') as mock_load:
+        self.assertIs(polyfill_manifest.registry(), registry)
+        manifests = polyfill_manifest.load_many(['tts'])
+    self.assertFalse(mock_load.called)
+    self.assertEqual(manifests['tts'], registry.manifest('tts'))
+
+  def test_load_many_copies(self):
+    """Tests that setting keys on loaded manifests leaves the registry alone."""
+    manifests = polyfill_manifest.load_many(['tts'])
+    manifests['tts']['usage'] = [('app.js', 1, 'chrome.tts', 0)]
+    self.assertNotIn('usage', polyfill_manifest.load('tts'))
+
+
+if __name__ == '__main__':
+  unittest.main()
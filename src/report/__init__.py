@@ -18,3 +18,8 @@ from . import report
 
 generate = report.generate
 generate_and_write = report.generate_and_write
+ASSETS = report.ASSETS
+ASSETS_BOWER = report.ASSETS_BOWER
+ASSETS_INLINE = report.ASSETS_INLINE
+BOWER_DEPENDENCIES = report.BOWER_DEPENDENCIES
+start_installing_bower_dependencies = report.start_installing_bower_dependencies
@@ -0,0 +1,164 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Highlights JavaScript usage contexts for self-contained reports.
+
+Produces the same markup as Code Prettify does in the browser (token spans with
+the classes in highlight.css, inside a numbered list of lines), so reports can
+be highlighted without any scripts.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import cgi
+import re
+
+# JavaScript keywords, as Code Prettify highlights them.
+KEYWORDS = frozenset("""
+  break case catch class const continue debugger default delete do else enum
+  export extends false finally for function if import in instanceof let new
+  null return super switch this throw true try typeof undefined var void while
+  with yield
+""".split())
+
+# Regular expression matching one JavaScript token. Comments and strings may be
+# unterminated, as contexts can start or end in the middle of them.
+TOKEN_REGEX = re.compile(r"""
+    (?P<com>/\*.*?(?:\*/|\Z)|//[^\n]*)
+  | (?P<str>"(?:[^"\\\n]|\\.)*"?|'(?:[^'\\\n]|\\.)*'?|`(?:[^`\\]|\\.)*`?)
+  | (?P<lit>(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\b)
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<pln>[^\S\n]+)
+  | (?P<nl>\n)
+  | (?P<pun>[^\w\s$"'`]+?(?=[\w\s$"'`]|/[/*]|\Z)|.)
+""", re.VERBOSE | re.DOTALL)
+
+# Regular expression matching an HTML tag or character reference.
+MARKUP_REGEX = re.compile(r'(<[^>]*>|&(?:#\d+|\w+);)')
+
+# Characters escaped by cgi.escape, by reference.
+CHARACTER_REFERENCES = {
+  '&amp;': '&',
+  '&lt;': '<',
+  '&gt;': '>',
+  '&quot;': '"',
+}
+
+
+def tokenize(code):
+  """Splits JavaScript into tokens.
+
+  Args:
+    code: JavaScript string.
+
+  Returns:
+    List of (class, text) tuples, covering the whole string. Each newline is a
+    token of its own with class None, and no other token contains a newline.
+  """
+  tokens = []
+  for match in TOKEN_REGEX.finditer(code):
+    kind = match.lastgroup
+    text = match.group(kind)
+    if kind == 'nl':
+      tokens.append((None, text))
+      continue
+    if kind == 'word':
+      if text in KEYWORDS:
+        kind = 'kwd'
+      elif text[0].isupper():
+        kind = 'typ'
+      else:
+        kind = 'pln'
+    # Block comments and template strings can span lines.
+    for i, line in enumerate(text.split('\n')):
+      if i:
+        tokens.append((None, '\n'))
+      if line:
+        tokens.append((kind, line))
+  return tokens
+
+
+def split_markup(html):
+  """Splits escaped HTML into its text and its tags.
+
+  Args:
+    html: HTML string with only text and tags, e.g. a usage context escaped by
+      cgi.escape and highlighted by report.format_html.
+
+  Returns:
+    (text, tags) tuple, where text is the unescaped text and tags is a list of
+    (offset in text, tag) tuples.
+  """
+  text = []
+  tags = []
+  offset = 0
+  for i, part in enumerate(MARKUP_REGEX.split(html)):
+    if i % 2 and part.startswith('<'):
+      tags.append((offset, part))
+      continue
+    if i % 2:
+      part = CHARACTER_REFERENCES.get(part, part)
+    text.append(part)
+    offset += len(part)
+  return ''.join(text), tags
+
+
+def highlight_js(html, first_line):
+  """Highlights a usage context.
+
+  Args:
+    html: Usage context HTML string, e.g. as made by report.process_usage.
+    first_line: Number of the first line of the context.
+
+  Returns:
+    HTML string of a numbered list of highlighted lines.
+  """
+  text, tags = split_markup(html)
+  lines = []
+  line = []
+  tag_index = 0
+  position = 0
+  for kind, token in tokenize(text):
+    end = position + len(token)
+    while True:
+      while tag_index < len(tags) and tags[tag_index][0] == position:
+        line.append(tags[tag_index][1])
+        tag_index += 1
+      if position == end:
+        break
+
+      if kind is None:
+        lines.append(''.join(line))
+        line = []
+        position = end
+        continue
+
+      # Tags inside a token split it, so that the tags stay balanced.
+      stop = end
+      if tag_index < len(tags) and tags[tag_index][0] < end:
+        stop = tags[tag_index][0]
+      line.append('<span class="{}">{}</span>'.format(
+          kind, cgi.escape(text[position:stop])))
+      position = stop
+  line.extend(tag for _, tag in tags[tag_index:])
+  if line or not lines:
+    lines.append(''.join(line))
+
+  return '<ol class="linenums" start="{}">{}</ol>'.format(
+      first_line,
+      ''.join('<li class="L{}">{}</li>'.format((first_line + i) % 10, line)
+              for i, line in enumerate(lines)))
@@ -29,6 +29,8 @@ import shutil
 
 import caterpillar
 import chrome_app.apis
+import chrome_app.index
+import highlight
 import polyfill_manifest
 import surrogateescape
 import templates
@@ -36,6 +38,19 @@ import templates
 # Where this file is located (so we can find resources).
 SCRIPT_DIR = os.path.dirname(__file__)
 
+# Bower dependencies of the report, installed into the report directory.
+BOWER_DEPENDENCIES = ['lato', 'inconsolata', 'code-prettify']
+
+# Ways for a report to get its styles and scripts: from report.css and
+# BOWER_DEPENDENCIES installed next to the report, or inlined into the report
+# file and highlighted in advance so that it needs nothing else.
+ASSETS_BOWER = 'bower'
+ASSETS_INLINE = 'inline'
+ASSETS = (ASSETS_BOWER, ASSETS_INLINE)
+
+# Regular expression matching CSS imports.
+CSS_IMPORT_REGEX = re.compile(r'^@import[^;]*;\n', re.MULTILINE)
+
 
 class Status(object):
   """Caterpillar conversion status constants."""
@@ -58,7 +73,7 @@ def generate_summary(chrome_app_manifest, apis, status, warnings):
   Returns:
     HTML
   """
-  return templates.TEMPLATE_SUMMARY.render(
+  return templates.render('summary',
     chrome_app_manifest=chrome_app_manifest,
     apis=apis,
     status=status,
@@ -76,10 +91,10 @@ def generate_general_warnings(warnings):
   Returns:
     HTML
   """
-  return templates.TEMPLATE_GENERAL_WARNINGS.render(warnings=warnings)
+  return templates.render('general_warnings', warnings=warnings)
 
 
-def process_usage(apis, usage):
+def process_usage(apis, usage, highlighted=False):
   """Populates usage element of an API dictionary with the usages of that API.
 
   Args:
@@ -87,6 +102,8 @@ def process_usage(apis, usage):
       dictionaries. This will be modified.
     usage: Usage dictionary mapping API names to
       (filepath, linenum, context, context_linenum) tuples.
+    highlighted: Whether to highlight the code of the contexts, rather than
+      leaving that to Code Prettify. Default is False.
   """
 
   for api_name, api_info in apis.iteritems():
@@ -95,13 +112,16 @@ def process_usage(apis, usage):
       for filepath, line_num, context, start in uses:
         context = cgi.escape(context)
         context = highlight_relevant_line(context, line_num - start, apis)
+        if highlighted:
+          context = highlight.highlight_js(context, line_num)
         api_info['usage'].append((filepath, line_num, context, start))
 
     # Sort first by file, then by line number.
     api_info['usage'].sort()
 
 
-def generate_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
+def generate_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs,
+                        index=None, usage=None, highlighted=False):
   """Generates the polyfilled section of a conversion report.
 
   Args:
@@ -110,6 +130,11 @@ def generate_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
       dictionaries.
     web_path: Path to output web app directory.
     ignore_dirs: Absolute directory paths to ignore for API usage.
+    index: AppIndex of the output web app. Optional.
+    usage: Usage dictionary of all APIs; see chrome_app.apis.usage. Optional;
+      found by scanning the web app if not given.
+    highlighted: Whether to highlight code in advance; see process_usage.
+      Default is False.
 
   Returns:
     HTML
@@ -119,10 +144,11 @@ def generate_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
                      for api_name, api_info in apis.iteritems()
                      if api_info['status'] != Status.NONE}
 
-  usage = chrome_app.apis.usage(
-      polyfilled_apis, web_path, ignore_dirs=ignore_dirs)
+  if usage is None:
+    usage = chrome_app.apis.usage(
+        polyfilled_apis, web_path, ignore_dirs=ignore_dirs, index=index)
 
-  process_usage(polyfilled_apis, usage)
+  process_usage(polyfilled_apis, usage, highlighted)
 
   # Get the warnings for each API; split them into relevant and other warnings.
   for api_name, api_info in polyfilled_apis.iteritems():
@@ -138,10 +164,11 @@ def generate_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
           api_info['relevant_warnings'].append(warning['text'])
           break
 
-  return templates.TEMPLATE_POLYFILLED.render(
+  return templates.render('polyfilled',
     some_polyfilled=bool(polyfilled_apis),
     apis=polyfilled_apis,
     chrome_app_manifest=chrome_app_manifest,
+    highlighted=highlighted,
     Status=Status
   )
 
@@ -164,7 +191,8 @@ def highlight_relevant_line(context, relevant_line, apis):
   return context
 
 
-def generate_not_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
+def generate_not_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs,
+                            index=None, usage=None, highlighted=False):
   """Generates the missing polyfills section of a conversion report.
 
   Args:
@@ -173,6 +201,11 @@ def generate_not_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
       dictionaries.
     web_path: Path to output web app directory.
     ignore_dirs: Absolute directory paths to ignore for API usage.
+    index: AppIndex of the output web app. Optional.
+    usage: Usage dictionary of all APIs; see chrome_app.apis.usage. Optional;
+      found by scanning the web app if not given.
+    highlighted: Whether to highlight code in advance; see process_usage.
+      Default is False.
 
   Returns:
     HTML
@@ -181,15 +214,17 @@ def generate_not_polyfilled(chrome_app_manifest, apis, web_path, ignore_dirs):
   missing_apis = {api: apis[api] for api in apis
                      if apis[api]['status'] == Status.NONE}
 
-  usage = chrome_app.apis.usage(
-      missing_apis, web_path, ignore_dirs=ignore_dirs)
+  if usage is None:
+    usage = chrome_app.apis.usage(
+        missing_apis, web_path, ignore_dirs=ignore_dirs, index=index)
 
-  process_usage(missing_apis, usage)
+  process_usage(missing_apis, usage, highlighted)
 
-  return templates.TEMPLATE_NOT_POLYFILLED.render(
+  return templates.render('not_polyfilled',
     some_not_polyfilled=bool(missing_apis),
     apis=missing_apis,
     chrome_app_manifest=chrome_app_manifest,
+    highlighted=highlighted,
     Status=Status
   )
 
@@ -245,70 +280,70 @@ def manifest_warnings(manifest, apis):
   return warnings
 
 
+def member_statuses(api_info):
+  """Gets the statuses of the members of an API that have their own status.
+
+  Manifests from the polyfill registry have them already. For other manifests,
+  they are compiled from the warnings the first time they are needed and kept
+  in the manifest, so highlighting a member doesn't search the warnings again.
+
+  Args:
+    api_info: Polyfill manifest dictionary. This may be modified.
+
+  Returns:
+    Dictionary mapping member names, e.g. onChanged.addListener, to statuses.
+  """
+  statuses = api_info.get('member_statuses')
+  if statuses is None:
+    statuses = polyfill_manifest.member_statuses(api_info)
+    api_info['member_statuses'] = statuses
+  return statuses
+
+
+def member_status(api_info, member):
+  """Gets the status of a member of an API.
+
+  This is the status of the deepest member, out of the member and its parents,
+  that has its own status, or the status of the API if none do.
+
+  Args:
+    api_info: Polyfill manifest dictionary. This may be modified.
+    member: Member name, e.g. onChanged.addListener, or '' for the API itself.
+
+  Returns:
+    Status.
+  """
+  statuses = member_statuses(api_info)
+  while member:
+    if member in statuses:
+      return statuses[member]
+    member = member.rpartition('.')[0]
+  return api_info['status']
+
+
 def format_html(string, apis):
   """Formats a string as HTML, highlighting Chrome Apps APIs based on status.
 
   Args:
     string: String to format.
     apis: Dictionary mapping Chrome Apps API name to polyfill manifest
-      dictionaries.
+      dictionaries. The manifests may be modified.
 
   Returns:
     Formatted HTML string
   """
   def replacer(match):
-    # The match will be of the form chrome.a.b.c.d. We want to find the deepest
-    # member with an independent status and set the status of the whole match
-    # to that.
-    match_group = match.group(1)[1:]  # Slice off the leading dot.
-    if ('.' not in match_group or
-        (match_group.count('.') == 1 and
-         match_group.split('.', 1)[0] in {'app', 'sockets', 'system'})):
-      # This match is either a standalone API (chrome.api) or a special
-      # standalone API (chrome.superapi.api) and we can just take the top-level
-      # status of the API.
-      api = match_group
-
-      if api not in apis:
-        return match.group(0)
-
-      status = apis[api]['status']
-      return '<span class="ca-feature {}">{}</span>'.format(
-          status, match.group(0))
-
-    api, member = chrome_app.apis.CHROME_API_AND_MEMBER_REGEX.match(
-      match.group(0)).groups()
+    # The match will be of the form chrome.a.b.c.d, where the API may be a
+    # standalone API (chrome.api) or a special standalone API
+    # (chrome.superapi.api), and the rest is a member of that API.
+    names = match.group(1)[1:].split('.')  # Slice off the leading dot.
+    api = chrome_app.apis.api_name(names)
 
     if api not in apis:
       return match.group(0)
 
-    status = None
-    while True:
-      # Check if the member has a status; if it does, use that, otherwise jump
-      # to the parent member.
-      for warning in apis[api].get('warnings', []):
-        if member == warning:
-          status = Status.NONE
-          break
-
-        try:
-          warning_member = warning['member']
-        except TypeError:  # This is a string warning for a different member.
-          continue
-
-        if warning_member == member:
-          status = warning['status']
-          break
-
-      if status is not None:
-        break
-
-      if '.' not in member:
-        status = apis[api]['status']
-        break
-
-      member = member.rsplit('.', 1)[0]
-
+    member = '.'.join(names[api.count('.') + 1:])
+    status = member_status(apis[api], member)
     return '<span class="ca-feature {}">{}</span>'.format(
         status, match.group(0))
 
@@ -316,7 +351,7 @@ def format_html(string, apis):
 
 
 def generate(chrome_app_manifest, apis, status, warnings, web_path,
-             boilerplate_dir):
+             boilerplate_dir, index=None, usage=None, assets=ASSETS_BOWER):
   """Generates a conversion report.
 
   Args:
@@ -327,30 +362,61 @@ def generate(chrome_app_manifest, apis, status, warnings, web_path,
     warnings: List of general warnings logged during conversion.
     web_path: Path to output progressive web app.
     boilerplate_dir: Boilerplate directory relative to the output directory.
+    index: AppIndex of the output web app. Optional; built if not given.
+    usage: Usage dictionary of all APIs; see chrome_app.apis.usage. Optional;
+      found by scanning the web app once if not given.
+    assets: How the report gets its styles and scripts; one of ASSETS. Default
+      is ASSETS_BOWER.
 
   Returns:
     HTML
   """
+  inline = assets == ASSETS_INLINE
+  if index is None:
+    index = chrome_app.index.AppIndex.build(web_path)
+
   # Ignore the Caterpillar boilerplate directory so we don't see polyfill code
   # included in API usages.
   ignore_dirs = {os.path.abspath(os.path.join(web_path, boilerplate_dir))}
 
+  # Both sections use the same usage, so the web app is only scanned once.
+  if usage is None:
+    usage = chrome_app.apis.usage(
+        apis, web_path, ignore_dirs=ignore_dirs, index=index)
+
   warnings = [format_html(warning, apis) for warning in warnings]
   summary = generate_summary(chrome_app_manifest, apis, status, warnings)
   general_warnings = generate_general_warnings(warnings)
   polyfilled = generate_polyfilled(
-      chrome_app_manifest, apis, web_path,ignore_dirs)
+      chrome_app_manifest, apis, web_path, ignore_dirs, index, usage, inline)
   not_polyfilled = generate_not_polyfilled(
-      chrome_app_manifest, apis, web_path, ignore_dirs)
-  return templates.TEMPLATE_FULL.render(
+      chrome_app_manifest, apis, web_path, ignore_dirs, index, usage, inline)
+  return templates.render('full',
     chrome_app_manifest=chrome_app_manifest,
     summary=summary,
     general_warnings=general_warnings,
     polyfilled=polyfilled,
-    not_polyfilled=not_polyfilled
+    not_polyfilled=not_polyfilled,
+    css=inline_css() if inline else None
   )
 
 
+def inline_css():
+  """Gets the CSS of a report that has its styles inlined.
+
+  This is report.css without the fonts it imports, which would need to be
+  installed, and with styles for code highlighted by highlight.py.
+
+  Returns:
+    CSS string.
+  """
+  css = []
+  for filename in ('report.css', 'highlight.css'):
+    with open(os.path.join(SCRIPT_DIR, filename)) as css_file:
+      css.append(CSS_IMPORT_REGEX.sub('', css_file.read().decode('utf-8')))
+  return '\n'.join(css)
+
+
 def copy_css(directory):
   """Copies required report CSS into a directory.
 
@@ -362,19 +428,32 @@ def copy_css(directory):
                   os.path.join(directory, 'report.css'))
 
 
-def install_bower_dependencies(dependencies, directory):
-  """Installs bower dependencies into a directory.
+def start_installing_bower_dependencies(dependencies, directory):
+  """Starts installing bower dependencies into a directory.
+
+  Dependencies which are already installed are skipped. The rest are installed
+  with one call to bower, in the background.
 
   Args:
     dependencies: List of dependency names.
     directory: Directory to install dependencies into.
+
+  Returns:
+    caterpillar.Installation. Its wait method waits for the installation to
+    finish.
   """
+  missing = []
   for dependency in dependencies:
-    caterpillar.install_dependency(['bower', 'install', dependency], directory)
+    if os.path.isdir(os.path.join(directory, 'bower_components', dependency)):
+      logging.debug('Bower dependency `%s` is already installed.', dependency)
+      continue
+    missing.append({'name': dependency, 'manager': 'bower'})
+  return caterpillar.Installation(missing, directory)
 
 
 def generate_and_write(report_dir, chrome_app_manifest, apis, status, warnings,
-                       web_path, boilerplate_dir):
+                       web_path, boilerplate_dir, index=None, usage=None,
+                       installation=None, assets=ASSETS_BOWER):
   """Generates a conversion report and writes it to a directory.
 
   Args:
@@ -385,13 +464,32 @@ def generate_and_write(report_dir, chrome_app_manifest, apis, status, warnings,
     status: Status representing conversion status of the entire app.
     warnings: List of general warnings logged during conversion.
     web_path: Path to output progressive web app.
+    boilerplate_dir: Boilerplate directory relative to the output directory.
+    index: AppIndex of the output web app. Optional.
+    usage: Usage dictionary of all APIs; see chrome_app.apis.usage. Optional.
+    installation: Installation of BOWER_DEPENDENCIES into the report directory,
+      started by start_installing_bower_dependencies. Optional; started here
+      if not given and the assets are ASSETS_BOWER.
+    assets: How the report gets its styles and scripts; one of ASSETS. Default
+      is ASSETS_BOWER. With ASSETS_INLINE, only report.html is written.
+
+  Raises:
+    ValueError if assets is not one of ASSETS.
   """
+  if assets not in ASSETS:
+    raise ValueError('Invalid report assets `{}`.'.format(assets))
+
+  # The dependencies install while the report is generated.
+  if installation is None and assets == ASSETS_BOWER:
+    installation = start_installing_bower_dependencies(BOWER_DEPENDENCIES,
+                                                       report_dir)
   report = generate(chrome_app_manifest, apis, status, warnings, web_path,
-                    boilerplate_dir)
+                    boilerplate_dir, index, usage, assets)
   report_path = os.path.join(report_dir, 'report.html')
   with open(report_path, 'w') as report_file:
     logging.info('Writing conversion report to `%s`.', report_path)
     report_file.write(surrogateescape.encode(report))
-  copy_css(report_dir)
-  install_bower_dependencies(['lato', 'inconsolata', 'code-prettify'],
-                             report_dir)
+  if assets == ASSETS_BOWER:
+    copy_css(report_dir)
+  if installation:
+    installation.wait()
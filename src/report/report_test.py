@@ -22,10 +22,13 @@ from __future__ import print_function, division, unicode_literals
 import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
 
 import bs4
+import mock
 
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..'))
 import report
@@ -251,7 +254,126 @@ class TestManifestWarnings(unittest.TestCase):
           'text': '<span class="ca-feature partial">chrome.test.member</span>: '
                   'warning B'},])
 
-# TODO(alger): Test format_html.
+
+class TestFormatHtml(unittest.TestCase):
+  """Tests format_html."""
+
+  def setUp(self):
+    self.apis = {
+      'test': {
+        'name': 'test',
+        'status': 'partial',
+        'warnings': [
+          'missing',
+          {'member': 'parent',
+           'text': 'a warning',
+           'status': 'total'},
+          {'member': 'parent.child',
+           'text': 'a warning',
+           'status': 'none'},
+          {'member': 'parent',
+           'text': 'a later warning',
+           'status': 'none'}]
+      },
+      'app.runtime': MANIFEST_RUNTIME
+    }
+
+  def test_no_apis(self):
+    """Tests that text without Chrome Apps APIs is unchanged."""
+    self.assertEqual(report.format_html('nó chrome here', self.apis),
+                     'nó chrome here')
+
+  def test_unknown_api(self):
+    """Tests that unknown APIs are not highlighted."""
+    self.assertEqual(report.format_html('chrome.unknown.member()', self.apis),
+                     'chrome.unknown.member()')
+
+  def test_api(self):
+    """Tests that APIs are highlighted with their own status."""
+    self.assertEqual(report.format_html('chrome.test, chrome.app.runtime',
+                                        self.apis),
+        '<span class="ca-feature partial">chrome.test</span>, '
+        '<span class="ca-feature none">chrome.app.runtime</span>')
+
+  def test_members(self):
+    """Tests that members are highlighted with the deepest member's status."""
+    self.assertEqual(report.format_html(
+        'chrome.test.parent.other chrome.test.parent.child.grandchild '
+        'chrome.test.missing.member chrome.test.other', self.apis),
+        '<span class="ca-feature total">chrome.test.parent.other</span> '
+        '<span class="ca-feature none">chrome.test.parent.child.grandchild'
+        '</span> '
+        '<span class="ca-feature none">chrome.test.missing.member</span> '
+        '<span class="ca-feature partial">chrome.test.other</span>')
+
+
+class TestTemplates(unittest.TestCase):
+  """Tests templates."""
+
+  def test_bytecode_cached(self):
+    """Tests that templates are not compiled again by a new environment."""
+    templates = report.templates
+    with mock.patch.object(templates, '_environment', None):
+      templates.render('general_warnings', warnings=[])
+
+    with mock.patch.object(templates, '_environment', None):
+      with mock.patch('jinja2.Environment.compile') as mock_compile:
+        html = templates.render('general_warnings', warnings=['wárning'])
+    self.assertFalse(mock_compile.called)
+    self.assertIn('<li>wárning</li>', html)
+
+
+class TestHighlightJs(unittest.TestCase):
+  """Tests highlight.highlight_js."""
+
+  def test_tokens(self):
+    """Tests that tokens are highlighted on numbered lines."""
+    self.assertEqual(report.highlight.highlight_js(
+        'var x = &quot;ínput&quot;; // Nó\nx()', 9),
+        '<ol class="linenums" start="9"><li class="L9">'
+        '<span class="kwd">var</span><span class="pln"> </span>'
+        '<span class="pln">x</span><span class="pln"> </span>'
+        '<span class="pun">=</span><span class="pln"> </span>'
+        '<span class="str">"ínput"</span><span class="pun">;</span>'
+        '<span class="pln"> </span><span class="com">// Nó</span></li>'
+        '<li class="L0"><span class="pln">x</span><span class="pun">()</span>'
+        '</li></ol>')
+
+  def test_tags_balanced(self):
+    """Tests that tokens are split around tags inside them."""
+    self.assertEqual(report.highlight.highlight_js(
+        '"a <span class="ca-feature none">chrome.test</span> b"', 1),
+        '<ol class="linenums" start="1"><li class="L1">'
+        '<span class="str">"a </span>'
+        '<span class="ca-feature none"><span class="str">chrome.test</span>'
+        '</span><span class="str"> b"</span></li></ol>')
+
+
+class TestGenerateAndWrite(unittest.TestCase):
+  """Tests generate_and_write."""
+
+  def setUp(self):
+    self.report_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.report_dir)
+
+  @mock.patch('report.report.start_installing_bower_dependencies')
+  def test_inline(self, mock_start_installing):
+    """Tests that inline reports are a single file with no dependencies."""
+    report.generate_and_write(self.report_dir, {'name': 'ápp'}, {},
+                              report.Status.TOTAL, [], MINIMAL_APP_DIR,
+                              'caterpillar', usage={},
+                              assets=report.ASSETS_INLINE)
+    self.assertFalse(mock_start_installing.called)
+    self.assertEqual(os.listdir(self.report_dir), ['report.html'])
+    with open(os.path.join(self.report_dir, 'report.html')) as report_file:
+      html = report_file.read().decode('utf-8')
+    self.assertIn('<style>', html)
+    self.assertNotIn('<script', html)
+    self.assertNotIn('<link', html)
+    self.assertNotIn('@import', html)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -15,15 +15,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Generates a Caterpillar conversion report.
+"""Templates for a Caterpillar conversion report.
+
+Templates are compiled by a shared Jinja2 environment, created the first time a
+template is rendered. Compiled templates are kept in a bytecode cache on disk,
+so they are only compiled once rather than in every process that renders a
+report.
 """
 
 from __future__ import print_function, division, unicode_literals
 
-import jinja2
-
 
-TEMPLATE_SUMMARY = jinja2.Template("""
+TEMPLATE_SUMMARY = """
 <section id="summary">
   <h2>Summary</h2>
   <span class="name">{{ chrome_app_manifest.name }}</span> was
@@ -49,10 +52,10 @@ TEMPLATE_SUMMARY = jinja2.Template("""
     {% endfor %}
   </ul>
 </section>
-""")
+"""
 
 
-TEMPLATE_GENERAL_WARNINGS = jinja2.Template("""
+TEMPLATE_GENERAL_WARNINGS = """
 {% if warnings %}
 <section id="general-warnings">
   <h2>General Warnings</h2>
@@ -63,10 +66,10 @@ TEMPLATE_GENERAL_WARNINGS = jinja2.Template("""
   </ul>
 </section>
 {% endif %}
-""")
+"""
 
 
-TEMPLATE_POLYFILLED = jinja2.Template("""
+TEMPLATE_POLYFILLED = """
 {% if some_polyfilled %}
 <section id="polyfilled">
   <h2>Polyfilled Chrome Apps APIs</h2>
@@ -108,18 +111,22 @@ TEMPLATE_POLYFILLED = jinja2.Template("""
       </p>
       {% for path, start, context, line_num in pf_info.usage %}
         <p class="code-location path">{{ path }}:{{ start+2 }}</p>
+{% if highlighted -%}
+<pre class="prettyprint"><code>{{ context }}</code></pre>
+{% else -%}
 <pre>
 <code class="prettyprint lang-js linenums:{{ start }}">{{ context }}</code>
 </pre>
+{%- endif %}
       {% endfor %}
     </section>
   {% endfor %}
 </section>
 {% endif %}
-""")
+"""
 
 
-TEMPLATE_NOT_POLYFILLED = jinja2.Template("""
+TEMPLATE_NOT_POLYFILLED = """
 {% if some_not_polyfilled %}
 <section id="not-polyfilled">
   <h2>Missing Chrome Apps APIs</h2>
@@ -142,24 +149,34 @@ TEMPLATE_NOT_POLYFILLED = jinja2.Template("""
       </p>
       {% for path, start, context, line_num in pf_info.usage %}
         <p class="code-location path">{{ path }}:{{ start+2 }}</p>
+{% if highlighted -%}
+<pre class="prettyprint"><code>{{ context }}</code></pre>
+{% else -%}
 <pre>
 <code class="prettyprint lang-js linenums:{{ start }}">{{ context }}</code>
 </pre>
+{%- endif %}
       {% endfor %}
     </section>
   {% endfor %}
 </section>
 {% endif %}
-""")
+"""
 
 
-TEMPLATE_FULL = jinja2.Template("""
+TEMPLATE_FULL = """
 <!DOCTYPE html>
 <html lang="en">
   <head>
     <meta charset="utf-8">
     <title>Caterpillar Conversion Report: {{ chrome_app_manifest.name }}</title>
+    {% if css -%}
+    <style>
+{{ css }}
+    </style>
+    {%- else -%}
     <link rel="stylesheet" href="report.css">
+    {%- endif %}
   </head>
   <body>
     <div id="report">
@@ -176,8 +193,63 @@ TEMPLATE_FULL = jinja2.Template("""
       Generated by
       <a href="https://github.com/chromium/caterpillar">Caterpillar</a>.
     </footer>
+    {% if not css -%}
     <script src="bower_components/code-prettify/src/run_prettify.js">
     </script>
+    {%- endif %}
   </body>
 </html>
-""")
+"""
+
+
+# Template names, mapped to their sources.
+TEMPLATES = {
+  'summary': TEMPLATE_SUMMARY,
+  'general_warnings': TEMPLATE_GENERAL_WARNINGS,
+  'polyfilled': TEMPLATE_POLYFILLED,
+  'not_polyfilled': TEMPLATE_NOT_POLYFILLED,
+  'full': TEMPLATE_FULL,
+}
+
+# Shared Jinja2 environment; see environment().
+_environment = None
+
+
+def environment():
+  """Gets the Jinja2 environment that compiles report templates.
+
+  The environment is created the first time it is needed. Its bytecode cache
+  is stored in a per-user directory in the system's temporary directory, and is
+  keyed on each template's source, so changed templates are recompiled.
+
+  Returns:
+    jinja2.Environment.
+  """
+  global _environment
+  if _environment is None:
+    # Jinja2 is slow to import, and only needed to write reports.
+    import jinja2
+    _environment = jinja2.Environment(
+        loader=jinja2.DictLoader(TEMPLATES),
+        bytecode_cache=jinja2.FileSystemBytecodeCache())
+  return _environment
+
+
+def render(name, **context):
+  """Renders a report template.
+
+  Args:
+    name: Name of the template, e.g. 'summary'.
+    **context: Variables to render the template with.
+
+  Returns:
+    Rendered string.
+  """
+  return environment().get_template(name).render(**context)
+
+
+def compile_all():
+  """Compiles every template, e.g. before forking processes that render them.
+  """
+  for name in TEMPLATES:
+    environment().get_template(name)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent cache of the results of scanning files, keyed by their contents.
+
+Apps often include the same libraries, so scanning a file for Chrome Apps API
+usage, or for where TODOs go, gives the same results in every app that has it.
+The cache keeps these results on disk by the SHA-256 digest of the file's
+contents, so each library is only scanned once across conversions and apps.
+
+Each cached file has one record, a zlib-compressed JSON dictionary mapping the
+names of analyses (e.g. 'apis') to their results, at <digest[:2]>/<digest> in a
+directory named after FORMAT_VERSION. Records are used least recently used
+first: reading a record updates its modification time, and evict() deletes the
+records that were used longest ago until the cache fits in its size limit.
+Records are written atomically, so several processes can share a cache.
+
+The cache is off until enable() is called. Scanners then consult it through
+cached(), which falls back to scanning when the cache is off.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+import digests
+
+# Environment variable naming the cache directory.
+CACHE_ENVIRONMENT_VARIABLE = 'CATERPILLAR_SCAN_CACHE'
+
+# Cache directory used if the environment variable isn't set.
+DEFAULT_CACHE_DIR = os.path.join('~', '.caterpillar', 'scan-cache')
+
+# Default size limit of the cache in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Version of the analyses and record format. Records of other versions are
+# never read, so this must change whenever a scanner's results do.
+FORMAT_VERSION = 1
+
+# Prefix of temporary files, which evict() leaves alone.
+TEMP_PREFIX = '.caterpillar-'
+
+# The cache consulted by cached(), if enabled; see enable().
+_cache = None
+
+
+class ScanCache(object):
+  """Cache of scan results in a directory.
+
+  Attributes:
+    root: Path to the cache directory. It is made when first written to.
+    max_bytes: Size limit of the cache in bytes, enforced by evict().
+    hits: Number of results found in the cache by this process.
+    misses: Number of results not found in the cache by this process.
+  """
+
+  def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+    self.root = root
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._records_dir = os.path.join(root, 'v{}'.format(FORMAT_VERSION))
+
+  @classmethod
+  def default(cls, max_bytes=DEFAULT_MAX_BYTES):
+    """Gets the cache named by the environment, or the default one.
+
+    Args:
+      max_bytes: Size limit of the cache in bytes.
+
+    Returns:
+      ScanCache.
+    """
+    root = os.environ.get(CACHE_ENVIRONMENT_VARIABLE, DEFAULT_CACHE_DIR)
+    return cls(os.path.expanduser(root), max_bytes)
+
+  def _record_path(self, digest):
+    """Gets the path to the record of a digest."""
+    return os.path.join(self._records_dir, digest[:2], digest)
+
+  def read(self, digest):
+    """Reads the record of a file, marking it as recently used.
+
+    Args:
+      digest: Hex SHA-256 digest of the file's contents.
+
+    Returns:
+      Dictionary mapping analysis names to results, empty if there is no
+      record or it can't be read.
+    """
+    path = self._record_path(digest)
+    try:
+      with open(path, 'rb') as record_file:
+        record = json.loads(zlib.decompress(record_file.read()))
+      os.utime(path, None)
+    except (IOError, OSError):
+      return {}
+    except (ValueError, zlib.error):
+      logging.debug('Ignoring corrupt scan cache record `%s`.', path)
+      return {}
+    return record
+
+  def write(self, digest, record):
+    """Writes the record of a file, replacing any it had.
+
+    Failures are logged and otherwise ignored, since the cache is only an
+    optimisation.
+
+    Args:
+      digest: Hex SHA-256 digest of the file's contents.
+      record: Dictionary mapping analysis names to JSON-serialisable results.
+    """
+    path = self._record_path(digest)
+    contents = zlib.compress(json.dumps(record, sort_keys=True,
+                                        separators=(',', ':')).encode('utf-8'))
+    try:
+      directory = os.path.dirname(path)
+      if not os.path.isdir(directory):
+        try:
+          os.makedirs(directory)
+        except OSError:
+          # Another process may have made it.
+          if not os.path.isdir(directory):
+            raise
+      with tempfile.NamedTemporaryFile(dir=directory, prefix=TEMP_PREFIX,
+                                       delete=False) as temp_file:
+        temp_file.write(contents)
+      os.rename(temp_file.name, path)
+    except (IOError, OSError) as e:
+      logging.debug('Could not write scan cache record `%s`: %s', path, e)
+
+  def cached(self, path, analysis, scan, digest=None):
+    """Gets the result of an analysis of a file, scanning it if not cached.
+
+    Args:
+      path: Path to the file.
+      analysis: Name of the analysis, e.g. 'apis'.
+      scan: Function of no arguments that scans the file, returning a
+        JSON-serialisable result. Results are cached as they would be after a
+        round trip through JSON, so tuples become lists.
+      digest: Hex SHA-256 digest of the file's contents, or a function of no
+        arguments returning it, e.g. the digest method of the file's
+        chrome_app.index.FileEntry. Optional; the file is hashed if not given.
+
+    Returns:
+      Result of the analysis.
+    """
+    if digest is None:
+      digest = digests.file_digest(path)
+    elif callable(digest):
+      digest = digest()
+    record = self.read(digest)
+    if analysis in record:
+      self.hits += 1
+      return record[analysis]
+
+    self.misses += 1
+    # Results are returned as they will be read back later, so that hits and
+    # misses give identical results.
+    result = json.loads(json.dumps(scan()))
+    record[analysis] = result
+    self.write(digest, record)
+    return result
+
+  def evict(self):
+    """Deletes the least recently used records until the cache fits its limit.
+
+    Returns:
+      Number of records deleted.
+    """
+    records = []
+    total = 0
+    for dirpath, _, filenames in os.walk(self._records_dir):
+      for filename in filenames:
+        if filename.startswith(TEMP_PREFIX):
+          continue
+        path = os.path.join(dirpath, filename)
+        try:
+          stat = os.stat(path)
+        except OSError:  # Deleted by another process.
+          continue
+        records.append((stat.st_mtime, path, stat.st_size))
+        total += stat.st_size
+
+    deleted = 0
+    for _, path, size in sorted(records):
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      total -= size
+      deleted += 1
+    if deleted:
+      logging.debug('Evicted %d records from the scan cache.', deleted)
+    return deleted
+
+
+def enable(cache):
+  """Makes scanners consult a cache.
+
+  Processes forked afterwards, e.g. the workers that edit files, inherit it.
+
+  Args:
+    cache: ScanCache.
+  """
+  global _cache
+  _cache = cache
+
+
+def disable():
+  """Stops scanners consulting a cache.
+
+  Returns:
+    The ScanCache that was enabled, or None.
+  """
+  global _cache
+  cache = _cache
+  _cache = None
+  return cache
+
+
+def active():
+  """Returns the enabled ScanCache, or None."""
+  return _cache
+
+
+def cached(path, analysis, scan, digest=None):
+  """Gets the result of an analysis of a file from the enabled cache, if any.
+
+  Args:
+    path: Path to the file.
+    analysis: Name of the analysis; see ScanCache.cached.
+    scan: Function of no arguments that scans the file.
+    digest: Digest of the file, or a function returning it; see
+      ScanCache.cached. It is only used, and a function only called, if a cache
+      is enabled. Optional.
+
+  Returns:
+    Result of the analysis: scan() if no cache is enabled, or else the cached
+    result, which has been through a round trip through JSON.
+  """
+  if _cache is None:
+    return scan()
+  return _cache.cached(path, analysis, scan, digest)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Unit tests for scancache."""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import unittest
+
+import caterpillar_test
+import digests
+import scancache
+
+
+class TestScanCache(caterpillar_test.TestCaseWithTempDir):
+  """Tests ScanCache."""
+
+  def setUp(self):
+    super(TestScanCache, self).setUp()
+    self.cache = scancache.ScanCache(os.path.join(self.temp_path, 'cache'))
+    self.scans = []
+
+  def write_file(self, name, contents):
+    """Writes bytes to a file in the temporary directory, returning its path."""
+    path = os.path.join(self.temp_path, name)
+    with open(path, 'wb') as f:
+      f.write(contents)
+    return path
+
+  def scan(self, result):
+    """Makes a scan function which records that it was called."""
+    def scan():
+      self.scans.append(result)
+      return result
+    return scan
+
+  def test_cached(self):
+    """Tests that results are scanned once and then read from the cache."""
+    path = self.write_file('á.js', 'chrome.tts.speak("é");'.encode('utf-8'))
+    for _ in range(2):
+      self.assertEqual(self.cache.cached(path, 'apis', self.scan(('tts',))),
+                       ['tts'])
+    self.assertEqual(self.scans, [('tts',)])
+    self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+  def test_same_contents(self):
+    """Tests that files with the same contents share results."""
+    path = self.write_file('á.js', b'jquery();')
+    copy_path = self.write_file('b.js', b'jquery();')
+    other_path = self.write_file('c.js', b'polymer();')
+    self.cache.cached(path, 'apis', self.scan(['á']))
+    self.assertEqual(self.cache.cached(copy_path, 'apis', self.scan(['b'])),
+                     ['á'])
+    self.assertEqual(self.cache.cached(other_path, 'apis', self.scan(['c'])),
+                     ['c'])
+
+  def test_analyses(self):
+    """Tests that each analysis of a file is cached separately."""
+    path = self.write_file('á.js', b'chrome.tts.speak();')
+    self.cache.cached(path, 'apis', self.scan(['tts']))
+    self.assertEqual(self.cache.cached(path, 'members', self.scan([[0, 'é']])),
+                     [[0, 'é']])
+    self.assertEqual(self.cache.cached(path, 'apis', self.scan(None)),
+                     ['tts'])
+    self.assertEqual(self.scans, [['tts'], [[0, 'é']]])
+
+  def test_given_digest(self):
+    """Tests that a given digest is used instead of hashing the file."""
+    path = self.write_file('á.js', b'chrome.tts.speak();')
+    self.cache.cached(path, 'apis', self.scan(['tts']), digest='ab' * 32)
+    self.assertEqual(self.cache.cached(path, 'apis', self.scan(['é']),
+                                       digest=lambda: 'ab' * 32), ['tts'])
+    self.assertEqual(self.cache.cached(path, 'apis', self.scan(['é'])), ['é'])
+
+  def test_corrupt(self):
+    """Tests that corrupt records are scanned again."""
+    path = self.write_file('á.js', b'chrome.tts.speak();')
+    self.cache.cached(path, 'apis', self.scan(['tts']))
+    record_path = self.cache._record_path(digests.file_digest(path))
+    with open(record_path, 'wb') as record_file:
+      record_file.write(b'not zlib')
+    self.assertEqual(self.cache.cached(path, 'apis', self.scan(['é'])), ['é'])
+
+  def test_evict(self):
+    """Tests that the least recently used records are evicted first."""
+    paths = [self.write_file('{}.js'.format(i), 'fíle {}'.format(i).encode(
+        'utf-8')) for i in range(3)]
+    for path in paths:
+      self.cache.cached(path, 'apis', self.scan(['x' * 100]))
+    record_paths = [self.cache._record_path(digests.file_digest(path))
+                    for path in paths]
+    for i, record_path in enumerate(record_paths):
+      os.utime(record_path, (1000 + i, 1000 + i))
+    # Reading the oldest record makes it the most recently used.
+    self.cache.cached(paths[0], 'apis', self.scan(None))
+
+    self.cache.max_bytes = sum(os.path.getsize(record_path)
+                               for record_path in record_paths[:2])
+    self.assertEqual(self.cache.evict(), 1)
+    self.assertEqual([os.path.exists(record_path)
+                      for record_path in record_paths], [True, False, True])
+    self.assertEqual(self.cache.evict(), 0)
+
+
+class TestCached(caterpillar_test.TestCaseWithTempDir):
+  """Tests cached."""
+
+  def tearDown(self):
+    scancache.disable()
+    super(TestCached, self).tearDown()
+
+  def test_disabled(self):
+    """Tests that files are scanned when no cache is enabled."""
+    self.assertIsNone(scancache.active())
+    self.assertEqual(scancache.cached('nó-such-file.js', 'apis',
+                                      lambda: ('tts',)), ('tts',))
+
+  def test_enabled(self):
+    """Tests that the enabled cache is used."""
+    cache = scancache.ScanCache(os.path.join(self.temp_path, 'cache'))
+    scancache.enable(cache)
+    path = os.path.join(self.temp_path, 'á.js')
+    with open(path, 'wb') as f:
+      f.write(b'chrome.tts.speak();')
+    scancache.cached(path, 'apis', lambda: ['tts'])
+    self.assertEqual(scancache.cached(path, 'apis', lambda: []), ['tts'])
+    self.assertIs(scancache.disable(), cache)
+    self.assertEqual(scancache.cached(path, 'apis', lambda: []), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,614 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Serves conversions from a long-running process over HTTP.
+
+Conversion services that start caterpillar.py for every app pay for starting
+Python, importing Caterpillar, loading the polyfill manifests and compiling the
+report templates every time. The server does these once, and then forks a
+bounded pool of worker processes which inherit them and are reused for every
+conversion job, as in batch conversions.
+
+Jobs are queued and polled with JSON requests:
+
+  POST /jobs
+    Queues a job. The body is either, with Content-Type application/json, a
+    JSON object {"input": app path, "output": output path, "config": config
+    overrides, "force": bool}, where only "input" is needed, or, with
+    Content-Type application/zip, a zip of the app. Uploaded apps are
+    extracted into the server's work directory and converted there unless an
+    output path is given in the query string, e.g. /jobs?output=/srv/web-app.
+    Only outputs in the work directory may be forced, and no two unfinished
+    jobs may have the same output. Responds with the job.
+  GET /jobs
+    Responds with a list of all jobs.
+  GET /jobs/<id>
+    Responds with the job, a JSON object {"id": job ID, "status": "queued",
+    "running" or "done", "input": app path, "output": output path, "result":
+    result}. The result is null until the job is done, and then the result of
+    batch.convert_job, with its status, warnings and errors.
+  DELETE /jobs/<id>
+    Forgets a finished job and deletes its files in the work directory.
+
+Finished jobs expire after a while (see JobQueue), and are deleted as if they
+had been deleted with a request, so a long-running server doesn't keep every
+job it has run.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import BaseHTTPServer
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import urlparse
+import uuid
+import zipfile
+
+import batch
+import polyfill_manifest
+import report.templates
+import scancache
+import surrogateescape
+
+# Statuses of a job.
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+
+# Content types of jobs and uploaded apps. Requiring them means that web pages
+# can't queue jobs without a CORS preflight, which the server never allows.
+JSON_CONTENT_TYPE = 'application/json'
+ZIP_CONTENT_TYPE = 'application/zip'
+
+# Largest request body accepted, in bytes.
+MAX_BODY_BYTES = 512 * 1024 * 1024
+
+# Largest total size of the files extracted from an uploaded app, in bytes.
+MAX_EXTRACTED_BYTES = 2 * 1024 * 1024 * 1024
+
+# Number of bytes to read from a request or zip at a time.
+BLOCK_SIZE = 1 << 16
+
+# Default number of seconds that finished jobs are kept for.
+JOB_TTL = 60 * 60
+
+# Number of jobs to finish between evictions from the scan cache, if enabled.
+EVICT_INTERVAL = 100
+
+
+# Queue that a worker process puts the ID of each job it starts on; see
+# init_worker.
+_started_jobs = None
+
+
+class JobError(Exception):
+  """Exception raised when a job can't be queued or deleted."""
+
+  pass
+
+
+def warm_up():
+  """Loads the state shared by conversions, so forked workers inherit it."""
+  polyfill_manifest.registry()
+  report.templates.compile_all()
+
+
+def init_worker(started_jobs):
+  """Initialises a worker process.
+
+  Args:
+    started_jobs: multiprocessing.Queue to put the IDs of started jobs on.
+  """
+  global _started_jobs
+  _started_jobs = started_jobs
+
+
+def run_job(args):
+  """Runs a conversion job in a worker process, announcing that it started.
+
+  Args:
+    args: Tuple (job ID, job dictionary, base configuration dictionary, force).
+
+  Returns:
+    Result of batch.convert_job.
+  """
+  _started_jobs.put(args[0])
+  return batch.convert_job(args[1:])
+
+
+def extract_app(zip_path, directory, max_bytes=MAX_EXTRACTED_BYTES):
+  """Extracts an uploaded app.
+
+  Args:
+    zip_path: Path to a zip of a Chrome App. Its manifest may be at the top of
+      the zip or in a single top-level directory.
+    directory: Directory to extract the zip into.
+    max_bytes: Largest total size of the extracted files in bytes. Default is
+      MAX_EXTRACTED_BYTES.
+
+  Returns:
+    Path to the extracted app directory.
+
+  Raises:
+    JobError if the zip is invalid, has files outside the directory or is too
+    large when extracted.
+  """
+  # Names in zips are Unicode if the zip says they are UTF-8, and bytes
+  # otherwise, so they are joined to the directory as bytes.
+  encoded_directory = directory
+  if isinstance(directory, unicode):
+    encoded_directory = directory.encode(sys.getfilesystemencoding())
+  too_large = JobError('Uploaded app is larger than {} bytes when '
+                       'extracted.'.format(max_bytes))
+  extracted_bytes = 0
+  try:
+    with zipfile.ZipFile(zip_path) as app_zip:
+      # The sizes in the zip are checked up front, and the bytes actually
+      # extracted as they are written, since the sizes could be wrong.
+      if sum(info.file_size for info in app_zip.infolist()) > max_bytes:
+        raise too_large
+      for info in app_zip.infolist():
+        name = info.filename
+        if isinstance(name, unicode):
+          name = name.encode('utf-8')
+        if (os.path.isabs(name) or
+            os.path.normpath(name).split(b'/')[0] == b'..'):
+          raise JobError('Uploaded zip has a file outside the app: '
+                         '`{}`.'.format(surrogateescape.decode(name)))
+        path = os.path.join(encoded_directory, name)
+        if name.endswith(b'/'):
+          if not os.path.isdir(path):
+            os.makedirs(path)
+          continue
+        if not os.path.isdir(os.path.dirname(path)):
+          os.makedirs(os.path.dirname(path))
+        with app_zip.open(info) as in_file, open(path, 'wb') as out_file:
+          for block in iter(lambda: in_file.read(BLOCK_SIZE), b''):
+            extracted_bytes += len(block)
+            if extracted_bytes > max_bytes:
+              raise too_large
+            out_file.write(block)
+  except zipfile.BadZipfile as e:
+    raise JobError('Uploaded app is not a valid zip: {}'.format(e))
+
+  entries = os.listdir(directory)
+  if (len(entries) == 1 and
+      os.path.isdir(os.path.join(directory, entries[0]))):
+    return os.path.join(directory, entries[0])
+  return directory
+
+
+class JobQueue(object):
+  """Conversion jobs, run by a pool of worker processes.
+
+  Each job's files in the work directory are kept in a directory named after
+  its ID. Finished jobs are forgotten, and their directories deleted, once they
+  have been finished for job_ttl seconds; this is checked whenever jobs are
+  queued or polled.
+
+  Attributes:
+    config: Base configuration dictionary. Each job's overrides are applied to
+      a copy of this.
+    work_dir: Directory that uploaded apps are extracted and converted in.
+    job_ttl: Number of seconds that finished jobs are kept for.
+  """
+
+  def __init__(self, config, work_dir, processes=None, job_ttl=JOB_TTL):
+    """Starts the worker processes.
+
+    Args:
+      config: Base configuration dictionary.
+      work_dir: Directory that uploaded apps are extracted and converted in.
+      processes: Number of worker processes. Default is the number of CPUs.
+      job_ttl: Number of seconds that finished jobs are kept for. Default is
+        JOB_TTL.
+    """
+    self.config = config
+    self.work_dir = work_dir
+    self.job_ttl = job_ttl
+    self._jobs = {}
+    self._order = []
+    # Maps the IDs of finished jobs to the times they finished.
+    self._finish_times = {}
+    self._finished = 0
+    self._lock = threading.Lock()
+    warm_up()
+    self._started_jobs = multiprocessing.Queue()
+    self._pool = multiprocessing.Pool(processes, init_worker,
+                                      (self._started_jobs,))
+    self._started_watcher = threading.Thread(target=self._watch_started)
+    self._started_watcher.daemon = True
+    self._started_watcher.start()
+
+  def close(self):
+    """Stops the worker processes, abandoning unfinished jobs."""
+    self._pool.terminate()
+    self._pool.join()
+    self._started_jobs.put(None)
+    self._started_watcher.join()
+
+  def _watch_started(self):
+    """Marks jobs as running as the workers start them, until None is put."""
+    for job_id in iter(self._started_jobs.get, None):
+      with self._lock:
+        status = self._jobs.get(job_id)
+        # The job may have finished before its start was noticed.
+        if status and status['status'] == STATUS_QUEUED:
+          status['status'] = STATUS_RUNNING
+
+  def _job_dir(self, job_id):
+    """Gets the path to a job's directory in the work directory."""
+    return os.path.join(self.work_dir, job_id)
+
+  def _forget(self, job_ids):
+    """Forgets finished jobs and deletes their directories.
+
+    This must be called with the lock held, but releases it while deleting.
+
+    Args:
+      job_ids: IDs of finished jobs.
+    """
+    job_ids = set(job_ids)
+    for job_id in job_ids:
+      del self._jobs[job_id]
+      del self._finish_times[job_id]
+    self._order = [job_id for job_id in self._order if job_id not in job_ids]
+
+    self._lock.release()
+    try:
+      for job_id in job_ids:
+        logging.debug('Deleting job %s.', job_id)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+    finally:
+      self._lock.acquire()
+
+  def _expire(self):
+    """Forgets the jobs which finished more than job_ttl seconds ago.
+
+    This must be called with the lock held.
+    """
+    expiry_time = time.time() - self.job_ttl
+    expired = [job_id for job_id, finish_time in self._finish_times.iteritems()
+               if finish_time <= expiry_time]
+    if expired:
+      self._forget(expired)
+
+  def _add(self, job_id, job, force):
+    """Queues a job.
+
+    Args:
+      job_id: ID of the job.
+      job: Job dictionary; see batch.load_jobs.
+      force: Whether to force overwrite existing output files.
+
+    Returns:
+      Job status dictionary.
+
+    Raises:
+      JobError if the job would overwrite outside the work directory, or
+      another unfinished job has the same output.
+    """
+    output_path = os.path.realpath(job['output'])
+    if force and not output_path.startswith(
+        os.path.join(os.path.realpath(self.work_dir), '')):
+      raise JobError('Only outputs in the work directory can be forced.')
+
+    status = {
+      'id': job_id,
+      'status': STATUS_QUEUED,
+      'input': job['input'],
+      'output': job['output'],
+      'result': None,
+    }
+    with self._lock:
+      self._expire()
+      if any(other['status'] != STATUS_DONE and
+             os.path.realpath(other['output']) == output_path
+             for other in self._jobs.itervalues()):
+        raise JobError('Another unfinished job has the same output.')
+      self._jobs[job_id] = status
+      self._order.append(job_id)
+      # The job may finish, and even expire, before this returns, so the status
+      # it was queued with is copied now.
+      queued_status = dict(status)
+    logging.info('Queued job %s: `%s`.', job_id, job['input'])
+
+    def finish(result):
+      with self._lock:
+        status.update(status=STATUS_DONE, result=result)
+        self._finish_times[job_id] = time.time()
+        self._finished += 1
+        evict = self._finished % EVICT_INTERVAL == 0
+      logging.info('Finished job %s: %s (%.2fs).', job_id, result['status'],
+                   result['seconds'])
+      cache = scancache.active()
+      if evict and cache:
+        cache.evict()
+
+    self._pool.apply_async(run_job, [(job_id, job, self.config, force)],
+                           callback=finish)
+    return queued_status
+
+  def submit(self, request):
+    """Queues a job for an app on disk.
+
+    Args:
+      request: Dictionary {'input': app path, 'output': output path, 'config':
+        config overrides, 'force': whether to overwrite the output}. Only
+        'input' is needed; outputs go in the work directory by default.
+
+    Returns:
+      Job status dictionary.
+
+    Raises:
+      JobError if the request is invalid.
+    """
+    if not isinstance(request, dict) or 'input' not in request:
+      raise JobError('Job must be an object with an input.')
+    if not isinstance(request.get('config', {}), dict):
+      raise JobError('Job config must be an object.')
+
+    job_id = uuid.uuid4().hex
+    output_dir = request.get('output') or os.path.join(self._job_dir(job_id),
+                                                       'web-app')
+    job = {
+      'input': request['input'],
+      'output': output_dir,
+      'config': request.get('config', {}),
+    }
+    return self._add(job_id, job, bool(request.get('force')))
+
+  def submit_zip(self, zip_file, size, output_dir=None):
+    """Queues a job for an uploaded app.
+
+    Args:
+      zip_file: File object to read the zip of the app from.
+      size: Size of the zip in bytes.
+      output_dir: Output path. Optional; put in the work directory if not
+        given.
+
+    Returns:
+      Job status dictionary.
+
+    Raises:
+      JobError if the zip is invalid or the job can't be queued; see _add.
+    """
+    job_id = uuid.uuid4().hex
+    job_dir = self._job_dir(job_id)
+    os.makedirs(job_dir)
+    zip_path = os.path.join(job_dir, 'app.zip')
+    try:
+      with open(zip_path, 'wb') as out_file:
+        while size > 0:
+          block = zip_file.read(min(size, BLOCK_SIZE))
+          if not block:
+            raise JobError('Uploaded zip is incomplete.')
+          out_file.write(block)
+          size -= len(block)
+      input_dir = extract_app(zip_path, os.path.join(job_dir, 'app'))
+    except JobError:
+      shutil.rmtree(job_dir)
+      raise
+    finally:
+      if os.path.exists(zip_path):
+        os.remove(zip_path)
+
+    job = {
+      'input': input_dir,
+      'output': output_dir or os.path.join(job_dir, 'web-app'),
+      'config': {},
+    }
+    try:
+      return self._add(job_id, job, False)
+    except JobError:
+      shutil.rmtree(job_dir)
+      raise
+
+  def get(self, job_id):
+    """Gets a copy of a job's status dictionary, or None if there is no job."""
+    with self._lock:
+      self._expire()
+      status = self._jobs.get(job_id)
+      return dict(status) if status else None
+
+  def all(self):
+    """Gets copies of the status dictionaries of all jobs, in order."""
+    with self._lock:
+      self._expire()
+      return [dict(self._jobs[job_id]) for job_id in self._order]
+
+  def delete(self, job_id):
+    """Forgets a finished job and deletes its directory in the work directory.
+
+    Outputs outside the work directory are kept.
+
+    Args:
+      job_id: ID of the job.
+
+    Returns:
+      Whether there was a job to delete.
+
+    Raises:
+      JobError if the job hasn't finished.
+    """
+    with self._lock:
+      if job_id not in self._jobs:
+        return False
+      if job_id not in self._finish_times:
+        raise JobError('Job has not finished.')
+      self._forget([job_id])
+    return True
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles requests to queue and poll jobs; see the module docstring."""
+
+  def log_message(self, format, *args):
+    logging.debug('%s - %s', self.address_string(), format % args)
+
+  def send_json(self, code, value):
+    """Sends a JSON response.
+
+    Args:
+      code: HTTP status code.
+      value: JSON-serialisable value.
+    """
+    body = json.dumps(value, sort_keys=True).encode('utf-8')
+    self.send_response(code)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def send_error_json(self, code, message):
+    """Sends an error as a JSON object {"error": message}."""
+    self.send_json(code, {'error': message})
+
+  def do_GET(self):
+    path = urlparse.urlparse(self.path).path.rstrip('/')
+    jobs = self.server.jobs
+    if path == '/jobs':
+      self.send_json(200, jobs.all())
+    elif path.startswith('/jobs/'):
+      status = jobs.get(path[len('/jobs/'):])
+      if status:
+        self.send_json(200, status)
+      else:
+        self.send_error_json(404, 'No such job.')
+    else:
+      self.send_error_json(404, 'Not found.')
+
+  def do_DELETE(self):
+    path = urlparse.urlparse(self.path).path.rstrip('/')
+    if not path.startswith('/jobs/'):
+      self.send_error_json(404, 'Not found.')
+      return
+
+    try:
+      deleted = self.server.jobs.delete(path[len('/jobs/'):])
+    except JobError as e:
+      self.send_error_json(409, e.message)
+      return
+    if deleted:
+      self.send_json(200, {})
+    else:
+      self.send_error_json(404, 'No such job.')
+
+  def do_POST(self):
+    url = urlparse.urlparse(self.path)
+    if url.path.rstrip('/') != '/jobs':
+      self.send_error_json(404, 'Not found.')
+      return
+
+    try:
+      size = int(self.headers.get('Content-Length', 0))
+    except ValueError:
+      size = -1
+    if size < 0:
+      self.send_error_json(400, 'Invalid Content-Length.')
+      return
+    if size > MAX_BODY_BYTES:
+      self.send_error_json(413, 'Request body is too large.')
+      return
+
+    content_type = self.headers.gettype()
+    if content_type not in {JSON_CONTENT_TYPE, ZIP_CONTENT_TYPE}:
+      self.send_error_json(415, 'Content-Type must be {} or {}.'.format(
+          JSON_CONTENT_TYPE, ZIP_CONTENT_TYPE))
+      return
+
+    jobs = self.server.jobs
+    try:
+      if content_type == ZIP_CONTENT_TYPE:
+        output_dir = None
+        query = urlparse.parse_qs(url.query)
+        if 'output' in query:
+          output_dir = query['output'][0].decode('utf-8')
+        status = jobs.submit_zip(self.rfile, size, output_dir)
+      else:
+        try:
+          request = json.loads(self.rfile.read(size))
+        except ValueError:
+          raise JobError('Job must be JSON.')
+        status = jobs.submit(request)
+    except JobError as e:
+      self.send_error_json(400, e.message)
+      return
+    self.send_json(202, status)
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """HTTP server of a job queue, handling each request in a thread.
+
+  Attributes:
+    jobs: JobQueue.
+  """
+
+  daemon_threads = True
+
+  def __init__(self, address, jobs):
+    """Listens for requests.
+
+    Args:
+      address: (host, port) tuple to listen on. Port 0 picks a free port.
+      jobs: JobQueue.
+    """
+    BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+    self.jobs = jobs
+
+
+def serve(address, config, processes=None, work_dir=None, job_ttl=None):
+  """Serves conversions until interrupted.
+
+  Args:
+    address: (host, port) tuple to listen on.
+    config: Base configuration dictionary.
+    processes: Number of worker processes. Default is the number of CPUs.
+    work_dir: Directory that uploaded apps are extracted and converted in.
+      Default is a temporary directory, deleted when the server stops.
+    job_ttl: Number of seconds that finished jobs are kept for. Default is
+      JOB_TTL.
+  """
+  if job_ttl is None:
+    job_ttl = JOB_TTL
+  temp_dir = None
+  if work_dir is None:
+    work_dir = temp_dir = tempfile.mkdtemp(prefix='caterpillar-serve-').decode(
+        sys.getfilesystemencoding())
+  jobs = JobQueue(config, work_dir, processes, job_ttl)
+  try:
+    server = Server(address, jobs)
+    logging.info('Serving conversions on http://%s:%d/jobs.',
+                 *server.server_address[:2])
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      logging.info('Stopping.')
+    finally:
+      server.server_close()
+  finally:
+    jobs.close()
+    if temp_dir:
+      shutil.rmtree(temp_dir)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for server."""
+
+from __future__ import print_function, division, unicode_literals
+
+import httplib
+import io
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+
+import mock
+
+import caterpillar_test
+import server
+
+# Seconds to wait for a job to finish.
+TIMEOUT = 30
+
+
+def convert_app(input_dir, output_dir, config, captured_warnings, force):
+  """Stands in for caterpillar.convert_app in the worker processes.
+
+  If the config has a gate path, the conversion waits until it exists.
+  """
+  if 'gate' in config:
+    deadline = time.time() + TIMEOUT
+    while not os.path.exists(config['gate']) and time.time() < deadline:
+      time.sleep(0.01)
+  logging.warning('Cönverting `%s`.', config['start_url'])
+  if not os.path.exists(os.path.join(input_dir, 'manifest.json')):
+    return None
+  os.makedirs(output_dir)
+  return 'total'
+
+
+class TestServer(caterpillar_test.TestCaseWithTempDir):
+  """Tests Server and JobQueue through HTTP requests."""
+
+  def setUp(self):
+    """Starts a server with one worker on a free port."""
+    super(TestServer, self).setUp()
+    # Workers are forked with the patched conversion.
+    patcher = mock.patch('caterpillar.convert_app', side_effect=convert_app)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.jobs = server.JobQueue({'start_url': 'índex.html'}, self.temp_path,
+                                processes=1)
+    self.server = server.Server(('127.0.0.1', 0), self.jobs)
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.start()
+
+    def stop():
+      self.server.shutdown()
+      thread.join()
+      self.server.server_close()
+      self.jobs.close()
+    self.addCleanup(stop)
+
+  def request(self, method, path, body=None, headers=None):
+    """Makes a request to the server.
+
+    Args:
+      method: HTTP method.
+      path: ASCII path to request.
+      body: Request body. Optional.
+      headers: Dictionary of ASCII request headers. Optional.
+
+    Returns:
+      (HTTP status code, decoded JSON response) tuple.
+    """
+    connection = httplib.HTTPConnection(*self.server.server_address)
+    try:
+      if isinstance(body, unicode):
+        body = body.encode('utf-8')
+      # httplib joins the request into bytes, which fails if any of it is
+      # Unicode and the body isn't ASCII.
+      connection.request(str(method), str(path), body, {
+          str(name): str(value) for name, value in (headers or {}).items()})
+      response = connection.getresponse()
+      return response.status, json.loads(response.read())
+    finally:
+      connection.close()
+
+  def wait(self, job_id):
+    """Polls a job until it is done, returning its status."""
+    deadline = time.time() + TIMEOUT
+    while time.time() < deadline:
+      code, status = self.request('GET', '/jobs/{}'.format(job_id))
+      self.assertEqual(code, 200)
+      if status['status'] == server.STATUS_DONE:
+        return status
+      time.sleep(0.05)
+    self.fail('Job {} did not finish.'.format(job_id))
+
+  def post_job(self, request):
+    """Queues a job with a JSON request, returning the response."""
+    return self.request('POST', '/jobs', json.dumps(request), {
+        'Content-Type': 'application/json; charset=utf-8'})
+
+  def test_path_job(self):
+    """Tests that an app on disk is converted with the config overrides."""
+    output_path = os.path.join(self.temp_path, 'óutput')
+    code, status = self.post_job({
+      'input': caterpillar_test.MINIMAL_PATH,
+      'output': output_path,
+      'config': {'start_url': 'máin.html'},
+    })
+    self.assertEqual(code, 202)
+    self.assertEqual(status['status'], server.STATUS_QUEUED)
+    self.assertIsNone(status['result'])
+
+    status = self.wait(status['id'])
+    self.assertEqual(status['output'], output_path)
+    self.assertEqual(status['result']['status'], 'ok')
+    self.assertEqual(status['result']['conversion_status'], 'total')
+    self.assertEqual(status['result']['warnings'],
+                     ['Cönverting `máin.html`.'])
+    self.assertTrue(os.path.isdir(output_path))
+
+  def post_zip(self):
+    """Uploads the minimal app as a zip, returning the response."""
+    app_zip = io.BytesIO()
+    with zipfile.ZipFile(app_zip, 'w') as zip_file:
+      for name in os.listdir(caterpillar_test.MINIMAL_PATH):
+        zip_file.write(os.path.join(caterpillar_test.MINIMAL_PATH, name),
+                       os.path.join('äpp', name))
+    return self.request('POST', '/jobs', app_zip.getvalue(),
+                        {'Content-Type': server.ZIP_CONTENT_TYPE})
+
+  def test_running(self):
+    """Tests that a job is marked as running once a worker starts it."""
+    gate_path = os.path.join(self.temp_path, 'gáte')
+    job_id = self.post_job({
+      'input': caterpillar_test.MINIMAL_PATH,
+      'output': os.path.join(self.temp_path, 'óutput'),
+      'config': {'gate': gate_path},
+    })[1]['id']
+    deadline = time.time() + TIMEOUT
+    while (self.request('GET', '/jobs/{}'.format(job_id))[1]['status'] !=
+           server.STATUS_RUNNING):
+      self.assertLess(time.time(), deadline)
+      time.sleep(0.01)
+    self.assertEqual(self.request('DELETE', '/jobs/{}'.format(job_id))[0], 409)
+    open(gate_path, 'w').close()
+    self.assertEqual(self.wait(job_id)['result']['status'], 'ok')
+
+  def test_zip_job(self):
+    """Tests that an uploaded app is extracted and converted."""
+    code, status = self.post_zip()
+    self.assertEqual(code, 202)
+
+    status = self.wait(status['id'])
+    self.assertEqual(os.path.basename(status['input']), 'äpp')
+    self.assertEqual(status['result']['status'], 'ok')
+    self.assertEqual(status['result']['warnings'],
+                     ['Cönverting `índex.html`.'])
+    self.assertTrue(os.path.isdir(status['output']))
+
+  def test_failed_job(self):
+    """Tests that a failed conversion is reported in the job's result."""
+    code, status = self.post_job({
+      'input': os.path.join(self.temp_path, 'nót an app'),
+    })
+    self.assertEqual(code, 202)
+    self.assertEqual(self.wait(status['id'])['result']['status'], 'error')
+
+  def test_list(self):
+    """Tests that all jobs are listed in the order they were queued."""
+    ids = [self.post_job({
+      'input': caterpillar_test.MINIMAL_PATH,
+      'output': os.path.join(self.temp_path, name),
+    })[1]['id'] for name in ('á', 'b')]
+    for job_id in ids:
+      self.wait(job_id)
+    code, statuses = self.request('GET', '/jobs')
+    self.assertEqual(code, 200)
+    self.assertEqual([status['id'] for status in statuses], ids)
+
+  def test_delete(self):
+    """Tests that deleting a job deletes its files in the work directory."""
+    job_id = self.post_zip()[1]['id']
+    self.wait(job_id)
+    self.assertTrue(os.path.isdir(os.path.join(self.temp_path, job_id)))
+    self.assertEqual(self.request('DELETE', '/jobs/{}'.format(job_id))[0], 200)
+    self.assertEqual(self.request('GET', '/jobs/{}'.format(job_id))[0], 404)
+    self.assertEqual(self.request('DELETE', '/jobs/{}'.format(job_id))[0], 404)
+    self.assertFalse(os.path.exists(os.path.join(self.temp_path, job_id)))
+
+  def test_expiry(self):
+    """Tests that finished jobs expire with their files."""
+    self.jobs.job_ttl = 0
+    job_id = self.post_zip()[1]['id']
+    deadline = time.time() + TIMEOUT
+    while self.request('GET', '/jobs/{}'.format(job_id))[0] != 404:
+      self.assertLess(time.time(), deadline)
+      time.sleep(0.05)
+    self.assertEqual(self.request('GET', '/jobs')[1], [])
+    self.assertFalse(os.path.exists(os.path.join(self.temp_path, job_id)))
+
+  def test_content_type_required(self):
+    """Tests that jobs without a JSON or zip content type are rejected.
+
+    Web pages can send other content types across origins without a preflight.
+    """
+    body = json.dumps({'input': caterpillar_test.MINIMAL_PATH})
+    self.assertEqual(self.request('POST', '/jobs', body)[0], 415)
+    self.assertEqual(self.request('POST', '/jobs', body, {
+      'Content-Type': 'text/plain'})[0], 415)
+    self.assertEqual(self.request('GET', '/jobs')[1], [])
+
+  def test_force_outside_work_dir(self):
+    """Tests that only outputs in the work directory can be forced."""
+    outside_path = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, outside_path)
+    code, _ = self.post_job({'input': caterpillar_test.MINIMAL_PATH,
+                             'output': outside_path, 'force': True})
+    self.assertEqual(code, 400)
+    self.assertTrue(os.path.isdir(outside_path))
+
+    code, status = self.post_job({
+      'input': caterpillar_test.MINIMAL_PATH,
+      'output': os.path.join(self.temp_path, 'óutput'), 'force': True})
+    self.assertEqual(code, 202)
+    self.wait(status['id'])
+
+  def test_same_output(self):
+    """Tests that unfinished jobs can't share an output."""
+    gate_path = os.path.join(self.temp_path, 'gáte')
+    request = {
+      'input': caterpillar_test.MINIMAL_PATH,
+      'output': os.path.join(self.temp_path, 'óutput'),
+      'config': {'gate': gate_path},
+    }
+    job_id = self.post_job(request)[1]['id']
+    self.assertEqual(self.post_job(request)[0], 400)
+    open(gate_path, 'w').close()
+    self.wait(job_id)
+    self.assertEqual(self.post_job(request)[0], 202)
+
+  def test_invalid_requests(self):
+    """Tests that invalid requests are rejected."""
+    headers = {'Content-Type': server.JSON_CONTENT_TYPE}
+    self.assertEqual(self.request('POST', '/jobs', 'nót JSON', headers)[0], 400)
+    self.assertEqual(self.request('POST', '/jobs', '{"output": "ó"}',
+                                  headers)[0], 400)
+    self.assertEqual(self.request('POST', '/jobs', 'nót a zip', {
+      'Content-Type': server.ZIP_CONTENT_TYPE})[0], 400)
+    self.assertEqual(self.request('GET', '/jobs/no-such-job')[0], 404)
+    self.assertEqual(self.request('GET', '/')[0], 404)
+    self.assertEqual(self.request('GET', '/jobs')[1], [])
+
+
+class TestExtractApp(caterpillar_test.TestCaseWithTempDir):
+  """Tests extract_app."""
+
+  def test_outside(self):
+    """Tests that zips with files outside the app are rejected."""
+    zip_path = os.path.join(self.temp_path, 'app.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+      zip_file.writestr('../évil.js', b'')
+    with self.assertRaises(server.JobError):
+      server.extract_app(zip_path, os.path.join(self.temp_path, 'app'))
+
+  def test_too_large(self):
+    """Tests that zips which extract to too many bytes are rejected."""
+    zip_path = os.path.join(self.temp_path, 'app.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+      zip_file.writestr('bómb.js', b'0' * 1000)
+    with self.assertRaises(server.JobError):
+      server.extract_app(zip_path, os.path.join(self.temp_path, 'app'), 999)
+    self.assertEqual(
+        server.extract_app(zip_path, os.path.join(self.temp_path, 'ápp'), 1000),
+        os.path.join(self.temp_path, 'ápp'))
+
+  def test_wrong_sizes(self):
+    """Tests that bytes are counted as extracted, whatever the zip says."""
+    app_zip = io.BytesIO()
+    with zipfile.ZipFile(app_zip, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+      zip_file.writestr('bómb.js', b'0' * 1000)
+    # Make the central directory say the file is 1 byte when extracted.
+    contents = app_zip.getvalue()
+    size_offset = contents.index(b'PK\x01\x02') + 24
+    contents = (contents[:size_offset] + struct.pack(b'<I', 1) +
+                contents[size_offset + 4:])
+    zip_path = os.path.join(self.temp_path, 'app.zip')
+    with open(zip_path, 'wb') as zip_file:
+      zip_file.write(contents)
+    with self.assertRaises(server.JobError):
+      server.extract_app(zip_path, os.path.join(self.temp_path, 'app'), 999)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -24,6 +24,13 @@ losslessly.
 from __future__ import print_function, division, unicode_literals
 
 import codecs
+import re
+
+# Matches a surrogate code point.
+SURROGATE_REGEX = re.compile('[\ud800-\udfff]')
+
+# Splits a string into alternating runs of non-surrogates and surrogates.
+SURROGATE_RUNS_REGEX = re.compile('([\ud800-\udfff]+)')
 
 
 def error_handler(error):
@@ -79,14 +86,25 @@ def encode(string, encoding='utf-8'):
   if not isinstance(string, unicode):
     raise TypeError('Only Unicode strings can be encoded.')
 
-  # Can't use str.encode due to technical limitations in Python 2.
+  # Most strings have no surrogates at all, and can be encoded in one go.
+  if not SURROGATE_REGEX.search(string):
+    return string.encode(encoding)
+
+  # Can't use str.encode on surrogates due to technical limitations in Python 2,
+  # so runs of surrogates are encoded one character at a time. (This also stops
+  # surrogate pairs being combined.) Runs of other characters are encoded whole.
   result = []
-  for char in string:
-    cp = ord(char)
-    if 0xdc00 <= cp < 0xdd00:
-      result.append(chr(cp - 0xdc00))
-    else:
-      result.append(char.encode(encoding))
+  for i, run in enumerate(SURROGATE_RUNS_REGEX.split(string)):
+    if not i % 2:
+      result.append(run.encode(encoding))
+      continue
+
+    for char in run:
+      cp = ord(char)
+      if 0xdc00 <= cp < 0xdd00:
+        result.append(chr(cp - 0xdc00))
+      else:
+        result.append(char.encode(encoding))
   return b''.join(result)
 
 
@@ -99,7 +117,7 @@ def make_printable(string):
   Returns:
     Unicode string having surrogates replaced by the replacement character.
   """
-  return ''.join('\ufffd' if 0xd800 <= ord(c) < 0xe000 else c for c in string)
+  return SURROGATE_REGEX.sub('\ufffd', string)
 
 
 try:
@@ -40,6 +40,18 @@ class SurrogateEscapeTest(unittest.TestCase):
     self.assertIsInstance(bs, bytes)
     self.assertEqual(bs, b'latin-1: caf\xe9; utf-8: caf\xc3\xa9')
 
+  def test_surrogate_encode_no_surrogates(self):
+    s = u'caf\xe9 \U0001f4c2'
+    self.assertEqual(surrogateescape.encode(s), s.encode('utf-8'))
+
+  def test_surrogate_encode_runs(self):
+    # Runs of surrogates are encoded a character at a time, so surrogate pairs
+    # aren't combined.
+    pair = unichr(0xd83d) + unichr(0xde00)
+    s = u'\udce9\udce9caf\xe9' + pair + u'\udc80'
+    bs = surrogateescape.encode(s)
+    self.assertEqual(bs, b'\xe9\xe9caf\xc3\xa9\xed\xa0\xbd\xed\xb8\x80\x80')
+
   def test_make_printable(self):
     s = u'latin-1: caf\udce9; utf-8: caf\xe9'
     printable = surrogateescape.make_printable(s)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Times the stages of a conversion as spans of a trace.
+
+Spans are recorded with
+
+  with tracing.span('stage', path=path):
+    ...
+
+and written in the Chrome trace event format, which chrome://tracing and other
+trace viewers open. Until tracing is started, span() returns a shared span that
+does nothing, so spans can be left in code that runs without tracing.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import os
+import threading
+import time
+
+# Category of the trace events.
+CATEGORY = 'caterpillar'
+
+# The tracer recording spans, if tracing; see start().
+_tracer = None
+
+
+class Tracer(object):
+  """Records spans as Chrome trace events.
+
+  Attributes:
+    events: List of trace event dictionaries, in the order the spans ended.
+  """
+
+  def __init__(self):
+    self.events = []
+    self._lock = threading.Lock()
+
+  def add(self, name, start, end, args):
+    """Records a span.
+
+    Args:
+      name: Name of the span.
+      start: Time the span started, in seconds since the epoch.
+      end: Time the span ended, in seconds since the epoch.
+      args: Dictionary of arguments to show with the span.
+    """
+    event = {
+      'name': name,
+      'cat': CATEGORY,
+      'ph': 'X',
+      'ts': int(start * 1e6),
+      'dur': int((end - start) * 1e6),
+      'pid': os.getpid(),
+      'tid': threading.current_thread().ident,
+      'args': args,
+    }
+    with self._lock:
+      self.events.append(event)
+
+  def extend(self, events):
+    """Adds events recorded by another tracer, e.g. in a worker process.
+
+    Args:
+      events: List of trace event dictionaries.
+    """
+    with self._lock:
+      self.events.extend(events)
+
+  def write(self, path):
+    """Writes the trace to a file in the Chrome trace event format.
+
+    Args:
+      path: Path to write to.
+    """
+    with open(path, 'w') as trace_file:
+      json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'},
+                trace_file, sort_keys=True)
+
+
+class _Span(object):
+  """A span being recorded."""
+
+  def __init__(self, tracer, name, args):
+    self._tracer = tracer
+    self._name = name
+    self._args = args
+    self._start = None
+
+  def __enter__(self):
+    self._start = time.time()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self._tracer.add(self._name, self._start, time.time(), self._args)
+
+
+class _NullSpan(object):
+  """A span that isn't recorded."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    pass
+
+
+# Span returned while not tracing.
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+  """Makes a span to time a block of code with.
+
+  Args:
+    name: Name of the span.
+    **args: Arguments to show with the span, e.g. the path of a file.
+
+  Returns:
+    Context manager that records the span if tracing.
+  """
+  if _tracer is None:
+    return _NULL_SPAN
+  return _Span(_tracer, name, args)
+
+
+def enabled():
+  """Returns whether spans are being recorded."""
+  return _tracer is not None
+
+
+def start():
+  """Starts recording spans, discarding any recorded before."""
+  global _tracer
+  _tracer = Tracer()
+
+
+def stop():
+  """Stops recording spans.
+
+  Returns:
+    Tracer that recorded the spans, or None if not tracing.
+  """
+  global _tracer
+  tracer = _tracer
+  _tracer = None
+  return tracer
+
+
+def events():
+  """Returns the list of events recorded so far, or [] if not tracing."""
+  return _tracer.events if _tracer else []
+
+
+def extend(recorded):
+  """Adds events recorded elsewhere to the trace, if tracing.
+
+  Args:
+    recorded: List of trace event dictionaries, e.g. from events() in a worker
+      process.
+  """
+  if _tracer is not None:
+    _tracer.extend(recorded)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for tracing."""
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+import os
+import unittest
+
+import caterpillar_test
+import tracing
+
+
+class TestSpan(caterpillar_test.TestCaseWithTempDir):
+  """Tests span."""
+
+  def tearDown(self):
+    """Stops tracing."""
+    tracing.stop()
+    super(TestSpan, self).tearDown()
+
+  def test_not_tracing(self):
+    """Tests that spans aren't recorded until tracing starts."""
+    self.assertFalse(tracing.enabled())
+    with tracing.span('stáge') as span:
+      pass
+    self.assertIs(span, tracing.span('óther'))
+    self.assertEqual(tracing.events(), [])
+    self.assertIsNone(tracing.stop())
+
+  def test_tracing(self):
+    """Tests that spans are recorded as complete trace events."""
+    tracing.start()
+    self.assertTrue(tracing.enabled())
+    with tracing.span('outer'):
+      with tracing.span('stáge', path='fíle.html'):
+        pass
+    events = tracing.stop().events
+    self.assertEqual([event['name'] for event in events], ['stáge', 'outer'])
+    inner, outer = events
+    self.assertEqual(inner['ph'], 'X')
+    self.assertEqual(inner['args'], {'path': 'fíle.html'})
+    self.assertEqual(inner['pid'], os.getpid())
+    self.assertLessEqual(outer['ts'], inner['ts'])
+    self.assertGreaterEqual(outer['ts'] + outer['dur'],
+                            inner['ts'] + inner['dur'])
+    self.assertFalse(tracing.enabled())
+
+  def test_span_ended_by_exception(self):
+    """Tests that a span is recorded when an exception ends it."""
+    tracing.start()
+    with self.assertRaises(ValueError):
+      with tracing.span('fáiled'):
+        raise ValueError()
+    self.assertEqual([event['name'] for event in tracing.events()],
+                     ['fáiled'])
+
+  def test_extend(self):
+    """Tests that events recorded elsewhere are added to the trace."""
+    recorded = [{'name': 'wórker', 'ph': 'X', 'ts': 1, 'dur': 2}]
+    tracing.extend(recorded)
+    tracing.start()
+    tracing.extend(recorded)
+    self.assertEqual(tracing.events(), recorded)
+
+  def test_write(self):
+    """Tests that traces are written in the trace event format."""
+    tracing.start()
+    with tracing.span('stáge'):
+      pass
+    path = os.path.join(self.temp_path, 'trace.json')
+    tracing.stop().write(path)
+    with open(path) as trace_file:
+      trace = json.load(trace_file)
+    self.assertEqual(trace['displayTimeUnit'], 'ms')
+    self.assertEqual([event['name'] for event in trace['traceEvents']],
+                     ['stáge'])
+
+
+if __name__ == '__main__':
+  unittest.main()